@@ -0,0 +1,280 @@
+import socket, struct, sys, threading, time
+from collections import deque
+from smf import read_var_len, var_len
+
+# Datagram format (all integers big-endian) :
+#   magic 'MM', version (1 byte), number of recovery entries (1 byte), sequence number (2 bytes),
+#   number of messages (2 bytes), timestamp of the first message (4 bytes, 100 us units)
+#   then each message : <delta time from the previous one (var len, 100 us units)> <size (var len)> <bytes>
+#   then each recovery entry (NoteOffs sent in previous datagrams, resent in case they were lost) :
+#       <sequence number of the datagram it was sent in (2 bytes)> <size (var len)> <bytes>
+MAGIC = b'MM'
+VERSION = 1
+HEADER = struct.Struct('>2sBBHHI')
+TIME_UNIT_NS = 100000
+MAX_DATAGRAM = 1200 # stay below usual MTU
+
+
+def is_note_off(msg:list[int])->bool:
+    """NoteOff, NoteOn with velocity 0, AllSoundOff and AllNotesOff"""
+    msb = msg[0]>>4
+    return len(msg)==3 and (msb==0x8 or (msb==0x9 and msg[2]==0) or (msb==0xB and (msg[1]==0x78 or msg[1]==0x7B)))
+
+
+class BridgeSender:
+    """ Send midi messages to a UDP endpoint, several messages per datagram
+
+        Messages are batched for batch_ms milliseconds (or until the datagram is full) to reduce
+        the packet rate. NoteOffs are repeated in the next `redundancy` datagrams, so that
+        a lost datagram does not leave a note held.
+    """
+    def __init__(self, sock:socket.socket, address:tuple, batch_ms:float = 1.0, redundancy:int = 2):
+        self.__sock = sock
+        self.__address = address
+        self.__batch_ns = int(batch_ms*1000000)
+        self.__redundancy = redundancy
+        self.__origin = time.monotonic_ns()
+        self.__seq:int = 0
+        self.__batch = bytearray()
+        self.__batch_count:int = 0
+        self.__batch_start:int = 0 # time of the first message of the batch
+        self.__last_time:int = 0   # time of the last message of the batch (100 us units)
+        self.__first_time:int = 0
+        self.__note_offs:deque = deque() # (seq, msg) of recent NoteOffs
+        self.__batch_note_offs:list = []
+        self.__cond = threading.Condition()
+        self.__running = True
+        self.sent_datagrams:int = 0
+        self.sent_messages:int = 0
+        self.__thread = threading.Thread(target=self.__run, name='bridge-sender', daemon=True)
+        self.__thread.start()
+
+    def put(self, msg:list[int], timestamp_ns:int = None):
+        """queue a message, timestamp_ns is its time.monotonic_ns() reception time (default is now)"""
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        units = (timestamp_ns-self.__origin)//TIME_UNIT_NS
+        with self.__cond:
+            if self.__batch_count==0:
+                self.__batch_start = timestamp_ns
+                self.__first_time = units
+                self.__last_time = units
+            entry = var_len(max(0, units-self.__last_time))+var_len(len(msg))+bytes(msg)
+            if HEADER.size+len(self.__batch)+len(entry)>MAX_DATAGRAM and self.__batch_count:
+                self.__flush()
+                self.__batch_start = timestamp_ns
+                self.__first_time = units
+                entry = var_len(0)+var_len(len(msg))+bytes(msg)
+            self.__last_time = max(units, self.__last_time)
+            self.__batch += entry
+            self.__batch_count += 1
+            if self.__redundancy and is_note_off(msg):
+                self.__batch_note_offs.append(bytes(msg))
+            if self.__batch_ns<=0:
+                self.__flush()
+            else:
+                self.__cond.notify()
+
+    def close(self):
+        with self.__cond:
+            self.__running = False
+            self.__cond.notify()
+        self.__thread.join()
+        with self.__cond:
+            if self.__batch_count:
+                self.__flush()
+
+    def __run(self):
+        with self.__cond:
+            while self.__running:
+                if not self.__batch_count:
+                    self.__cond.wait()
+                    continue
+                remaining = self.__batch_start+self.__batch_ns-time.monotonic_ns()
+                if remaining>0:
+                    self.__cond.wait(remaining/1e9)
+                else:
+                    self.__flush()
+
+    def __flush(self):
+        """send current batch (lock must be held)"""
+        seq = self.__seq
+        # NoteOffs of the previous datagrams
+        while self.__note_offs and ((seq-self.__note_offs[0][0])&0xFFFF)>self.__redundancy:
+            self.__note_offs.popleft()
+        recovery = bytearray()
+        count = 0
+        for entry_seq, msg in self.__note_offs:
+            if count==255 or HEADER.size+len(self.__batch)+len(recovery)+len(msg)+3>MAX_DATAGRAM:
+                break
+            recovery += struct.pack('>H', entry_seq)+var_len(len(msg))+msg
+            count += 1
+        datagram = HEADER.pack(MAGIC, VERSION, count, seq, self.__batch_count, self.__first_time&0xFFFFFFFF)+self.__batch+recovery
+        try:
+            self.__sock.sendto(datagram, self.__address)
+        except OSError as e:
+            print('error: can not send datagram to '+str(self.__address)+': '+str(e), file=sys.stderr)
+        self.sent_datagrams += 1
+        self.sent_messages += self.__batch_count
+        for msg in self.__batch_note_offs:
+            self.__note_offs.append((seq, msg))
+        self.__batch_note_offs = []
+        self.__seq = (seq+1)&0xFFFF
+        self.__batch = bytearray()
+        self.__batch_count = 0
+
+
+class BridgeReceiver:
+    """ Decode datagrams built by BridgeSender, detect lost datagrams with sequence numbers,
+        and deliver NoteOffs of lost datagrams from recovery entries
+
+        A datagram arriving after a more recent one stays lost : its messages are dropped, as
+        delivering them out of order (i.e. a NoteOn after its recovered NoteOff) would be worse
+    """
+    WINDOW = 256 # number of sequence numbers remembered
+
+    def __init__(self, on_message):
+        """on_message: function(msg:list[int], sender_time_ns:int), sender time is relative to the sender start"""
+        self.__on_message = on_message
+        self.__expected:int = None
+        self.__received:deque = deque()
+        self.__received_set:set = set()
+        self.__recovered:deque = deque() # (seq, msg) of NoteOffs already recovered
+        self.__recovered_set:set = set()
+        self.received_datagrams:int = 0
+        self.received_messages:int = 0
+        self.lost:int = 0
+        self.recovered:int = 0
+        self.late:int = 0
+        self.invalid:int = 0
+
+    def feed(self, datagram:bytes):
+        if len(datagram)<HEADER.size:
+            self.invalid += 1
+            return
+        magic, version, recovery_count, seq, msg_count, first_time = HEADER.unpack_from(datagram)
+        if magic!=MAGIC or version!=VERSION:
+            self.invalid += 1
+            return
+        if seq in self.__received_set:
+            self.late += 1 # duplicate
+            return
+        if self.__expected is not None:
+            gap = (seq-self.__expected)&0xFFFF
+            if gap>=0x8000:
+                # Arrived after a more recent datagram : counted as lost, and dropped
+                self.late += 1
+                self.__remember(seq)
+                return
+            self.lost += gap
+        self.__expected = (seq+1)&0xFFFF
+        self.__remember(seq)
+        self.received_datagrams += 1
+
+        try:
+            pos = HEADER.size
+            units = first_time
+            messages = []
+            for _ in range(msg_count):
+                delta, pos = read_var_len(datagram, pos)
+                length, pos = read_var_len(datagram, pos)
+                if pos+length>len(datagram):
+                    raise IndexError
+                units += delta
+                messages.append((list(datagram[pos:pos+length]), units*TIME_UNIT_NS))
+                pos += length
+            recovery = []
+            for _ in range(recovery_count):
+                entry_seq = struct.unpack_from('>H', datagram, pos)[0]
+                length, pos = read_var_len(datagram, pos+2)
+                if pos+length>len(datagram):
+                    raise IndexError
+                recovery.append((entry_seq, datagram[pos:pos+length]))
+                pos += length
+        except (IndexError, struct.error):
+            self.invalid += 1
+            return
+
+        # NoteOffs of lost datagrams were sent before the messages of this one
+        for key in recovery:
+            entry_seq = key[0]
+            if (entry_seq not in self.__received_set and key not in self.__recovered_set
+                    and ((seq-entry_seq)&0xFFFF)<BridgeReceiver.WINDOW):
+                self.__recovered.append(key)
+                self.__recovered_set.add(key)
+                if len(self.__recovered)>BridgeReceiver.WINDOW:
+                    self.__recovered_set.discard(self.__recovered.popleft())
+                self.recovered += 1
+                self.__on_message(list(key[1]), first_time*TIME_UNIT_NS)
+        for msg, timestamp in messages:
+            self.received_messages += 1
+            self.__on_message(msg, timestamp)
+
+    def stats(self)->str:
+        return (str(self.received_datagrams)+' datagrams, '+str(self.received_messages)+' messages, '+
+                str(self.lost)+' lost, '+str(self.recovered)+' NoteOffs recovered, '+str(self.late)+' late (dropped)')
+
+    def __remember(self, seq:int):
+        self.__received.append(seq)
+        self.__received_set.add(seq)
+        if len(self.__received)>BridgeReceiver.WINDOW:
+            self.__received_set.discard(self.__received.popleft())
+
+
+def parse_address(value:str, default_host:str = '0.0.0.0')->tuple[str, int]:
+    """parse "host:port" (or "port"), raises ValueError if invalid"""
+    host, _, port = value.rpartition(':')
+    port = int(port)
+    if port<0 or port>0xFFFF:
+        raise ValueError('invalid UDP port in "'+value+'"')
+    return (host.strip('[]') or default_host, port)
+
+
+class UdpBridge:
+    """ A UDP endpoint : messages given to send() go to the remote endpoint (BridgeSender),
+        datagrams received on the local address are given to on_message (BridgeReceiver)
+    """
+    def __init__(self, listen:tuple, remote:tuple, on_message, batch_ms:float = 1.0, redundancy:int = 2):
+        """
+        Args:
+            listen (tuple): local (host, port) to receive datagrams on
+            remote (tuple): (host, port) to send datagrams to, None to only receive
+            on_message: function(msg:list[int], sender_time_ns:int), called from the reception thread
+        """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(listen)
+        self.sock.settimeout(0.2)
+        self.receiver = BridgeReceiver(on_message)
+        self.sender = BridgeSender(self.sock, remote, batch_ms, redundancy) if remote else None
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='bridge-receiver', daemon=True)
+        self.__thread.start()
+
+    def send(self, msg:list[int], timestamp_ns:int = None):
+        if self.sender:
+            self.sender.put(msg, timestamp_ns)
+
+    def close(self):
+        if self.sender:
+            self.sender.close()
+        self.__running = False
+        self.__thread.join()
+        self.sock.close()
+
+    def stats(self)->str:
+        result = 'received: '+self.receiver.stats()
+        if self.sender:
+            result = 'sent: '+str(self.sender.sent_datagrams)+' datagrams, '+str(self.sender.sent_messages)+' messages, '+result
+        return result
+
+    def __run(self):
+        while self.__running:
+            try:
+                datagram = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if self.__running:
+                    print('error: can not receive datagram: '+str(e), file=sys.stderr)
+                continue
+            self.receiver.feed(datagram)
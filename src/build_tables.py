@@ -0,0 +1,99 @@
+""" Generate midi_tables.py from the enumerations defined in midi_enum.py
+
+    The generated module holds plain lists and dicts (value -> name, packed ID -> name),
+    so that decoding and printing messages does not need to build the Enum classes.
+    Run this script again each time midi_enum.py is modified.
+
+    usage : python build_tables.py [--check]
+        --check : do not write anything, exit with code 1 if midi_tables.py is out of date
+"""
+import hashlib, inspect, os, sys
+from midi_enum import ChannelMsg, ControlChange, ChannelMode, SystemCommonMsg, RealTimeMsg, NRTSysEx, RTSysEx, MsgCategory, Manufacturer
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+ENUM_FILE = os.path.join(SRC_DIR, 'midi_enum.py')
+TABLES_FILE = os.path.join(SRC_DIR, 'midi_tables.py')
+
+
+def pack_id(value)->int:
+    """pack an ID made of 1 to 3 bytes (int or tuple) into a single integer
+    A single byte ID is kept as is, a tuple is packed as (length<<24 | big-endian bytes)
+    """
+    if isinstance(value, int):
+        return value
+    packed = 0
+    for byte in value:
+        packed = (packed<<8) | byte
+    return (len(value)<<24) | packed
+
+
+def names_list(enum, size:int)->list:
+    names = [None]*size
+    for member in enum:
+        names[member.value] = member.name
+    return names
+
+def names_dict(enum)->dict:
+    return {pack_id(member.value):member.name for member in enum}
+
+def constants(enum)->list[str]:
+    return [enum.__name__+'_'+member.name+' = '+hex(member.value) for member in enum]
+
+def source_hash()->str:
+    with open(ENUM_FILE, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def generate()->str:
+    status_names = [None]*256
+    for enum in (SystemCommonMsg, RealTimeMsg):
+        for member in enum:
+            status_names[member.value] = member.name
+
+    lines = [
+        '# Generated by build_tables.py from midi_enum.py : do not edit',
+        '# Lookup tables used to decode and print messages without building midi_enum classes',
+        '',
+        "SOURCE_HASH = '"+source_hash()+"'",
+        '',
+    ]
+    lines += constants(ChannelMsg)
+    lines += constants(SystemCommonMsg)
+    lines += constants(RealTimeMsg)
+    lines += constants(MsgCategory)
+    lines += [
+        '',
+        '# value -> name (None if the value is not defined)',
+        'CHANNEL_MSG_NAMES = '+repr(names_list(ChannelMsg, 16)),
+        'CONTROL_CHANGE_NAMES = '+repr(names_list(ControlChange, 128)),
+        'CHANNEL_MODE_NAMES = '+repr(names_list(ChannelMode, 128)),
+        'STATUS_NAMES = '+repr(status_names),
+        'CATEGORY_NAMES = '+repr(names_list(MsgCategory, len(MsgCategory)+1)),
+        '',
+        '# packed ID (see pack_id()) -> name',
+        'NRT_SYSEX_NAMES = '+repr(names_dict(NRTSysEx)),
+        'RT_SYSEX_NAMES = '+repr(names_dict(RTSysEx)),
+        'MANUFACTURER_NAMES = '+repr(names_dict(Manufacturer)),
+        '',
+        '',
+        inspect.getsource(pack_id),
+    ]
+    return '\n'.join(lines)
+
+def main(argv)->int:
+    source = generate()
+    if '--check' in argv:
+        current = ''
+        if os.path.exists(TABLES_FILE):
+            with open(TABLES_FILE, 'r', encoding='utf-8') as file:
+                current = file.read()
+        if current != source:
+            print('error: '+TABLES_FILE+' is out of date, run build_tables.py', file=sys.stderr)
+            return 1
+        return 0
+    with open(TABLES_FILE, 'w', encoding='utf-8') as file:
+        file.write(source)
+    print('written: '+TABLES_FILE)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+import math, time
+from encoder import CLOCK, STOP, REAL_TIME
+
+# MIDI clock : 24 TimingClock messages per quarter note
+CLOCKS_PER_QUARTER = 24
+
+
+class JitterStats:
+    """ Lateness of scheduled events (actual time - deadline), in nanoseconds """
+    def __init__(self):
+        self.count:int = 0
+        self.max:int = 0
+        self.__sum:int = 0
+        self.__sum_sq:int = 0
+
+    def add(self, lateness:int):
+        self.count += 1
+        self.__sum += lateness
+        self.__sum_sq += lateness*lateness
+        if lateness>self.max:
+            self.max = lateness
+
+    def mean(self)->float:
+        return self.__sum/self.count if self.count else 0.0
+
+    def stddev(self)->float:
+        if not self.count:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(0.0, self.__sum_sq/self.count - mean*mean))
+
+    def to_string(self)->str:
+        return (str(self.count)+' events, lateness mean: '+('%.1f' % (self.mean()/1000))+' us, stddev: '+
+                ('%.1f' % (self.stddev()/1000))+' us, max: '+('%.1f' % (self.max/1000))+' us')
+
+
+class DeadlineScheduler:
+    """ Wait for absolute deadlines of time.perf_counter_ns()
+
+        Deadlines are computed from a fixed origin (never from the previous wake-up time),
+        so that errors do not accumulate. To be accurate below the resolution of time.sleep(),
+        the scheduler sleeps until spin_ns before the deadline, then spins.
+    """
+    def __init__(self, spin_ns:int = 1000000):
+        self.spin_ns = spin_ns
+        self.stats = JitterStats()
+
+    def wait_until(self, deadline:int)->int:
+        """wait until time.perf_counter_ns() reaches deadline, return the lateness in ns"""
+        remaining = deadline-time.perf_counter_ns()
+        if remaining>self.spin_ns:
+            time.sleep((remaining-self.spin_ns)/1e9)
+        now = time.perf_counter_ns()
+        while now<deadline:
+            now = time.perf_counter_ns()
+        lateness = now-deadline
+        self.stats.add(lateness)
+        return lateness
+
+    def play(self, events, send, start:int = None):
+        """send events at their time
+        Args:
+            events: iterable of (time in ns from start, item), sorted by time
+            send: function(item)
+            start (int): time.perf_counter_ns() origin of events (default is now)
+        """
+        if start is None:
+            start = time.perf_counter_ns()
+        for offset, item in events:
+            self.wait_until(start+offset)
+            send(item)
+
+
+class MidiClock:
+    """ Generate TimingClock messages at a given tempo, with a DeadlineScheduler """
+    def __init__(self, send, bpm:float, scheduler:DeadlineScheduler = None):
+        """
+        Args:
+            send: function(bytes) sending a real-time message (pre-encoded, see encoder.py)
+            bpm (float): tempo, in quarter notes per minute
+        """
+        if bpm<=0:
+            raise ValueError('invalid tempo: '+str(bpm))
+        self.__send = send
+        self.bpm = bpm
+        self.scheduler = scheduler if scheduler else DeadlineScheduler()
+        self.running = False
+
+    def run(self, start_msg:int = 0xFA, duration:float = None):
+        """send start_msg (Start or Continue, None for nothing), then TimingClock messages
+        until stop() is called (from another thread) or for duration seconds, then Stop
+        """
+        period = 60e9/(self.bpm*CLOCKS_PER_QUARTER)
+        count = math.inf if duration is None else int(duration*1e9/period)
+        self.running = True
+        origin = time.perf_counter_ns()
+        try:
+            if start_msg is not None:
+                self.__send(REAL_TIME[start_msg])
+            tick = 0
+            while self.running and tick<count:
+                # Deadline of tick n is computed from the origin : no drift
+                self.scheduler.wait_until(origin+round(tick*period))
+                self.__send(CLOCK)
+                tick += 1
+        finally:
+            self.running = False
+            self.__send(STOP)
+
+    def stop(self):
+        self.running = False
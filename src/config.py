@@ -0,0 +1,141 @@
+import json, os, sys
+from helpers import Helpers
+from midimsg import Filter, Rule
+
+# Rules configuration file (JSON) :
+# {
+#     "groups": [                         a message must pass every group (see Rule)
+#         [                               filters of a group
+#             {
+#                 "types": "NoteOn, NoteOff",  message types or categories (string or list, default: all)
+#                 "channels": "1-4",           range of channels (default: all)
+#                 "velocities": "1-127",       range of note velocities (default: all)
+#                 "exclude": false             remove selected messages, instead of keeping them
+#             }
+#         ]
+#     ],
+#     "splits": [                         keyboard split of transfer to several outputs (see router.SplitRouter)
+#         {
+#             "channels": "1-16",          range of channels (default: all)
+#             "notes": "C1-B3",            range of notes, as printed by capture, or numbers (default: all)
+#             "outputs": [1, "Synth"]      indexes (from 1) or names of the output ports
+#         }
+#     ]
+# }
+
+def filter_from_dict(value:dict)->Filter:
+    """build and compile a filter, raises ValueError if a value is invalid"""
+    if not isinstance(value, dict):
+        raise ValueError('a filter must be an object, not '+json.dumps(value))
+    unknown = set(value)-{'types', 'channels', 'velocities', 'exclude'}
+    if unknown:
+        raise ValueError('unknown filter attribute(s): '+', '.join(sorted(unknown)))
+    flt = Filter()
+    flt.inclusive = not value.get('exclude', False)
+    types = value.get('types', [])
+    if isinstance(types, str):
+        types = types.split(',')
+    flt.types = [str(name).strip() for name in types if str(name).strip()]
+    if 'channels' in value:
+        channels = Helpers.str_to_range(str(value['channels']), 1, 16)
+        if not channels:
+            raise ValueError('invalid channel range "'+str(value['channels'])+'"')
+        flt.channel_min, flt.channel_max = channels[0]-1, channels[1]-1
+    if 'velocities' in value:
+        velocities = Helpers.str_to_range(str(value['velocities']), 0, 127)
+        if not velocities:
+            raise ValueError('invalid velocity range "'+str(value['velocities'])+'"')
+        flt.velocity_min, flt.velocity_max = velocities
+    flt.compile()
+    return flt
+
+def load_rule(path:str)->Rule:
+    """read a rules configuration file, raises OSError if it can not be read, ValueError if it is invalid
+    Filters are compiled here, so that the returned rule is ready to be used by the reception thread
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            content = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError(path+': '+str(e))
+    groups = content.get('groups', []) if isinstance(content, dict) else None
+    if not isinstance(groups, list) or not all(isinstance(group, list) for group in groups):
+        raise ValueError(path+': "groups" must be a list of lists of filters')
+    rule = Rule()
+    try:
+        rule.filters = [[filter_from_dict(value) for value in group] for group in groups]
+    except ValueError as e:
+        raise ValueError(path+': '+str(e))
+    return rule
+
+
+def load_splits(path:str, outputs:list[str])->list['Zone']:
+    """read the keyboard split of a configuration file (None if it has no "splits"),
+    raises OSError if it can not be read, ValueError if it is invalid
+    """
+    from router import zone_from_values
+    with open(path, 'r', encoding='utf-8') as file:
+        try:
+            content = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError(path+': '+str(e))
+    if not isinstance(content, dict) or 'splits' not in content:
+        return None
+    splits = content['splits']
+    if not isinstance(splits, list) or not all(isinstance(split, dict) for split in splits):
+        raise ValueError(path+': "splits" must be a list of objects')
+    try:
+        return [zone_from_values(split.get('channels'), str(split.get('notes', '0-127')), split.get('outputs', []), outputs)
+                for split in splits]
+    except ValueError as e:
+        raise ValueError(path+': '+str(e))
+
+
+class RuleReloader:
+    """ Load a rules configuration file again when it is modified (check() is called periodically)
+        or when reload() is called (i.e. on SIGHUP)
+
+        The new rule is built and compiled by the calling thread, then given to apply(), which
+        only has to replace the reference used by the reception thread : messages are always
+        filtered by a complete rule, without any lock. If the file is not valid, the current
+        rule is kept.
+        An editor may save a file in several steps (i.e. write, then replace) : the file is only
+        reloaded once its modification time and size are the same for two consecutive checks.
+    """
+    def __init__(self, path:str, apply, load = load_rule):
+        """
+        Args:
+            apply: function(Rule) installing the new rule
+            load: function(path) reading the file (i.e. load_splits() to reload a keyboard split)
+        """
+        self.path = path
+        self.__apply = apply
+        self.__load = load
+        self.__stamp = self.__get_stamp()   # stamp of the last loaded file
+        self.__pending = self.__stamp       # stamp seen by the last check
+
+    def check(self):
+        """reload the file if it has been modified since the last load, and not since the last check"""
+        stamp = self.__get_stamp()
+        pending = self.__pending
+        self.__pending = stamp
+        if stamp is not None and stamp==pending and stamp!=self.__stamp:
+            self.reload()
+
+    def reload(self)->bool:
+        self.__stamp = self.__pending = self.__get_stamp()
+        try:
+            value = self.__load(self.path)
+        except (OSError, ValueError) as e:
+            print('error: rules not reloaded, '+str(e), file=sys.stderr)
+            return False
+        self.__apply(value)
+        print('rules reloaded from "'+self.path+'"', file=sys.stderr)
+        return True
+
+    def __get_stamp(self)->tuple:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,78 @@
+import json, os, sys, threading, time
+from midi_tables import *
+
+# Identity of the devices connected to the midi ports (General Information, non real-time universal SysEx)
+#   Identity Request : F0 7E <device ID, 7F : all devices> 06 01 F7
+#   Identity Reply   : F0 7E <device ID> 06 02 <manufacturer : 1 or 3 bytes> <family : 2 bytes>
+#                      <model : 2 bytes> <version : 4 bytes> F7 (family and model LSB first)
+# Cache file (JSON), written by the discover command, so that device names are known without scanning :
+# {
+#     "time": 1700000000,                  when the ports were scanned (s since epoch)
+#     "ports": {
+#         "<input port name>": [           devices which answered on this port
+#             {"device_id": 16, "manufacturer_id": 65, "manufacturer": "ROLAND_CORPORATION",
+#              "family": 1, "model": 2, "version": [0, 1, 0, 0], "output": "<output port name, if any>"}
+#         ]
+#     }
+# }
+_NRT = {name:packed for packed, name in NRT_SYSEX_NAMES.items()}
+_ID_REQUEST = _NRT['GeneralInfo_IdRequest']
+_ID_REPLY = _NRT['GeneralInfo_IdReply']
+ID_REQUEST = bytes((SystemCommonMsg_SystemExclusive, 0x7E, 0x7F, (_ID_REQUEST>>8)&0x7F, _ID_REQUEST&0x7F, SystemCommonMsg_EndOfExclusive))
+CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'midimator', 'devices.json')
+
+
+def parse_id_reply(msg:list[int])->dict:
+    """return the device described by an Identity Reply (see cache file), None if msg is not one"""
+    if len(msg)<15 or msg[1]!=0x7E or msg[3]!=(_ID_REPLY>>8)&0x7F or msg[4]!=_ID_REPLY&0x7F:
+        return None
+    if msg[5]:
+        manufacturer = msg[5]
+        pos = 6
+    else:
+        manufacturer = (3<<24)|(msg[6]<<8)|msg[7]
+        pos = 8
+    if len(msg)!=pos+9:
+        return None
+    return {'device_id': msg[2], 'manufacturer_id': manufacturer, 'manufacturer': MANUFACTURER_NAMES.get(manufacturer, 'Unknown'),
+            'family': msg[pos]|(msg[pos+1]<<7), 'model': msg[pos+2]|(msg[pos+3]<<7), 'version': list(msg[pos+4:pos+8])}
+
+def describe(device:dict)->str:
+    return device['manufacturer'].replace('_', ' ')+' (family '+str(device['family'])+', model '+str(device['model']) \
+        +', version '+'.'.join(str(value) for value in device['version'])+', device ID '+str(device['device_id'])+')'
+
+def load_cache(path:str = CACHE_PATH)->dict:
+    """return the devices of the last scan, by input port name ({} if there is no cache)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            ports = json.load(file).get('ports', {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+    return ports if isinstance(ports, dict) else {}
+
+def save_cache(ports:dict, path:str = CACHE_PATH):
+    """raises OSError if the file can not be written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written aside then renamed, so that a reader never gets a partial file
+    with open(path+'.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'time': int(time.time()), 'ports': ports}, file, indent=4)
+    os.replace(path+'.tmp', path)
+
+
+class IdentityCollector:
+    """ Identity Replies received on several input ports (callback of each port, see callback())
+        Replies are kept by port, in reception order
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.devices:dict[str, list[dict]] = {}
+
+    def callback(self, port:str, midimsg:'mido.Message'):
+        if midimsg.type!='sysex':
+            return
+        device = parse_id_reply(midimsg.bytes())
+        if device:
+            with self.__lock:
+                devices = self.devices.setdefault(port, [])
+                if device not in devices:
+                    devices.append(device)
@@ -0,0 +1,564 @@
+import os, queue, struct, sys, time, wave
+from array import array
+from midi_tables import *
+
+# Sample Dump Standard (SDS) and MIDI File Dump, non real-time universal SysEx (F0 7E <device> ...)
+#   SDS header       : F0 7E cc 01 sl sh ee pf pf pf gf gf gf hh hh hh ll ll ll tt F7
+#                      sample number (14 bits), bits per word (8-28), sample period (ns), length,
+#                      sustain loop start and end (words), loop type (00 forward, 01 alternating,
+#                      7F off). Values are 7 bits bytes, LSB first
+#   SDS data packet  : F0 7E cc 02 kk <120 bytes> xx F7
+#                      unsigned words (0 : full negative), left-justified in (bits+6)/7 bytes, MSB first
+#   File header      : F0 7E cc 07 01 ss <type : 4 ASCII chars> <length : 4 bytes> <name : ASCII> F7
+#   File data packet : F0 7E cc 07 02 kk bb <bb+1 encoded bytes> xx F7
+#                      groups of up to 7 bytes, each one preceded by a byte of their high bits
+#                      (bit 6 : high bit of the first byte of the group)
+#   Handshake        : F0 7E cc <7B EOF, 7C Wait, 7D Cancel, 7E NAK, 7F ACK> kk F7
+# kk : packet number modulo 128 (header : 0), xx : XOR of the bytes between F0 and xx
+# Samples are read from and written to mono WAV files (period and loop in a "smpl" chunk)
+_NRT = {name:packed for packed, name in NRT_SYSEX_NAMES.items()}
+SDS_HEADER = _NRT['Sample_Dump_Header']
+SDS_PACKET = _NRT['Sample_Data_Packet']
+SDS_REQUEST = _NRT['Sample_Dump_Request']
+FILE_DUMP = (_NRT['FileDump_Header']>>8)&0x7F
+FILE_HEADER = _NRT['FileDump_Header']&0x7F
+FILE_PACKET = _NRT['FileDump_DataPacket']&0x7F
+EOF = _NRT['EndOfFile']
+WAIT = _NRT['Wait']
+CANCEL = _NRT['Cancel']
+NAK = _NRT['NAK']
+ACK = _NRT['ACK']
+HANDSHAKE_NAMES = {EOF:'EOF', WAIT:'Wait', CANCEL:'Cancel', NAK:'NAK', ACK:'ACK'}
+
+SDS_PACKET_BYTES = 120
+FILE_PACKET_BYTES = 98          # 112 encoded bytes
+HEADER_TIMEOUT = 2.0            # time given to the receiver to answer a header (then : open loop)
+PACKET_TIMEOUT = 0.02           # time given to the receiver to answer a packet
+FILE_TYPES = {'.mid':'MIDI', '.midi':'MIDI', '.txt':'TEXT', '.syx':'MIEX'}
+
+_SMPL = struct.Struct('<9I')    # manufacturer, product, period (ns), unity note, pitch fraction, SMPTE format and offset, loops, sampler data
+_SMPL_LOOP = struct.Struct('<6I') # cue ID, type (0 forward, 1 alternating), start, end, fraction, play count
+_SDS_LOOP_OFF = 0x7F
+_FRAME_RATES = (8000, 11025, 16000, 22050, 32000, 44100, 48000, 88200, 96000, 192000)
+
+
+def checksum(msg)->int:
+    """XOR of the bytes of a packet between F0 and its checksum (msg is the whole packet)"""
+    value = 0
+    for byte in msg[1:-2]:
+        value ^= byte
+    return value
+
+def handshake(kind:int, device:int, number:int)->bytes:
+    return bytes((SystemCommonMsg_SystemExclusive, 0x7E, device, kind, number&0x7F, SystemCommonMsg_EndOfExclusive))
+
+def parse_handshake(msg:list[int])->tuple[int, int]:
+    """return (kind, packet number) of a handshake message, None if msg is not one"""
+    if len(msg)==6 and msg[1]==0x7E and msg[3] in HANDSHAKE_NAMES:
+        return msg[3], msg[4]
+    return None
+
+def sample_request(device:int, sample:int)->bytes:
+    return bytes((SystemCommonMsg_SystemExclusive, 0x7E, device, SDS_REQUEST, sample&0x7F, (sample>>7)&0x7F, SystemCommonMsg_EndOfExclusive))
+
+def _to_7bits(value:int, size:int)->list[int]:
+    return [(value>>(7*idx))&0x7F for idx in range(size)]
+
+def _from_7bits(msg, pos:int, size:int)->int:
+    return sum(msg[pos+idx]<<(7*idx) for idx in range(size))
+
+def encode_8to7(data:bytes)->bytearray:
+    result = bytearray()
+    for start in range(0, len(data), 7):
+        group = data[start:start+7]
+        high = 0
+        for idx, byte in enumerate(group):
+            high |= (byte>>7)<<(6-idx)
+        result.append(high)
+        result += bytes(byte&0x7F for byte in group)
+    return result
+
+def decode_7to8(data)->bytearray:
+    result = bytearray()
+    for start in range(0, len(data), 8):
+        high = data[start]
+        result += bytes(byte|(((high>>(6-idx))&1)<<7) for idx, byte in enumerate(data[start+1:start+8]))
+    return result
+
+
+# Words of SDS <-> frames of WAV (little-endian, signed except 8 bits)
+def _frames_to_words(frames:bytes, width:int, bits:int)->list[int]:
+    if width==1:
+        return [value>>(8-bits) for value in frames]
+    if width==3:
+        values = [int.from_bytes(frames[pos:pos+3], 'little', signed=True) for pos in range(0, len(frames), 3)]
+    else:
+        values = array('h' if width==2 else 'i', frames)
+        if sys.byteorder=='big':
+            values.byteswap()
+    shift = width*8-bits
+    offset = 1<<(bits-1)
+    return [(value>>shift)+offset for value in values]
+
+def _words_to_frames(words:list[int], width:int, bits:int)->bytes:
+    if width==1:
+        return bytes(word<<(8-bits) for word in words)
+    shift = width*8-bits
+    offset = 1<<(bits-1)
+    if width==3:
+        return b''.join(((word-offset)<<shift).to_bytes(3, 'little', signed=True) for word in words)
+    values = array('h' if width==2 else 'i', [(word-offset)<<shift for word in words])
+    if sys.byteorder=='big':
+        values.byteswap()
+    return values.tobytes()
+
+def _frame_rate(period:int)->int:
+    """frame rate of a sample period (ns), the usual rate it was rounded from if any"""
+    rate = 1e9/period
+    return next((usual for usual in _FRAME_RATES if abs(usual-rate)<1), round(rate))
+
+def _read_smpl(path:str)->tuple:
+    """return (period in ns, (loop start, end, SDS type)) of the "smpl" chunk of a WAV file (None if missing)"""
+    with open(path, 'rb') as file:
+        file.seek(12)
+        while True:
+            header = file.read(8)
+            if len(header)<8:
+                return None, None
+            chunk_id, size = struct.unpack('<4sI', header)
+            if chunk_id!=b'smpl' or size<_SMPL.size:
+                file.seek(size+(size&1), os.SEEK_CUR)
+                continue
+            fields = _SMPL.unpack(file.read(_SMPL.size))
+            loop = None
+            if fields[7] and size>=_SMPL.size+_SMPL_LOOP.size:
+                _, loop_type, start, end, _, _ = _SMPL_LOOP.unpack(file.read(_SMPL_LOOP.size))
+                loop = (start, end, 1 if loop_type==1 else 0)
+            return fields[2] or None, loop
+
+def _append_smpl(path:str, period:int, loop:tuple):
+    """append a "smpl" chunk (period and sustain loop) to a WAV file written by the wave module"""
+    data = _SMPL.pack(0, 0, period, 60, 0, 0, 0, 1 if loop else 0, 0)
+    if loop:
+        data += _SMPL_LOOP.pack(0, loop[2], loop[0], loop[1], 0, 0)
+    with open(path, 'r+b') as file:
+        file.seek(0, os.SEEK_END)
+        file.write(b'smpl'+struct.pack('<I', len(data))+data)
+        size = file.tell()-8
+        file.seek(4)
+        file.write(struct.pack('<I', size))
+
+
+class _SampleSource:
+    """packets of a mono WAV file, read when they are sent"""
+    def __init__(self, path:str, sample:int):
+        period, self.__loop = _read_smpl(path)
+        self.__wave = wave.open(path, 'rb')
+        if self.__wave.getnchannels()!=1:
+            self.__wave.close()
+            raise ValueError('only mono WAV files can be sent as samples')
+        self.__width = self.__wave.getsampwidth()
+        self.__bits = min(self.__width*8, 28)
+        self.__word_size = (self.__bits+6)//7
+        self.__words = SDS_PACKET_BYTES//self.__word_size
+        self.__shifts = [7*(self.__word_size-1-idx) for idx in range(self.__word_size)]
+        self.__justify = 7*self.__word_size-self.__bits
+        self.__sample = sample
+        self.__period = period or round(1e9/self.__wave.getframerate())
+        self.length = self.__wave.getnframes()
+        if self.length>=1<<21:
+            self.__wave.close()
+            raise ValueError('sample is too long ('+str(self.length)+' words, at most '+str((1<<21)-1)+')')
+        self.packets = -(-self.length//self.__words)
+        self.data_bytes = self.length*self.__width
+
+    def describe(self)->str:
+        return 'sample '+str(self.__sample)+', '+str(self.__bits)+' bits, '+str(_frame_rate(self.__period))+' Hz, '+str(self.length)+' words'
+
+    def header(self, device:int)->bytes:
+        start, end, loop_type = self.__loop or (0, 0, _SDS_LOOP_OFF)
+        return bytes([SystemCommonMsg_SystemExclusive, 0x7E, device, SDS_HEADER, self.__sample&0x7F, (self.__sample>>7)&0x7F, self.__bits]
+                     +_to_7bits(self.__period, 3)+_to_7bits(self.length, 3)+_to_7bits(start, 3)+_to_7bits(end, 3)+[loop_type, SystemCommonMsg_EndOfExclusive])
+
+    def packet(self, device:int, number:int)->bytes:
+        msg = bytearray(SDS_PACKET_BYTES+7)
+        msg[0:5] = (SystemCommonMsg_SystemExclusive, 0x7E, device, SDS_PACKET, number&0x7F)
+        pos = 5
+        for word in _frames_to_words(self.__wave.readframes(self.__words), self.__width, self.__bits):
+            word <<= self.__justify
+            for shift in self.__shifts:
+                msg[pos] = (word>>shift)&0x7F
+                pos += 1
+        msg[-2] = checksum(msg)
+        msg[-1] = SystemCommonMsg_EndOfExclusive
+        return bytes(msg)
+
+    def close(self):
+        self.__wave.close()
+
+
+class _FileSource:
+    """packets of any file (File Dump), read when they are sent"""
+    def __init__(self, path:str, file_type:str = None):
+        extension = os.path.splitext(path)[1].lower()
+        self.__type = (file_type or FILE_TYPES.get(extension, 'BIN ')).ljust(4)[:4]
+        self.__name = os.path.basename(path)
+        self.__file = open(path, 'rb')
+        self.length = os.fstat(self.__file.fileno()).st_size
+        if self.length>=1<<28:
+            self.__file.close()
+            raise ValueError('file is too large ('+str(self.length)+' bytes, at most '+str((1<<28)-1)+')')
+        self.packets = -(-self.length//FILE_PACKET_BYTES)
+        self.data_bytes = self.length
+
+    def describe(self)->str:
+        return 'file "'+self.__name+'" ('+self.__type.strip()+'), '+str(self.length)+' bytes'
+
+    def header(self, device:int)->bytes:
+        return bytes([SystemCommonMsg_SystemExclusive, 0x7E, device, FILE_DUMP, FILE_HEADER, device]+[ord(char)&0x7F for char in self.__type]
+                     +_to_7bits(self.length, 4)+[byte&0x7F for byte in self.__name.encode('ascii', 'replace')]+[SystemCommonMsg_EndOfExclusive])
+
+    def packet(self, device:int, number:int)->bytes:
+        data = encode_8to7(self.__file.read(FILE_PACKET_BYTES))
+        msg = bytearray((SystemCommonMsg_SystemExclusive, 0x7E, device, FILE_DUMP, FILE_PACKET, number&0x7F, len(data)-1))
+        msg += data
+        msg += b'\0\xF7'
+        msg[-2] = checksum(msg)
+        return bytes(msg)
+
+    def close(self):
+        self.__file.close()
+
+
+class _SampleSink:
+    """write the packets of a sample dump to a mono WAV file"""
+    number_pos = 4
+
+    def __init__(self, path:str, header:list[int]):
+        if len(header)!=21 or not 8<=header[6]<=28:
+            raise ValueError('invalid sample dump header')
+        self.__sample = header[4]|(header[5]<<7)
+        self.__bits = header[6]
+        self.__period = _from_7bits(header, 7, 3)
+        self.length = _from_7bits(header, 10, 3)
+        self.__loop = (_from_7bits(header, 13, 3), _from_7bits(header, 16, 3), header[19]) if header[19]!=_SDS_LOOP_OFF else None
+        if not self.__period:
+            raise ValueError('invalid sample period (0)')
+        self.__width = (self.__bits+7)//8
+        self.__word_size = (self.__bits+6)//7
+        self.__words = SDS_PACKET_BYTES//self.__word_size
+        self.__justify = 7*self.__word_size-self.__bits
+        self.packets = -(-self.length//self.__words)
+        self.data_bytes = self.length*self.__width
+        self.__remaining = self.length
+        if os.path.isdir(path):
+            path = os.path.join(path, 'sample-'+str(self.__sample)+'.wav')
+        self.path = path
+        self.__wave = wave.open(path, 'wb')
+        self.__wave.setnchannels(1)
+        self.__wave.setsampwidth(self.__width)
+        self.__wave.setframerate(_frame_rate(self.__period))
+
+    def is_packet(self, msg:list[int])->bool:
+        return len(msg)==SDS_PACKET_BYTES+7 and msg[3]==SDS_PACKET
+
+    def describe(self)->str:
+        return 'sample '+str(self.__sample)+', '+str(self.__bits)+' bits, '+str(_frame_rate(self.__period))+' Hz, '+str(self.length)+' words'
+
+    def write(self, msg:list[int]):
+        count = min(self.__words, self.__remaining)
+        words = []
+        pos = 5
+        for _ in range(count):
+            word = 0
+            for byte in msg[pos:pos+self.__word_size]:
+                word = (word<<7)|byte
+            words.append(word>>self.__justify)
+            pos += self.__word_size
+        self.__wave.writeframesraw(_words_to_frames(words, self.__width, self.__bits))
+        self.__remaining -= count
+
+    def close(self):
+        self.__wave.close()
+        _append_smpl(self.path, self.__period, self.__loop)
+
+
+class _FileSink:
+    """write the packets of a file dump to a file"""
+    number_pos = 5
+
+    def __init__(self, path:str, header:list[int]):
+        if len(header)<15:
+            raise ValueError('invalid file dump header')
+        self.__type = ''.join(chr(byte) for byte in header[6:10])
+        self.length = _from_7bits(header, 10, 4)
+        self.__name = bytes(header[14:-1]).decode('ascii', 'replace')
+        self.packets = -(-self.length//FILE_PACKET_BYTES)
+        self.data_bytes = self.length
+        self.__remaining = self.length
+        if os.path.isdir(path):
+            path = os.path.join(path, os.path.basename(self.__name) or 'dump.bin')
+        self.path = path
+        self.__file = open(path, 'wb')
+
+    def is_packet(self, msg:list[int])->bool:
+        return len(msg)>10 and msg[3]==FILE_DUMP and msg[4]==FILE_PACKET and len(msg)==msg[6]+10
+
+    def describe(self)->str:
+        return 'file "'+self.__name+'" ('+self.__type.strip()+'), '+str(self.length)+' bytes'
+
+    def write(self, msg:list[int]):
+        data = decode_7to8(msg[7:-2])[:self.__remaining]
+        self.__file.write(data)
+        self.__remaining -= len(data)
+
+    def close(self):
+        self.__file.close()
+
+
+class MessageQueue:
+    """ Non real-time universal SysEx received on an input port (callback()), read by the dump
+        sender or receiver (get()). At most maxsize messages wait : extra messages are lost, as if
+        they were lost on the link (the handshake recovers them)
+    """
+    def __init__(self, maxsize:int = 1024):
+        self.__queue = queue.Queue(maxsize)
+        self.lost:int = 0
+
+    def callback(self, midimsg:'mido.Message'):
+        if midimsg.type=='sysex':
+            self.put(midimsg.bytes())
+
+    def put(self, msg:list[int]):
+        if len(msg)>3 and msg[1]==0x7E:
+            try:
+                self.__queue.put_nowait(msg)
+            except queue.Full:
+                self.lost += 1
+
+    def get(self, timeout:float = None)->list[int]:
+        """return the next message, None if none is received within timeout seconds (None : wait
+        until a message is received)"""
+        deadline = time.monotonic()+timeout if timeout is not None else None
+        while True:
+            # Short waits, so that CTRL+C is handled while waiting
+            wait = 0.5 if deadline is None else min(0.5, deadline-time.monotonic())
+            if wait<=0:
+                return None
+            try:
+                return self.__queue.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and time.monotonic()>=deadline:
+                    return None
+
+    def handshake(self, timeout:float = None)->tuple[int, int]:
+        """return the next handshake (kind, packet number), None if none is received within timeout seconds"""
+        deadline = time.monotonic()+timeout if timeout is not None else None
+        while True:
+            msg = self.get(None if deadline is None else max(0.0, deadline-time.monotonic()))
+            if msg is None:
+                return None
+            reply = parse_handshake(msg)
+            if reply:
+                return reply
+
+
+class DumpStats:
+    def __init__(self, data_bytes:int):
+        self.start_ns:int = time.monotonic_ns()
+        self.data_bytes:int = data_bytes
+        self.packets:int = 0
+        self.bytes:int = 0         # MIDI bytes sent or received (packets, handshake excluded)
+        self.retransmits:int = 0   # packets sent again (sender), or received with an error (receiver)
+        self.open_loop:bool = False
+
+    def summary(self)->str:
+        seconds = max(1e-9, (time.monotonic_ns()-self.start_ns)/1e9)
+        data_bytes = self.data_bytes
+        return str(data_bytes)+' bytes of data in '+str(self.packets)+' packets ('+str(self.bytes)+' bytes of MIDI, '+str(self.retransmits)+' retransmitted'+(', open loop' if self.open_loop else '') \
+            +') in '+('%.3f' % seconds)+' s : '+str(round(data_bytes/seconds))+' bytes/s of data, '+str(round(self.bytes/seconds))+' bytes/s of MIDI'
+
+
+def send_dump(path:str, send, messages:MessageQueue = None, device:int = 0, sample:int = 0, window:int = 1,
+              packet_timeout:float = PACKET_TIMEOUT, retries:int = 8, file_type:str = None)->DumpStats:
+    """ Send a WAV file (.wav) as a sample dump, or any other file as a file dump
+
+        Up to `window` packets are sent without waiting for their ACK (1 : standard handshake), and
+        kept until they are acknowledged. A NAK sends the packets again from the NAKed one, Wait
+        pauses until the next handshake, Cancel aborts. Without answer to the header (or without
+        messages queue), packets are sent without handshake (open loop), every packet_timeout
+        seconds. Without ACK of a packet, the window is sent again (at most `retries` times in a
+        row, then open loop)
+    Args:
+        send: function sending a raw message
+        messages (MessageQueue): messages received from the device, None for open loop
+    Returns:
+        DumpStats: None (after printing an error) if the dump could not be sent
+    """
+    try:
+        source = _SampleSource(path, sample) if os.path.splitext(path)[1].lower()=='.wav' else _FileSource(path, file_type)
+    except (OSError, EOFError, ValueError, wave.Error) as e:
+        print('error: can not read "'+path+'": '+str(e), file=sys.stderr)
+        return None
+    try:
+        print('sending '+source.describe()+' ('+str(source.packets)+' packets)', file=sys.stderr)
+        return _send_packets(source, send, messages, device, max(1, min(window, 64)), packet_timeout, retries)
+    finally:
+        source.close()
+
+def _send_packets(source, send, messages:MessageQueue, device:int, window:int, packet_timeout:float, retries:int)->DumpStats:
+    stats = DumpStats(source.data_bytes)
+    header = source.header(device)
+    reply = None
+    for _ in range(retries+1):
+        send(header)
+        reply = messages.handshake(HEADER_TIMEOUT) if messages else None
+        while reply and reply[0]==WAIT:
+            reply = messages.handshake()
+        if not reply or reply[0]!=NAK:
+            break
+    if reply and reply[0]==CANCEL:
+        print('error: dump cancelled by the receiver', file=sys.stderr)
+        return None
+    if reply and reply[0]==NAK:
+        print('error: header refused by the receiver', file=sys.stderr)
+        return None
+    stats.open_loop = reply is None
+    # Packets are read once, and kept until they are acknowledged : ring[idx % window]
+    ring = [None]*window
+    base = 0        # first packet not acknowledged
+    next_idx = 0    # next packet to send
+    read = 0        # packets read from the source
+    attempts = 0    # retransmissions since the last progress
+    while base<source.packets:
+        while next_idx<source.packets and next_idx-base<window:
+            if next_idx==read:
+                ring[read%window] = source.packet(device, read)
+                read += 1
+            else:
+                stats.retransmits += 1
+            packet = ring[next_idx%window]
+            send(packet)
+            stats.packets += 1
+            stats.bytes += len(packet)
+            next_idx += 1
+        if messages is None:
+            time.sleep(packet_timeout)
+            base = next_idx
+            continue
+        reply = messages.handshake(packet_timeout)
+        while reply and reply[0]==WAIT:
+            reply = messages.handshake()
+        if reply is None:
+            if stats.open_loop:
+                base = next_idx
+            elif attempts<retries:
+                attempts += 1
+                next_idx = base
+            else:
+                print('warning: no answer from the receiver, packets are sent without handshake', file=sys.stderr)
+                stats.open_loop = True
+                base = next_idx
+            continue
+        kind, number = reply
+        if kind==CANCEL:
+            print('error: dump cancelled by the receiver (packet '+str(base)+')', file=sys.stderr)
+            return None
+        # Packet number (7 bits) of a packet sent and not acknowledged yet
+        idx = base+((number-base)&0x7F)
+        if idx>=next_idx:
+            continue
+        stats.open_loop = False
+        if kind==ACK:
+            base = idx+1
+            attempts = 0
+        elif kind==NAK:
+            if attempts>=retries:
+                print('error: packet '+str(idx)+' refused '+str(attempts+1)+' times', file=sys.stderr)
+                return None
+            attempts += 1
+            base = idx
+            next_idx = idx
+    return stats
+
+def receive_dump(path:str, messages:MessageQueue, send = None, device:int = None, request:int = None, timeout:float = 10.0)->DumpStats:
+    """ Receive a sample dump (written as a WAV file) or a file dump
+
+        Each packet is checked and written to the file as soon as it is received : ACK when it is
+        valid, NAK when it is not or when a packet is missing (the sender sends the packets again
+        from the NAKed one). Without send function, no handshake is sent (open loop : invalid
+        packets are written as they are)
+    Args:
+        path (str): file to write, or directory (the name is given by the dump)
+        send: function sending a raw message to the device (None : open loop)
+        device (int): only accept the dump of this device ID (None : any device)
+        request (int): number of the sample to ask for (Sample Dump Request), None to wait for a dump
+        timeout (float): seconds to wait for the dump, and for each packet
+    Returns:
+        DumpStats: None (after printing an error) if the dump was not received
+    """
+    if request is not None and send:
+        send(sample_request(0x7F if device is None else device, request))
+    header = None
+    while header is None:
+        msg = messages.get(timeout)
+        if msg is None:
+            print('error: no dump received within '+str(timeout)+' s', file=sys.stderr)
+            return None
+        if device is not None and msg[2]!=device:
+            continue
+        if msg[3]==SDS_HEADER or (msg[3]==FILE_DUMP and len(msg)>4 and msg[4]==FILE_HEADER):
+            header = msg
+    device = header[2]
+    try:
+        sink = _SampleSink(path, header) if header[3]==SDS_HEADER else _FileSink(path, header)
+    except (OSError, ValueError, wave.Error) as e:
+        print('error: can not write "'+path+'": '+str(e), file=sys.stderr)
+        if send:
+            send(handshake(CANCEL, device, 0))
+        return None
+    print('receiving '+sink.describe()+' ('+str(sink.packets)+' packets) to "'+sink.path+'"', file=sys.stderr)
+    stats = DumpStats(sink.data_bytes)
+    stats.open_loop = send is None
+    try:
+        if send:
+            send(handshake(ACK, device, 0))
+        expected = 0
+        nak_sent = False  # one NAK by missing packet : the next packets of the window are ignored
+        while expected<sink.packets:
+            msg = messages.get(timeout)
+            if msg is None:
+                print('error: packet '+str(expected)+' not received within '+str(timeout)+' s', file=sys.stderr)
+                return None
+            if msg[2]!=device:
+                continue
+            reply = parse_handshake(msg)
+            if reply and reply[0]==CANCEL:
+                print('error: dump cancelled by the sender (packet '+str(expected)+')', file=sys.stderr)
+                return None
+            if not sink.is_packet(msg):
+                continue
+            number = msg[sink.number_pos]
+            if number!=expected&0x7F:
+                if send and not nak_sent and ((number-expected)&0x7F)<64:
+                    send(handshake(NAK, device, expected))
+                    nak_sent = True
+                elif send and ((expected-number)&0x7F)<64:
+                    # Sent again because its ACK was lost
+                    send(handshake(ACK, device, number))
+                continue
+            stats.packets += 1
+            stats.bytes += len(msg)
+            if send and msg[-2]!=checksum(msg):
+                stats.retransmits += 1
+                send(handshake(NAK, device, number))
+                nak_sent = True
+                continue
+            sink.write(msg)
+            expected += 1
+            nak_sent = False
+            if send:
+                send(handshake(ACK, device, number))
+    finally:
+        sink.close()
+    return stats
@@ -0,0 +1,149 @@
+import sys
+from midi_tables import *
+from smf import DATA_LEN
+
+# Raw midi messages built without mido : mido.Message.from_bytes() checks every value and builds
+# an object per message, which costs more than sending it when messages are generated by a script
+# Messages sent often (real time, panic, program changes) are encoded and checked once, below,
+# as immutable bytes that can be given to a sender any number of times
+
+# Real-time messages
+CLOCK = bytes([RealTimeMsg_TimingClock])
+START = bytes([RealTimeMsg_Start])
+CONTINUE = bytes([RealTimeMsg_Continue])
+STOP = bytes([RealTimeMsg_Stop])
+ACTIVE_SENSING = bytes([RealTimeMsg_ActiveSensing])
+RESET = bytes([RealTimeMsg_Reset])
+REAL_TIME = {msg[0]:msg for msg in (CLOCK, START, CONTINUE, STOP, ACTIVE_SENSING, RESET)}
+
+_SUSTAIN = 0x40
+_ALL_SOUND_OFF = 0x78
+_ALL_NOTES_OFF = 0x7B
+
+# [channel*128 + program] -> ProgramChange
+PROGRAM_CHANGES = tuple(bytes(((ChannelMsg_ProgramChange<<4)|channel, program)) for channel in range(16) for program in range(128))
+
+# Sustain off, AllNotesOff and AllSoundOff on every channel
+PANIC = tuple(bytes(((ChannelMsg_CtrlChangeOrChannelMode<<4)|channel, controller, 0))
+              for channel in range(16) for controller in (_SUSTAIN, _ALL_NOTES_OFF, _ALL_SOUND_OFF))
+
+# Status bytes that do not start a message (EndOfExclusive only ends a SysEx)
+_UNDEFINED = (0xF4, 0xF5, 0xF7, 0xF9, 0xFD)
+
+
+def validate(msg)->bool:
+    """return True if msg (list, bytes, ...) is one complete midi message, with valid values"""
+    if not msg:
+        return False
+    status = msg[0]
+    if not 0x80<=status<=0xFF or status in _UNDEFINED:
+        return False
+    if status==0xF0:
+        # SysEx : F0, data bytes, F7
+        return len(msg)>=2 and msg[-1]==0xF7 and all(0<=value<0x80 for value in msg[1:-1])
+    return len(msg)==DATA_LEN[status]+1 and all(0<=value<0x80 for value in msg[1:])
+
+
+class MsgBuilder:
+    """ Encode channel messages into reusable buffers (one per message size)
+
+        builder = MsgBuilder()
+        send(builder.note_on(0, 60, 100))
+
+        The returned buffer is overwritten by the next message of the same size : send it at once,
+        or copy it (bytes(buffer)) to keep it. Values are checked (ValueError if out of range).
+        Note : a builder must be used by a single thread
+    """
+    def __init__(self):
+        self.__buf2 = bytearray(2)
+        self.__buf3 = bytearray(3)
+
+    def note_on(self, channel:int, note:int, velocity:int)->bytearray:
+        return self.__build3(ChannelMsg_NoteOn, channel, note, velocity)
+
+    def note_off(self, channel:int, note:int, velocity:int = 0)->bytearray:
+        return self.__build3(ChannelMsg_NoteOff, channel, note, velocity)
+
+    def poly_pressure(self, channel:int, note:int, value:int)->bytearray:
+        return self.__build3(ChannelMsg_PolyphonicKeyPressure, channel, note, value)
+
+    def control_change(self, channel:int, controller:int, value:int)->bytearray:
+        return self.__build3(ChannelMsg_CtrlChangeOrChannelMode, channel, controller, value)
+
+    def program_change(self, channel:int, program:int)->bytes:
+        """return the pre-encoded message (immutable, not a buffer)"""
+        if channel>>4 or program>>7:
+            raise ValueError('invalid program change: channel '+str(channel)+', program '+str(program))
+        return PROGRAM_CHANGES[(channel<<7)+program]
+
+    def channel_pressure(self, channel:int, value:int)->bytearray:
+        if channel>>4 or value>>7:
+            raise ValueError('invalid channel pressure: channel '+str(channel)+', value '+str(value))
+        buf = self.__buf2
+        buf[0] = (ChannelMsg_ChannelPressure<<4)|channel
+        buf[1] = value
+        return buf
+
+    def pitch_bend(self, channel:int, value:int)->bytearray:
+        """value is 14 bits (0-16383, 8192 : no bend)"""
+        if value>>14:
+            raise ValueError('invalid pitch bend value: '+str(value))
+        return self.__build3(ChannelMsg_PitchBendChange, channel, value&0x7F, value>>7)
+
+    def encode(self, msg:'MidiMsg'):
+        """encode a decoded message (i.e. a MidiMsg built by a script) from its fields
+        System messages are given as they were decoded (msg.bytes)
+        """
+        type_id = msg.type_id
+        if type_id>=0x10 or type_id<0:
+            return bytes(msg.bytes)
+        if type_id==ChannelMsg_ProgramChange:
+            return self.program_change(msg.channel, msg.value)
+        if type_id==ChannelMsg_ChannelPressure:
+            return self.channel_pressure(msg.channel, msg.value)
+        if type_id==ChannelMsg_PitchBendChange:
+            return self.pitch_bend(msg.channel, msg.value)
+        if type_id==ChannelMsg_CtrlChangeOrChannelMode:
+            controller = msg.control_change_id if msg.control_change_id>=0 else msg.channel_mode_id
+            return self.__build3(type_id, msg.channel, controller, msg.value)
+        return self.__build3(type_id, msg.channel, msg.note, msg.velocity)
+
+    def __build3(self, msg_type:int, channel:int, data1:int, data2:int)->bytearray:
+        if channel>>4 or data1>>7 or data2>>7:
+            raise ValueError('invalid '+CHANNEL_MSG_NAMES[msg_type]+': channel '+str(channel)+', data '+str(data1)+', '+str(data2))
+        buf = self.__buf3
+        buf[0] = (msg_type<<4)|channel
+        buf[1] = data1
+        buf[2] = data2
+        return buf
+
+
+class RawSender:
+    """ Send raw messages (list, bytes or buffers) to an output port opened by
+        MidiHelpers.get_or_create_port(), directly through the backend when it allows it,
+        else as mido messages. Messages are not checked (see validate())
+    """
+    def __init__(self, outport):
+        from helpers import MidiHelpers
+        self.name:str = outport[1]
+        self.__port = outport[0]
+        self.__send_raw = MidiHelpers.get_raw_sender(outport)
+        if self.__send_raw is None:
+            import mido
+            self.__from_bytes = mido.Message.from_bytes
+
+    def send(self, msg):
+        if self.__send_raw:
+            self.__send_raw(msg)
+        else:
+            self.__port.send(self.__from_bytes(msg))
+
+    def send_all(self, msgs)->bool:
+        """send several messages, return False (after printing an error) if one of them could not be sent"""
+        try:
+            for msg in msgs:
+                self.send(msg)
+        except Exception as e:
+            print('error: can not send message to "'+self.name+'": '+str(e), file=sys.stderr)
+            return False
+        return True
@@ -0,0 +1,174 @@
+import os, sys, threading, time
+from array import array
+from midi_tables import *
+
+# Flight recorder : the last received messages are kept in memory, in preallocated rings (no
+# allocation per message), and written to a file only when something goes wrong (trigger)
+#   - slots : timestamp, port index, size and position of each message, [count % max_messages]
+#   - data : ring of message bytes. Positions only increase (offset in the ring = position % size),
+#            a message never wraps : if it does not fit before the end, it is written at the start
+# A slot is still valid if its data has not been overwritten (position > write position - size)
+DECODE_ERROR = 'decode-error'
+EXTENSIONS = ('.mid', '.ndjson', '.csv', '.txt')
+
+
+class TriggerSet:
+    """ Messages that trigger a dump, selected by status byte or controller number, from names of
+        message types and channel modes (i.e. "AllNotesOff,Reset"), and decode errors
+    """
+    def __init__(self, value:str):
+        """raises ValueError if a name is unknown"""
+        self.statuses = bytearray(256)
+        self.controllers = bytearray(128)
+        self.decode_error:bool = False
+        for name in value.split(','):
+            name = name.strip()
+            if not name:
+                continue
+            if name==DECODE_ERROR:
+                self.decode_error = True
+            elif name in CHANNEL_MSG_NAMES:
+                msb = CHANNEL_MSG_NAMES.index(name)
+                self.statuses[msb<<4:(msb<<4)+16] = b'\x01'*16
+            elif name in STATUS_NAMES:
+                self.statuses[STATUS_NAMES.index(name)] = 1
+            elif name in CHANNEL_MODE_NAMES:
+                self.controllers[CHANNEL_MODE_NAMES.index(name)] = 1
+            elif name in CONTROL_CHANGE_NAMES:
+                self.controllers[CONTROL_CHANGE_NAMES.index(name)] = 1
+            else:
+                raise ValueError('unknown trigger "'+name+'", expected a message type, a channel mode, a controller or '+DECODE_ERROR)
+
+    def match(self, msg:list[int])->bool:
+        status = msg[0]
+        if self.statuses[status]:
+            return True
+        return status>>4==ChannelMsg_CtrlChangeOrChannelMode and len(msg)>1 and self.controllers[msg[1]&0x7F]==1
+
+
+class FlightRecorder:
+    """ Keep the messages of the last `seconds` in memory, and write them to a file on demand
+
+        write() is cheap (a few stores in preallocated arrays), and may be called by several
+        threads. trigger() may be called from any thread (i.e. the input callback) : the dump
+        itself is done by the next call of check(), from the main loop, so that writing the file
+        never delays messages
+    """
+    def __init__(self, seconds:float, output:str, ports:list[str], max_messages:int = 65536, max_bytes:int = 1<<22):
+        """
+        Args:
+            seconds (float): age of the oldest messages written by a dump
+            output (str): path of the dump files, with strftime() fields (i.e. "flight-%Y%m%d-%H%M%S.mid").
+                          The extension gives the format : Standard MIDI File (.mid), records (.ndjson,
+                          .csv, compact .txt, see records.py)
+            ports (list[str]): names of the ports, messages refer to them by index
+            max_messages, max_bytes (int): size of the rings, the oldest messages are lost first
+        raises ValueError if the extension of output is not supported
+        """
+        extension = os.path.splitext(output)[1].lower()
+        if extension not in EXTENSIONS:
+            raise ValueError('unsupported flight recorder file "'+output+'", extension must be one of: '+', '.join(EXTENSIONS))
+        self.seconds = seconds
+        self.output = output
+        self.ports = ports
+        self.__extension = extension
+        self.__max_messages = max_messages
+        self.__max_bytes = max_bytes
+        self.__data = bytearray(max_bytes)
+        self.__times = array('q', bytes(8*max_messages))
+        self.__positions = array('q', bytes(8*max_messages))
+        self.__sizes = array('I', bytes(4*max_messages))
+        self.__ports = bytearray(max_messages)
+        self.__count:int = 0
+        self.__position:int = 0
+        self.__lock = threading.Lock()
+        self.__reason:str = None # set by trigger()
+
+    def write(self, port_idx:int, msg:list[int], timestamp_ns:int):
+        """keep a message received at timestamp_ns (time.monotonic_ns())"""
+        size = len(msg)
+        if size>self.__max_bytes:
+            return
+        with self.__lock:
+            position = self.__position
+            offset = position%self.__max_bytes
+            if offset+size>self.__max_bytes:
+                position += self.__max_bytes-offset
+                offset = 0
+            self.__data[offset:offset+size] = msg
+            slot = self.__count%self.__max_messages
+            self.__times[slot] = timestamp_ns
+            self.__positions[slot] = position
+            self.__sizes[slot] = size
+            self.__ports[slot] = port_idx
+            self.__position = position+size
+            self.__count += 1
+
+    def trigger(self, reason:str):
+        """ask for a dump (done by the next call of check())"""
+        if self.__reason is None:
+            self.__reason = reason
+
+    def check(self)->str:
+        """dump the messages if a trigger occurred, return the path of the file (None if no dump)"""
+        reason = self.__reason
+        if reason is None:
+            return None
+        self.__reason = None
+        return self.dump(reason)
+
+    def messages(self)->list[tuple[int, int, bytes]]:
+        """return the kept messages of the last `seconds`, as (timestamp_ns, port index, bytes)"""
+        result = []
+        # Only the messages of the last `seconds` are copied : the lock delays write()
+        with self.__lock:
+            count = self.__count
+            if not count:
+                return result
+            position = self.__position
+            times = self.__times
+            oldest = times[(count-1)%self.__max_messages]-round(self.seconds*1e9)
+            for idx in range(count-1, max(-1, count-1-self.__max_messages), -1):
+                slot = idx%self.__max_messages
+                if times[slot]<oldest or self.__positions[slot]<position-self.__max_bytes:
+                    break
+                offset = self.__positions[slot]%self.__max_bytes
+                result.append((times[slot], self.__ports[slot], bytes(self.__data[offset:offset+self.__sizes[slot]])))
+        result.reverse()
+        return result
+
+    def dump(self, reason:str = 'request')->str:
+        """write the kept messages of the last `seconds` to a new file, return its path
+        (None, after printing an error, if the file can not be written)
+        """
+        messages = self.messages()
+        path = self.__new_path()
+        try:
+            if self.__extension=='.mid':
+                from smf import SmfWriter
+                writer = SmfWriter(path, self.ports, 1, start_ns=messages[0][0] if messages else None)
+                for timestamp_ns, port_idx, msg in messages:
+                    writer.write(port_idx, msg, timestamp_ns)
+                writer.close()
+            else:
+                from records import RecordWriter
+                offset_ns = time.time_ns()-time.monotonic_ns()
+                with open(path, 'wb') as file:
+                    writer = RecordWriter({'.ndjson':'ndjson', '.csv':'csv'}.get(self.__extension, 'compact'), self.ports, file)
+                    for timestamp_ns, port_idx, msg in messages:
+                        writer.write(timestamp_ns+offset_ns, port_idx, list(msg))
+                    writer.close()
+        except OSError as e:
+            print('error: can not write flight recorder file "'+path+'": '+str(e), file=sys.stderr)
+            return None
+        print('flight recorder ('+reason+'): '+str(len(messages))+' message(s) written to "'+path+'"', file=sys.stderr)
+        return path
+
+    def __new_path(self)->str:
+        path = time.strftime(self.output)
+        base, extension = os.path.splitext(path)
+        number = 1
+        while os.path.exists(path):
+            number += 1
+            path = base+'-'+str(number)+extension
+        return path
@@ -1,10 +1,24 @@
-import datetime, sys
-from enum import Enum
-import mido
+import sys, time
+
+# mido (and datetime) are imported by the functions using them, so that the command line
+# starts fast when they are not needed (argument errors, help)
 
 class Helpers:
-    def get_timestr(time:datetime.datetime)->str:
+    def get_timestr(time:'datetime.datetime')->str:
         return time.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+    __second_str:tuple = (None, '')
+    def get_timestr_ns(time_ns:int)->str:
+        """same as get_timestr(), for a time in ns since epoch (the string of the second is cached,
+        messages of a dense stream only format their microseconds)
+        """
+        seconds, ns = divmod(time_ns, 1000000000)
+        cached_seconds, second_str = Helpers.__second_str
+        if seconds!=cached_seconds:
+            second_str = time.strftime("%Y-%m-%dT%H:%M:%S.", time.localtime(seconds))
+            # A single assignment : callbacks of several ports may format times concurrently
+            Helpers.__second_str = (seconds, second_str)
+        return second_str+('%06d' % (ns//1000))
     
     def str_to_int(value:str, default:int = None)->int:
         """convert a string to an integer
@@ -20,6 +34,21 @@ class Helpers:
             return default
         return result
     
+    def str_to_range(value:str, min_value:int, max_value:int)->tuple[int,int]:
+        """convert a string like "3", "3-10", "-10" or "3-" to a (min, max) tuple
+        missing bounds are replaced by min_value and max_value
+        returns None in case of conversion error or if the range is out of [min_value, max_value]
+        """
+        bounds = value.split('-', 1)
+        low = Helpers.str_to_int(bounds[0].strip(), None) if bounds[0].strip() else min_value
+        if len(bounds)==1:
+            high = low
+        else:
+            high = Helpers.str_to_int(bounds[1].strip(), None) if bounds[1].strip() else max_value
+        if low==None or high==None or low<min_value or high>max_value or low>high:
+            return None
+        return (low, high)
+
     def int_to_str(value:int, hexa:bool)->str:
         if hexa:
             return Helpers.hex_to_str(value)
@@ -36,6 +65,7 @@ class MidiHelpers:
         Returns:
             dict: key item is the port name
         """
+        import mido
         available_ports = {}
         idx = 0
         for port in mido.get_input_names():
@@ -51,18 +81,49 @@ class MidiHelpers:
 
         return available_ports
     
-    def send_bytes(outport, bytes_msg:list, hexa:bool)->bool:
+    def send_bytes(outport, bytes_msg:list, hexa:bool, log:bool = True)->bool:
+        """send a raw message, checked and sent without building a mido message (see encoder.py)
+        The message is printed if log is True
+        """
+        from encoder import RawSender, validate
         if len(bytes_msg)>3 and bytes_msg[0] != 0xF0:
             bytes_msg.insert(0, 0xF0)
-        try:
-            midimsg:mido.Message = mido.Message.from_bytes(bytes_msg)
-        except:
+        if not validate(bytes_msg):
             print('error: Invalid midi message '+MidiHelpers.bytes_to_raw_string(bytes_msg,hexa), file=sys.stderr)
             return False
-        print(Helpers.get_timestr(datetime.datetime.now())+' | '+MidiHelpers.msg_to_string(midimsg,hexa)+ ' (to: "'+outport[1]+'")')
-        outport[0].send(midimsg)
+        if log:
+            import datetime
+            from midimsg import MidiMsg
+            msg_str = MidiMsg.describe(bytes_msg, hexa)
+            print(Helpers.get_timestr(datetime.datetime.now())+' | '+(msg_str if msg_str else MidiHelpers.bytes_to_raw_string(bytes_msg, hexa))+ ' (to: "'+outport[1]+'")')
+        RawSender(outport).send(bytes_msg)
         return True
-    
+
+    def bytes_to_raw_string(bytes_msg:list, hexa:bool)->str:
+        return '[' + ', '.join(Helpers.int_to_str(x,hexa) for x in bytes_msg) + ']'
+
+    def get_raw_sender(outport):
+        """return a function sending raw bytes (i.e. part of a SysEx) to an output port
+        opened by get_or_create_port(), or None if the backend does not allow it
+        """
+        # mido does not send incomplete messages : use the rtmidi.MidiOut object of the port
+        rtmidi_out = getattr(outport[0], '_rt', None)
+        return getattr(rtmidi_out, 'send_message', None)
+
+    def get_sysex_chunk_sender(outport):
+        """return a function sending a part of a SysEx to an output port opened by get_or_create_port(),
+        or None if the backend is not known to accept incomplete SysEx messages
+        """
+        # WinMM rejects SysEx fragments (a SysEx must start with F0, other messages are at most 3 bytes)
+        rtmidi_out = getattr(outport[0], '_rt', None)
+        try:
+            import rtmidi
+            if rtmidi_out.get_current_api() not in (rtmidi.API_LINUX_ALSA, rtmidi.API_UNIX_JACK, rtmidi.API_MACOSX_CORE):
+                return None
+        except Exception:
+            return None
+        return getattr(rtmidi_out, 'send_message', None)
+
     def get_or_create_port(port, out, create_port_if_needed = True):
         """ return a rtmidi.MidiIn or rtmidi.MidiOut that must be deleted with del keyword
 
@@ -102,6 +163,7 @@ class MidiHelpers:
         else:
             return None
         
+        import mido
         if out:
             midi = mido.open_output(port_name, virtual=virtual)
         else:
@@ -0,0 +1,223 @@
+import heapq, struct
+from midi_tables import *
+from smf import DATA_LEN, read_var_len
+
+# Secondary index of a capture file, written by SmfWriter next to the Standard MIDI File (<file>.idx)
+# so that queries read only the parts of the file that may contain matching messages
+#   - buckets : for each track and each time bucket, offset (in the track data) and tick of the first
+#               event, number of events, bitmap of status bytes (message type and channel) and bitmap
+#               of control change numbers
+#   - postings : offset and tick of each SysEx, by manufacturer ID (packed, see midi_tables.pack_id())
+# File = header, tracks, buckets, postings (all integers big-endian)
+INDEX_EXTENSION = '.idx'
+BUCKET_NS = 1000000000
+
+_MAGIC = b'MIDX'
+_VERSION = 1
+_HEADER = struct.Struct('>4sHHIQQHII')   # magic, version, ppq, tempo, bucket ticks, start time (ns since epoch), counts
+_TRACK = struct.Struct('>QIH')           # data offset in the file, data length, name length (name follows)
+_BUCKET = struct.Struct('>HIIQI32s16s')  # track, bucket number, offset, tick before, events, statuses, controllers
+_POSTING = struct.Struct('>IHIQ')        # manufacturer, track, offset, tick
+
+def sysex_manufacturer(msg:list[int])->int:
+    """return the packed manufacturer ID of a SysEx (0x7E/0x7F for universal SysEx), -1 if there is none"""
+    if len(msg)<2 or msg[1]>=0x80:
+        return -1
+    if msg[1]!=0:
+        return msg[1]
+    if len(msg)<4:
+        return -1
+    return (3<<24)|(msg[2]<<8)|msg[3]
+
+
+class _Bucket:
+    __slots__ = ('track', 'number', 'offset', 'tick', 'events', 'statuses', 'controllers', 'end')
+
+    def __init__(self, track:int, number:int, offset:int, tick:int):
+        self.track = track
+        self.number = number
+        self.offset = offset
+        self.tick = tick    # tick of the event before the first event of the bucket
+        self.events:int = 0
+        self.statuses:int = 0
+        self.controllers:int = 0
+        self.end:int = 0    # offset after the last event (only set when the index is read)
+
+
+class IndexWriter:
+    """ Build the index of a SMF while its events are written (see SmfWriter)
+        Buckets are small (one per track and per second), they are kept in memory until close()
+    """
+    def __init__(self, path:str, ppq:int, tempo:int, start_time_ns:int, bucket_ns:int = BUCKET_NS):
+        """
+        Args:
+            path (str): path of the index file
+            start_time_ns (int): time.time_ns() value matching tick 0
+        """
+        self.path = path
+        self.__ppq = ppq
+        self.__tempo = tempo
+        self.__start_time_ns = start_time_ns
+        self.__bucket_ticks = max(1, round(bucket_ns*ppq*1000/(tempo*1000000)))
+        self.__buckets:list[_Bucket] = []
+        self.__current:dict = {} # track -> current bucket
+        self.__postings:list[tuple] = []
+
+    def add(self, track:int, offset:int, tick:int, previous_tick:int, msg:list[int]):
+        """index the event written at offset of a track data
+        previous_tick is the tick of the event before it in the track (its delta time is tick-previous_tick)
+        """
+        number = tick//self.__bucket_ticks
+        bucket = self.__current.get(track)
+        if bucket is None or bucket.number!=number:
+            bucket = _Bucket(track, number, offset, previous_tick)
+            self.__current[track] = bucket
+            self.__buckets.append(bucket)
+        bucket.events += 1
+        bucket.statuses |= 1<<msg[0]
+        if msg[0]>>4==ChannelMsg_CtrlChangeOrChannelMode:
+            bucket.controllers |= 1<<msg[1]
+        elif msg[0]==SystemCommonMsg_SystemExclusive:
+            manufacturer = sysex_manufacturer(msg)
+            if manufacturer>=0:
+                self.__postings.append((manufacturer, track, offset, tick))
+
+    def close(self, tracks:list[tuple[int, int, str]]):
+        """write the index file, tracks are (data offset in the SMF, data length, name)"""
+        with open(self.path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, self.__ppq, self.__tempo, self.__bucket_ticks, self.__start_time_ns,
+                                    len(tracks), len(self.__buckets), len(self.__postings)))
+            for offset, length, name in tracks:
+                name = name.encode('utf-8')
+                file.write(_TRACK.pack(offset, length, len(name))+name)
+            for bucket in self.__buckets:
+                file.write(_BUCKET.pack(bucket.track, bucket.number, bucket.offset, bucket.tick, bucket.events,
+                                        bucket.statuses.to_bytes(32, 'big'), bucket.controllers.to_bytes(16, 'big')))
+            for posting in self.__postings:
+                file.write(_POSTING.pack(*posting))
+
+
+class CaptureIndex:
+    """ Index of a capture file, read from <file>.idx """
+    def __init__(self, path:str):
+        """raises OSError if the index can not be read, ValueError if it is not valid"""
+        with open(path, 'rb') as file:
+            data = file.read()
+        try:
+            magic, version, self.ppq, self.tempo, self.bucket_ticks, self.start_time_ns, nb_tracks, nb_buckets, nb_postings = _HEADER.unpack_from(data)
+            if magic!=_MAGIC or version!=_VERSION:
+                raise ValueError('not a capture index: '+path)
+            pos = _HEADER.size
+            self.tracks:list[tuple[int, int, str]] = []
+            for _ in range(nb_tracks):
+                offset, length, name_length = _TRACK.unpack_from(data, pos)
+                pos += _TRACK.size
+                self.tracks.append((offset, length, data[pos:pos+name_length].decode('utf-8', 'replace')))
+                pos += name_length
+            self.buckets:list[_Bucket] = []
+            last:dict = {} # track -> previous bucket
+            for _ in range(nb_buckets):
+                track, number, offset, tick, events, statuses, controllers = _BUCKET.unpack_from(data, pos)
+                pos += _BUCKET.size
+                bucket = _Bucket(track, number, offset, tick)
+                bucket.events = events
+                bucket.statuses = int.from_bytes(statuses, 'big')
+                bucket.controllers = int.from_bytes(controllers, 'big')
+                bucket.end = self.tracks[track][1]
+                if track in last:
+                    last[track].end = offset
+                last[track] = bucket
+                self.buckets.append(bucket)
+            self.postings:list[tuple[int, int, int, int]] = [_POSTING.unpack_from(data, pos+idx*_POSTING.size) for idx in range(nb_postings)]
+        except (struct.error, IndexError) as e:
+            raise ValueError('invalid capture index "'+path+'": '+str(e))
+        self.__ns_per_tick = self.tempo*1000/self.ppq
+
+    def tick_to_ns(self, tick:int)->int:
+        """return the time of a tick, in ns since epoch"""
+        return self.start_time_ns+round(tick*self.__ns_per_tick)
+
+    def ns_to_tick(self, offset_ns:int)->int:
+        """return the tick of a time given in ns from the start of the capture"""
+        return round(offset_ns/self.__ns_per_tick)
+
+    def query(self, smf_path:str, rule:'Rule' = None, tick_min:int = 0, tick_max:int = None,
+              controllers:tuple[int, int] = None, manufacturer:int = None):
+        """yield (tick, track, msg) of the messages of the capture file selected by the arguments, by time
+        Only buckets whose bitmaps may match (or SysEx postings, if manufacturer is given) are read
+
+        Args:
+            rule (Rule): messages must pass this rule
+            tick_min, tick_max (int): range of ticks (tick_max None : until the end)
+            controllers (tuple): range of control change numbers, only control changes are selected if given
+            manufacturer (int): packed manufacturer ID, only SysEx of this manufacturer are selected if given
+        """
+        if tick_max is None:
+            tick_max = 1<<63
+        with open(smf_path, 'rb') as file:
+            if manufacturer is not None:
+                yield from self.__query_postings(file, rule, tick_min, tick_max, manufacturer)
+                return
+            # Bitmaps of status bytes and controllers that may be selected
+            statuses = 0
+            for status in range(0x80, 0x100):
+                if (rule is None or rule.may_accept(status)) and (controllers is None or status>>4==ChannelMsg_CtrlChangeOrChannelMode):
+                    statuses |= 1<<status
+            controller_mask = ((1<<(controllers[1]+1))-1)^((1<<controllers[0])-1) if controllers else (1<<128)-1
+            by_track:dict = {}
+            for bucket in self.buckets:
+                first_tick = bucket.number*self.bucket_ticks
+                if (bucket.statuses&statuses and first_tick<=tick_max and first_tick+self.bucket_ticks>tick_min
+                        and (controllers is None or bucket.controllers&controller_mask)):
+                    by_track.setdefault(bucket.track, []).append(bucket)
+            def select(tick:int, msg:bytes)->bool:
+                if tick<tick_min or tick>tick_max or not (statuses>>msg[0])&1:
+                    return False
+                if controllers and not controllers[0]<=msg[1]<=controllers[1]:
+                    return False
+                return rule is None or rule.accept(msg)
+            # Tracks are read bucket by bucket, and merged by time
+            tracks = [self.__read_buckets(file, track, buckets, select) for track, buckets in by_track.items()]
+            yield from heapq.merge(*tracks, key=lambda result: result[0])
+
+    def __query_postings(self, file, rule:'Rule', tick_min:int, tick_max:int, manufacturer:int):
+        for posting_manufacturer, track, offset, tick in self.postings:
+            if posting_manufacturer!=manufacturer or tick<tick_min or tick>tick_max:
+                continue
+            file.seek(self.tracks[track][0]+offset)
+            data = file.read(16)
+            _, pos = read_var_len(data, 0)
+            length, pos = read_var_len(data, pos+1)
+            data = data[pos:]+file.read(max(0, length-(len(data)-pos)))
+            msg = b'\xF0'+data[:length]
+            if rule is None or rule.accept(msg):
+                yield (tick, track, msg)
+
+    def __read_buckets(self, file, track:int, buckets:list[_Bucket], select):
+        track_offset = self.tracks[track][0]
+        data_len = DATA_LEN
+        for bucket in buckets:
+            file.seek(track_offset+bucket.offset)
+            data = file.read(bucket.end-bucket.offset)
+            tick = bucket.tick
+            pos = 0
+            size = len(data)
+            while pos<size:
+                delta, pos = read_var_len(data, pos)
+                tick += delta
+                status = data[pos]
+                if status==0xFF:
+                    # Meta events are not indexed
+                    length, pos = read_var_len(data, pos+2)
+                    pos += length
+                    continue
+                if status==0xF0:
+                    length, pos = read_var_len(data, pos+1)
+                    msg = b'\xF0'+data[pos:pos+length]
+                    pos += length
+                else:
+                    # SmfWriter does not use running status
+                    msg = data[pos:pos+1+data_len[status]]
+                    pos += len(msg)
+                if select(tick, msg):
+                    yield (tick, track, msg)
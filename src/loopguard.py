@@ -0,0 +1,102 @@
+from array import array
+
+# Feedback loop detection : a message received again on the same port shortly after (same bytes) is a
+# duplicate. A loop (an output port connected back to the input, i.e. through virtual ports) makes
+# every message come back once per pass, so that duplicates arrive at a high rate, unlike the
+# repeated messages of a player or a sequencer (clock : at most a few hundreds per second)
+#   - last : time (monotonic ns) a message of each hash was last received, [hash & (size-1)]
+#            Fixed size : different messages may share a slot, at worst a few false duplicates are counted
+#   - duplicates are counted by windows of window_ms, the breaker trips when a window has more than
+#     max_rate*window duplicates : messages are dropped for cooldown seconds, which stops the loop
+#   - while messages are dropped, note releases (NoteOff, sustain/sostenuto pedal up, AllSoundOff,
+#     AllNotesOff) still pass, unless they are duplicates themselves : no note is left held
+MAX_COOLDOWN = 60.0
+
+
+class LoopBreaker:
+    """ Detect feedback loops and duplicate storms on input ports, and stop forwarding messages
+        (but note releases) while one is detected
+
+        check() must be called for each received message, by a single thread. on_trip(msg, duplicates)
+        is called when the breaker trips (msg : last duplicate), on_resume(dropped) when messages
+        are forwarded again. A breaker tripping again soon after resuming waits twice longer
+        (up to MAX_COOLDOWN). size (power of 2) is the number of slots of the duplicates table
+    """
+    def __init__(self, max_rate:int = 1000, window_ms:float = 100, cooldown:float = 2.0, on_trip = None, on_resume = None, size:int = 4096):
+        self.__last = array('q', bytes(8*size))
+        self.__mask = size-1
+        self.__window_ns = round(window_ms*1e6)
+        self.__limit = max(1, round(max_rate*window_ms/1000))
+        self.__base_cooldown_ns = round(cooldown*1e9)
+        self.__cooldown_ns = self.__base_cooldown_ns
+        self.__window_end:int = 0
+        self.__duplicates:int = 0
+        self.__resume_ns:int = None     # set while the breaker is open
+        self.__resumed_ns:int = -1 << 62
+        self.__dropped:int = 0
+        self.__on_trip = on_trip
+        self.__on_resume = on_resume
+        self.trips:int = 0
+
+    def check(self, port_idx:int, msg:list[int], timestamp_ns:int)->bool:
+        """return False if the message must be dropped (breaker open)"""
+        if self.__resume_ns is not None:
+            if timestamp_ns<self.__resume_ns:
+                if LoopBreaker.__is_release(msg):
+                    slot = (hash(bytes(msg))^port_idx)&self.__mask
+                    last = self.__last[slot]
+                    self.__last[slot] = timestamp_ns
+                    if timestamp_ns-last>=self.__window_ns:
+                        return True
+                self.__dropped += 1
+                return False
+            self.__resume(timestamp_ns)
+        slot = (hash(bytes(msg))^port_idx)&self.__mask
+        last = self.__last[slot]
+        self.__last[slot] = timestamp_ns
+        if timestamp_ns>=self.__window_end:
+            self.__window_end = timestamp_ns+self.__window_ns
+            self.__duplicates = 0
+        if timestamp_ns-last<self.__window_ns:
+            self.__duplicates += 1
+            if self.__duplicates>self.__limit:
+                self.__trip(msg, timestamp_ns)
+                return False
+        return True
+
+    def is_open(self)->bool:
+        return self.__resume_ns is not None
+
+    def cooldown(self)->float:
+        """seconds messages are dropped for, the next time the breaker trips"""
+        return self.__cooldown_ns/1e9
+
+    def __is_release(msg:list[int])->bool:
+        if len(msg)!=3:
+            return False
+        msb = msg[0]>>4
+        if msb==0x8 or (msb==0x9 and msg[2]==0):
+            return True
+        # Sustain or sostenuto pedal up, AllSoundOff, AllNotesOff
+        return msb==0xB and (((msg[1]==0x40 or msg[1]==0x42) and msg[2]<64) or msg[1]==0x78 or msg[1]==0x7B)
+
+    def __trip(self, msg:list[int], timestamp_ns:int):
+        # Tripping again soon after resuming : the loop is still there
+        if timestamp_ns-self.__resumed_ns<2*self.__cooldown_ns:
+            self.__cooldown_ns = min(2*self.__cooldown_ns, round(MAX_COOLDOWN*1e9))
+        else:
+            self.__cooldown_ns = self.__base_cooldown_ns
+        self.trips += 1
+        self.__resume_ns = timestamp_ns+self.__cooldown_ns
+        self.__dropped = 1
+        if self.__on_trip:
+            self.__on_trip(msg, self.__duplicates)
+
+    def __resume(self, timestamp_ns:int):
+        self.__resume_ns = None
+        self.__resumed_ns = timestamp_ns
+        self.__duplicates = 0
+        self.__window_end = 0
+        self.__last = array('q', bytes(8*len(self.__last)))
+        if self.__on_resume:
+            self.__on_resume(self.__dropped)
@@ -0,0 +1,183 @@
+import os, socketserver, threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from midi_tables import *
+
+
+class _PortCounters:
+    """ Counters of a port, updated by a single thread
+        messages : [status byte] -> count, [256+channel] -> count of channel mode messages
+        (status 0xBn is used for control changes only)
+    """
+    CHANNEL_MODE = 256
+
+    def __init__(self):
+        self.messages = array('Q', bytes(8*(256+16)))
+        self.bytes:int = 0
+        self.decode_errors:int = 0
+        self.invalid:int = 0
+        self.filtered:int = 0
+        self.dropped:int = 0
+
+
+class Metrics:
+    """ Counters of received messages, by port and message type, exposed in Prometheus text format
+
+        Each thread updates its own counters (no lock on the hot path), which are only
+        summed when they are read by to_prometheus()
+    """
+    def __init__(self):
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__counters:list[tuple[str, _PortCounters]] = []
+        self.__gauges:dict = {}
+        self.__server = None
+
+    def received(self, port:str, msg:list[int]):
+        counters = self.__port(port)
+        if msg[0]>>4==ChannelMsg_CtrlChangeOrChannelMode and len(msg)>1 and msg[1]>=120:
+            counters.messages[_PortCounters.CHANNEL_MODE+(msg[0]&0xF)] += 1
+        else:
+            counters.messages[msg[0]] += 1
+        counters.bytes += len(msg)
+
+    def decode_error(self, port:str):
+        """exception while decoding a message"""
+        self.__port(port).decode_errors += 1
+
+    def invalid(self, port:str):
+        """message decoded as invalid"""
+        self.__port(port).invalid += 1
+
+    def filtered(self, port:str):
+        """message removed by a rule"""
+        self.__port(port).filtered += 1
+
+    def dropped(self, port:str, count:int = 1):
+        """message lost (send error, queue overflow, feedback loop, ...)"""
+        self.__port(port).dropped += count
+
+    def add_gauge(self, name:str, func, high_water = None):
+        """add a queue depth, read by calling func() when metrics are scraped
+        high_water (optional) is a function returning the maximum depth reached by the queue
+        """
+        self.__gauges[name] = (func, high_water)
+
+    def to_prometheus(self)->str:
+        messages:dict = {}
+        totals:dict = {}
+        with self.__lock:
+            counters = list(self.__counters)
+        for port, counter in counters:
+            if port not in messages:
+                messages[port] = array('Q', bytes(8*(256+16)))
+                totals[port] = [0, 0, 0, 0, 0]
+            port_messages = messages[port]
+            for idx, value in enumerate(counter.messages):
+                if value:
+                    port_messages[idx] += value
+            port_totals = totals[port]
+            port_totals[0] += counter.bytes
+            port_totals[1] += counter.decode_errors
+            port_totals[2] += counter.invalid
+            port_totals[3] += counter.filtered
+            port_totals[4] += counter.dropped
+
+        lines = [
+            '# HELP midimator_messages_total Received messages by port, category and type',
+            '# TYPE midimator_messages_total counter',
+        ]
+        for port, port_messages in messages.items():
+            by_type:dict = {}
+            for idx, value in enumerate(port_messages):
+                if value:
+                    key = Metrics.__type_labels(idx)
+                    by_type[key] = by_type.get(key, 0)+value
+            for (category, msg_type), value in sorted(by_type.items()):
+                lines.append('midimator_messages_total{port="'+Metrics.__escape(port)+'",category="'+category+'",type="'+msg_type+'"} '+str(value))
+        for idx, (name, description) in enumerate([
+                ('bytes', 'Received bytes'),
+                ('decode_errors', 'Exceptions while decoding a message'),
+                ('invalid_messages', 'Messages decoded as invalid'),
+                ('filtered', 'Messages removed by a rule'),
+                ('dropped', 'Messages lost (send error, queue overflow, feedback loop)')]):
+            lines.append('# HELP midimator_'+name+'_total '+description+', by port')
+            lines.append('# TYPE midimator_'+name+'_total counter')
+            for port, port_totals in totals.items():
+                lines.append('midimator_'+name+'_total{port="'+Metrics.__escape(port)+'"} '+str(port_totals[idx]))
+        lines.append('# HELP midimator_queue_depth Messages waiting in a queue')
+        lines.append('# TYPE midimator_queue_depth gauge')
+        gauges = list(self.__gauges.items())
+        for name, (func, _) in gauges:
+            lines.append('midimator_queue_depth{queue="'+Metrics.__escape(name)+'"} '+str(func()))
+        lines.append('# HELP midimator_queue_high_water Maximum number of messages that waited in a queue')
+        lines.append('# TYPE midimator_queue_high_water gauge')
+        for name, (_, high_water) in gauges:
+            if high_water:
+                lines.append('midimator_queue_high_water{queue="'+Metrics.__escape(name)+'"} '+str(high_water()))
+        return '\n'.join(lines)+'\n'
+
+    def start_server(self, address:str):
+        """serve metrics over HTTP (GET /metrics), in a background thread
+        address is either a TCP port number (listening on 127.0.0.1 only) or "unix:<path>"
+        """
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+
+        if address.startswith('unix:'):
+            path = address[5:]
+            if os.path.exists(path):
+                os.remove(path)
+            class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+                daemon_threads = True
+            self.__server = UnixServer(path, Handler)
+        else:
+            self.__server = ThreadingHTTPServer(('127.0.0.1', int(address)), Handler)
+            self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, name='metrics', daemon=True).start()
+
+    def stop_server(self):
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            if isinstance(self.__server.server_address, str) and os.path.exists(self.__server.server_address):
+                os.remove(self.__server.server_address)
+            self.__server = None
+
+    def __port(self, port:str)->_PortCounters:
+        try:
+            return self.__local.ports[port]
+        except AttributeError:
+            self.__local.ports = {}
+        except KeyError:
+            pass
+        counters = _PortCounters()
+        self.__local.ports[port] = counters
+        with self.__lock:
+            self.__counters.append((port, counters))
+        return counters
+
+    def __type_labels(idx:int)->tuple[str, str]:
+        if idx>=_PortCounters.CHANNEL_MODE:
+            return (CATEGORY_NAMES[MsgCategory_CM], CHANNEL_MSG_NAMES[ChannelMsg_CtrlChangeOrChannelMode])
+        if idx<0xF0:
+            msb = idx>>4
+            category = MsgCategory_CC if msb==ChannelMsg_CtrlChangeOrChannelMode else MsgCategory_CVM
+            return (CATEGORY_NAMES[category], CHANNEL_MSG_NAMES[msb] or 'Unknown')
+        category = MsgCategory_SCM if idx<0xF8 else MsgCategory_RTM
+        return (CATEGORY_NAMES[category], STATUS_NAMES[idx] or 'Unknown')
+
+    def __escape(value:str)->str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,53 @@
+# Generated by build_tables.py from midi_enum.py : do not edit
+# Lookup tables used to decode and print messages without building midi_enum classes
+
+SOURCE_HASH = '808a42df85f78bd2ef32641450f981fc15c4c985'
+
+ChannelMsg_NoteOff = 0x8
+ChannelMsg_NoteOn = 0x9
+ChannelMsg_PolyphonicKeyPressure = 0xa
+ChannelMsg_CtrlChangeOrChannelMode = 0xb
+ChannelMsg_ProgramChange = 0xc
+ChannelMsg_ChannelPressure = 0xd
+ChannelMsg_PitchBendChange = 0xe
+SystemCommonMsg_SystemExclusive = 0xf0
+SystemCommonMsg_MidiTimeCodeQuarterFrame = 0xf1
+SystemCommonMsg_SongPositionPointer = 0xf2
+SystemCommonMsg_SongSelect = 0xf3
+SystemCommonMsg_TuneRequest = 0xf6
+SystemCommonMsg_EndOfExclusive = 0xf7
+RealTimeMsg_TimingClock = 0xf8
+RealTimeMsg_Start = 0xfa
+RealTimeMsg_Continue = 0xfb
+RealTimeMsg_Stop = 0xfc
+RealTimeMsg_ActiveSensing = 0xfe
+RealTimeMsg_Reset = 0xff
+MsgCategory_CVM = 0x1
+MsgCategory_CC = 0x2
+MsgCategory_CM = 0x3
+MsgCategory_SCM = 0x4
+MsgCategory_RTM = 0x5
+
+# value -> name (None if the value is not defined)
+CHANNEL_MSG_NAMES = [None, None, None, None, None, None, None, None, 'NoteOff', 'NoteOn', 'PolyphonicKeyPressure', 'CtrlChangeOrChannelMode', 'ProgramChange', 'ChannelPressure', 'PitchBendChange', None]
+CONTROL_CHANGE_NAMES = ['BankSelect', 'ModulationWheelOrLever', 'BreathController', 'Undefined_03', 'FootController', 'PortamentoTime', 'DataEntry', 'ChannelVolume', 'Balance', 'Undefined_09', 'Pan', 'ExpressionController', 'EffectControl1', 'EffectControl2', 'Undefined_0E', 'Undefined_0F', 'GeneralPurposeController1', 'GeneralPurposeController2', 'GeneralPurposeController3', 'GeneralPurposeController4', 'Undefined_14', 'Undefined_15', 'Undefined_16', 'Undefined_17', 'Undefined_18', 'Undefined_19', 'Undefined_1A', 'Undefined_1B', 'Undefined_1C', 'Undefined_1D', 'Undefined_1E', 'Undefined_1F', 'LSBforBankSelect', 'LSBForModulationWheelOrLever', 'LSBForBreathController', 'LSBForControl3', 'LSBForFootController', 'LSBForPortamentoTime', 'LSBForDataEntry', 'LSBForChannelVolume', 'LSBForBalance', 'LSBForControl9', 'LSBForPan', 'LSBForExpressionController', 'LSBForEffectControl1', 'LSBForEffectControl2', 'LSBForControl14', 'LSBForControl15', 'LSBForGeneralPurposeController1', 'LSBForGeneralPurposeController2', 'LSBForGeneralPurposeController3', 'LSBForGeneralPurposeController4', 'LSBForControl20', 'LSBForControl21', 'LSBForControl22', 'LSBForControl23', 'LSBForControl24', 'LSBForControl25', 'LSBForControl26', 'LSBForControl27', 'LSBForControl28', 'LSBForControl29', 'LSBForControl30', 'LSBForControl31', 'DamperPedalOnOff', 'PortamentoOnOff', 'SostenutoOnOff', 'SoftPedalOnOff', 'LegatoFootswitch', 'Hold2', 'SoundController1', 'SoundController2', 'SoundController3', 'SoundController4', 'SoundController5', 'SoundController6', 'SoundController7', 'SoundController8', 'SoundController9', 'SoundController10', 'GeneralPurposeController5', 'GeneralPurposeController6', 'GeneralPurposeController7', 'GeneralPurposeController8', 'PortamentoControl', 'Undefined_55', 'Undefined_56', 'Undefined_57', 'HighResolutionVelocityPrefix', 'Undefined_59', 'Undefined_5A', 'Effects1Depth', 'Effects2Depth', 'Effects3Depth', 'Effects4Depth', 'Effects5Depth', 'DataIncrement', 'DataDecrement', 'NRPN_LSB', 'NRPN_MSB', 'RPN_LSB', 'RPN_MSB', 'Undefined_66', 'Undefined_67', 'Undefined_68', 'Undefined_69', 'Undefined_6A', 'Undefined_6B', 'Undefined_6C', 'Undefined_6D', 'Undefined_6E', 'Undefined_6F', 'Undefined_70', 'Undefined_71', 'Undefined_72', 'Undefined_73', 'Undefined_74', 'Undefined_75', 'Undefined_76', 'Undefined_77', None, None, None, None, None, None, None, None]
+CHANNEL_MODE_NAMES = [None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'AllSoundOff', 'ResetAllControllers', 'LocalControl', 'AllNotesOff', 'OmniModeOff', 'OmniModeOn', 'MonoModeOn', 'PolyModeOn']
+STATUS_NAMES = [None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, 'SystemExclusive', 'MidiTimeCodeQuarterFrame', 'SongPositionPointer', 'SongSelect', None, None, 'TuneRequest', 'EndOfExclusive', 'TimingClock', None, 'Start', 'Continue', 'Stop', None, 'ActiveSensing', 'Reset']
+CATEGORY_NAMES = [None, 'CVM', 'CC', 'CM', 'SCM', 'RTM']
+
+# packed ID (see pack_id()) -> name
+NRT_SYSEX_NAMES = {0: 'Unknown', 1: 'Sample_Dump_Header', 2: 'Sample_Data_Packet', 3: 'Sample_Dump_Request', 33555456: 'TimeCode_Special', 33555457: 'TimeCode_PunchInPoints', 33555458: 'TimeCode_PunchOutPoints', 33555459: 'TimeCode_DeletePunchInPoint', 33555460: 'TimeCode_DeletePunchOutPoint', 33555461: 'TimeCode_EventStartPoint', 33555462: 'TimeCode_EventStopPoint', 33555463: 'TimeCode_EventStartPointsAddInfo', 33555464: 'TimeCode_EventStopPointAddInfo', 33555465: 'TimeCode_DeleteEventStartPoint', 33555466: 'TimeCode_DeleteEventStopPoint', 33555467: 'TimeCode_CuePoints', 33555468: 'TimeCode_CuePointsAddInfo', 33555469: 'TimeCode_DeleteCuePoint', 33555470: 'TimeCode_EventNameAddInfo', 33555713: 'Sample_LoopPointsTransmission', 33555714: 'Sample_LoopPointsRequest', 33555715: 'Sample_SampleNameTransmission', 33555716: 'Sample_SameNameRequest', 33555717: 'Sample_ExDumpHeader', 33555718: 'Sample_ExLoopPointsTransmission', 33555719: 'Sample_ExLoopPointsRequest', 33555969: 'GeneralInfo_IdRequest', 33555970: 'GeneralInfo_IdReply', 33556225: 'FileDump_Header', 33556226: 'FileDump_DataPacket', 33556227: 'FileDump_Request', 33556480: 'Tuning_BulkDumpRequest', 33556481: 'Tuning_BulkDumpReply', 33556483: 'Tuning_TuningDumpRequest', 33556484: 'Tuning_KeyBasedTuningDump', 33556485: 'Tuning_ScaleTuningDump_1b', 33556486: 'Tuning_ScaleTuningDump_2b', 33556487: 'Tuning_SingleNoteTuningChange', 33556488: 'Tuning_ScaleTuning_1b', 33556489: 'Tuning_ScaleTuning_2b', 33556737: 'General_GeneralMIDI1SystemOn', 33556738: 'General_GeneralMIDISystemOff', 33556739: 'General_GeneralMIDI2SystemOn', 33556993: 'TurnDLSOn', 33556994: 'TurnDLSOff', 33556995: 'TurnDLSVoiceAllocOff', 33556996: 'TurnDLSVoiceAllocOn', 33557249: 'FileRefMsg_OpenFile', 33557250: 'FileRefMsg_SelectContents', 33557251: 'FileRefMsg_OpenFileAndSelectContents', 33557252: 'FileRefMsg_CloseFile', 33557759: 'MidiVisualCtrl', 33558015: 'MidiCapability', 123: 'EndOfFile', 124: 'Wait', 125: 'Cancel', 126: 'NAK', 127: 'ACK'}
+RT_SYSEX_NAMES = {0: 'Unknown', 33554689: 'TimeCode_FullMessage', 33554690: 'TimeCode_UserBits', 33555199: 'MIDIShowCtrl', 33555201: 'NotationInfo_BarNumber', 33555202: 'NotationInfo_TimeSignatureImmediate', 33555266: 'NotationInfo_TimeSignatureDelayed'}
+MANUFACTURER_NAMES = {0: 'Unknown', 1: 'Sequential', 2: 'IDP', 3: 'Voyetra_Technologies', 4: 'Moog_Music', 5: 'Passport_Designs', 6: 'Lexicon_Inc', 7: 'Kutzweil_Young_Chang', 8: 'Fender', 9: 'Gulbransen', 10: 'AKG_Acoustics', 11: 'Voyce_Music', 12: 'Waveframe_Corp', 13: 'ADA_Signal_Processors', 14: 'Garfield_Electronics', 15: 'Ensoniq_Corp', 16: 'Oberheim_Gibson_Labs', 17: 'Apple_Computer', 18: 'Grey_Matter_Response', 19: 'Digidesign_Inc', 20: 'Palmtree_Instruments', 21: 'JLCooper_Electronics', 22: 'Lowrey_Organ_Company', 23: 'Adams_Smith', 24: 'Emu_Systems_Inc', 25: 'Harmony_Systems', 26: 'ART', 27: 'Baldwin', 28: 'Eventide', 29: 'Inventronics', 31: 'Clarity', 32: 'Passac', 33: 'SIEL', 34: 'Synthaxe_UK', 35: 'Stepp', 36: 'Hohner', 37: 'Twister', 38: 'Solton', 39: 'Jellinghaus_MS', 40: 'Southworth_Music_Systems', 41: 'PPG_Germany', 42: 'JEN', 43: 'Solid_State_Logic_Organ_Systems', 44: 'Audio_Veritrieb_P_Struven', 45: 'Neve', 46: 'Soundtracs_Ltd', 47: 'Elka', 48: 'Dynacord', 49: 'Intercontinental_Electronics_SpA', 50: 'Drawmer', 51: 'Clavia_Digital_Instruments', 52: 'Audio_Architecture', 53: 'GeneralMusic_Corp_c_o', 54: 'Cheetah_Marketing', 55: 'C_T_M', 56: 'Simmons_UK', 57: 'Soundcraft_Electronics', 58: 'Steinberg_GMBH_c_o', 59: 'Wersi_Gmbh', 60: 'AVAB_Niethammer_AB', 61: 'Digigram', 62: 'Waldorf_Electronics_GmbH', 63: 'Quasimidi', 64: 'KAWAI_MUSICAL_INSTRUMENTS_MFG_CO_LTD', 65: 'ROLAND_CORPORATION', 66: 'KORG_INC', 67: 'YAMAHA_CORPORATION', 68: 'CASIO_COMPUTER_CO_LTD', 71: 'AKAI_ELECTRIC_CO_LTD', 72: 'VICTOR_COMPANY_OF_JAPAN_LTD', 75: 'FUJITSU_LIMITED', 76: 'SONY_CORPORATION', 78: 'TEAC_CORPORATION', 80: 'MATSUSHITA_ELECTRIC_INDUSTRIAL_CO_LTD', 81: 'FOSTEX_CORPORATION', 82: 'ZOOM_CORPORATION', 84: 'MATSUSHITA_COMMUNICATION_INDUSTRIAL_CO_LTD', 85: 'SUZUKI_MUSICAL_INSTRUMENTS_MFG_CO_LTD', 86: 'FUJI_SOUND_CORPORATION_LTD', 87: 'ACOUSTIC_TECHNICAL_LABORATORY_INC', 89: 'FAITH_INC', 90: 'INTERNET_CORPORATION', 92: 'SEEKERS_CO_LTD', 95: 'SD_CARD_ASSOCIATION', 50331649: 'Time_Warner_Interactive', 50331650: 'Advanced_Gravis_Comp', 50331651: 'Media_Vision', 50331652: 'Dornes_Research_Group', 50331653: 'K_Muse', 50331654: 'Stypher', 50331655: 'Digital_Music_Corp', 50331656: 'IOTA_Systems', 50331657: 'New_England_Digital', 50331658: 'Artisyn', 50331659: 'IVL_Technologies', 50331660: 'Southern_Music_Systems', 50331661: 'Lake_Butler_Sound_Co', 50331662: 'Alesis_Studio_Electronics', 50331663: 'Sound_Creation', 50331664: 'DOD_Electronics_Corp', 50331665: 'Studer_Editech', 50331666: 'Sonus', 50331667: 'Temporal_Acuity_Products', 50331668: 'Perfect_Fretworks', 50331669: 'KAT_Inc', 50331670: 'Opcode_Systems', 50331671: 'Rane_Corporation', 50331672: 'Anadi_Electronique', 50331673: 'KMX', 50331674: 'Allen_Heath_Brenell', 50331675: 'Peavey_Electronics', 50331676: '_360_System', 50331677: 'Spectrum_Design', 50331678: 'Marquis_Music', 50331679: 'Zeta_Systems', 50331680: 'Axxes', 50331681: 'Orban', 50331682: 'Indian_Valley_Mfg', 50331683: 'Triton', 50331684: 'KTI', 50331685: 'Breakaway_Technologies', 50331686: 'CAE_Inc', 50331687: 'Harrison_Systems_Inc', 50331688: 'Future_Lab_Mark_Kuo', 50331689: 'Rocktron_Corporation', 50331690: 'PianoDisc', 50331691: 'Cannon_Research_Group', 50331693: 'Rodgers_Instrument_Corp', 50331694: 'Blue_Sky_Logic', 50331695: 'Encore_Electronics', 50331696: 'Uptown', 50331697: 'Voce', 50331698: 'CTI_Audio', 50331699: 'S_S_Research', 50331700: 'Broderbund_Software', 50331701: 'Allen_Organ_Co', 50331703: 'Music_Quest', 50331704: 'Aphex', 50331705: 'Gallien_Krueger', 50331706: 'IBM', 50331707: 'Mark_of_the_Unicorn', 50331708: 'Hotz_Instruments', 50331709: 'ETA_Lighting', 50331710: 'NSI_Corporation', 50331711: 'Ad_Lib', 50331712: 'Richmond_Sound_Design', 50331713: 'Microsoft_Corp', 50331714: 'Software_Toolworks', 50331715: 'Russ_Jones_Niche', 50331716: 'Intone', 50331717: 'Advanced_Remote_Tech', 50331719: 'GT_Electronics', 50331721: 'Timeline_Vista', 50331722: 'Mesa_Boogie_Ltd', 50331724: 'Sequoia_Development', 50331725: 'Studio_Electronics', 50331726: 'Euphonix', 50331727: 'InterMIDI', 50331728: 'MIDI_Solutions_Inc', 50331729: '_3DO_Company', 50331730: 'Lightwave_Research', 50331731: 'Micro_W_Corporation', 50331732: 'Spectral_Synthesis', 50331733: 'Lone_Wolf', 50331734: 'Studio_Technologies_Inc', 50331735: 'Peterson_Electro_Musical', 50331736: 'Atari_Corporation', 50331737: 'Marion_Systems', 50331738: 'Design_Event', 50331739: 'Winjammer_Software', 50331740: 'ATT_Bell_Laboratories', 50331742: 'Symetrix', 50331743: 'MIDI_the_World', 50331744: 'Desper_Products', 50331745: 'Micros_N_MIDI', 50331746: 'Accordians_International', 50331747: 'EuPhonics', 50331748: 'Musonix', 50331749: 'Turtle_Beach_Systems', 50331750: 'Mackie_Designs', 50331751: 'Compuserve', 50331752: 'BEC_Technologies', 50331753: 'QRS_Music_Rolls_Inc', 50331754: 'P_G_Music', 50331755: 'Sierra_Semiconductor', 50331756: 'EpiGraf_Audio_Visual', 50331757: 'Electronics_Diversified_Inc', 50331758: 'Tune_1000', 50331759: 'Advanced_Micro_Devices', 50331760: 'Mediamation', 50331761: 'Sabine_Musical_Mfg_Co', 50331762: 'Woog_Labs', 50331763: 'Micropolis_Corp', 50331764: 'Ta_Horng_Musical_Instr', 50331765: 'Forte_Technologies', 50331766: 'Electro_Voice', 50331767: 'Midisoft_Corporation', 50331768: 'Q_Sound_Labs', 50331769: 'Westrex', 50331770: 'NVidia', 50331771: 'ESS_Technology', 50331772: 'MediaTrix_Peripherals', 50331773: 'Brooktree_Corp', 50331774: 'Otari_Corp', 50331775: 'Key_Electronics_Inc', 50331904: 'Shure_Brothers_Inc', 50331905: 'Crystalake_Multimedia', 50331906: 'Crystal_Semiconductor', 50331907: 'Rockwell_Semiconductor', 50331908: 'Silicon_Graphics', 50331909: 'Midiman', 50331910: 'PreSonus', 50331912: 'Topaz_Enterprises', 50331913: 'Cast_Lighting', 50331914: 'Microsoft_Consumer_Division', 50331916: 'Fast_Forward_Designs', 50331917: 'lgors_Software_Laboratories', 50331918: 'Van_Koevering_Company', 50331919: 'Altech_Systems', 50331920: 'S_S_Research_2', 50331921: 'VLSI_Technology', 50331922: 'Chromatic_Research', 50331923: 'Sapphire', 50331924: 'IDRC', 50331925: 'Justonic_Tuning', 50331926: 'TorComp', 50331927: 'Newtek_Inc', 50331928: 'Sound_Sculpture', 50331929: 'Walker_Technical', 50331930: 'PAVO', 50331931: 'InVision_Interactive', 50331932: 'T_Square_Design', 50331933: 'Nemesys_Music_Technology', 50331934: 'DBX_Professional_Harman_Intl', 50331935: 'Syndyne_Corporation', 50331936: 'Bitheadz', 50331937: 'Cakewalk_Music_Software', 50331938: 'Analog_Devices_Staccato_Systems', 50331939: 'National_Semiconductor', 50331940: 'Boom_Theory_Adinolfi_Alt_Perc', 50331941: 'Virtual_DSP_Corporation', 50331942: 'Antares_Systems', 50331943: 'Angel_Software', 50331944: 'St_Louis_Music', 50331945: 'Lyrrus_dba_G_VOX', 50331946: 'Ashley_Audio_Inc', 50331947: 'Vari_Lite_Inc', 50331948: 'Summit_Audio_Inc', 50331949: 'Aureal_Semiconductor_Inc', 50331950: 'SeaSound_LLC', 50331951: 'U_S_Robotics', 50331952: 'Aurisis_Research', 50331953: 'Nearfield_Multimedia', 50331954: 'FM7_Inc', 50331955: 'Swivel_Systems', 50331956: 'Hyperactive_Audio_Systems', 50331957: 'MidiLite_Castle_Studios_Prods', 50331958: 'Radikal_Technologies', 50331959: 'Roger_Linn_Design', 50331960: 'TC_Helicon_Vocal_Technologies', 50331961: 'Event_Electronics', 50331962: 'Sonic_Network_Sonic_Implants', 50331963: 'Realtime_Music_Solutions', 50331964: 'Apogee_Digital', 50331965: 'Classical_Organs_Inc', 50331966: 'Microtools_Inc', 50331967: 'Numark_Industries', 50331968: 'Frontier_Design_Group_LLC', 50331969: 'Recordare_LLC', 50331970: 'Star_Labs', 50331971: 'Voyager_Sound_Inc', 50331972: 'Manifold_Labs', 50331973: 'Aviom_Inc', 50331974: 'Mixmeister_Technology', 50331975: 'Notation_Software', 50331976: 'Mercurial_Communications', 50331977: 'Wave_Arts_Inc', 50331978: 'Logic_Sequencing_Devices_Inc', 50331979: 'Axess_Electronics', 50331980: 'Muse_Reasearch', 50331981: 'Open_Labs', 50331982: 'Guillemot_RD_Inc', 50331983: 'Samson_Technologies', 50331984: 'Electoronic_Theatre_Controls', 50331985: 'Research_In_Motion', 50331986: 'Mobileer', 50331987: 'Synthogy', 50331988: 'Lynx_Studio_Technology_Inc', 50331989: 'Damage_Control_Engineering_LLC', 50331990: 'Yost_Engineering_Inc', 50331991: 'Brooks_Forsman_Designs_LLC', 50331992: 'Magnekey', 50331993: 'Garritan_Corp', 50331994: 'Plogue_Art_et_Technology_Inc', 50331995: 'RJM_Music_Technology', 50331996: 'Custom_Solutions_Software', 50331997: 'Sonarcana_LLC', 50331998: 'Centrance', 50339840: 'Dream', 50339841: 'Strand_Lighting', 50339842: 'Amek_Systems', 50339843: 'Casa_Di_Risparmio_Di_Loreto', 50339844: 'Bohm_electronic_GmbH', 50339845: 'Syntec_Digital_Audio', 50339846: 'Trident_Audio_Developments', 50339847: 'Real_World_Studio', 50339848: 'Evolution_Synthesis', 50339849: 'Yes_Technology', 50339850: 'Audiomatica', 50339851: 'Bontempi_Farfisa_COMUS', 50339852: 'F_B_T_Elettronica_SpA', 50339853: 'MidiTemp_GmbH', 50339854: 'LA_Audio_Larking_Audio', 50339855: 'Zero_88_Lighting_Limited', 50339856: 'Micon_Audio_Electronics_GmbH', 50339857: 'Forefront_Technology', 50339858: 'Studio_Audio_and_Video_Ltd', 50339859: 'Kenton_Electronics', 50339860: 'Celco_Division_of_Electrosonic', 50339861: 'ADB', 50339862: 'Marshall_Products_Limited', 50339863: 'DDA', 50339864: 'BSS_Audio_Ltd', 50339865: 'MA_Lighting_Technology', 50339866: 'Fatar_SRL_c_o_Music_Industries', 50339868: 'Artisan_Clasic_Organ_Inc', 50339869: 'Orla_Spa', 50339870: 'Pinnacle_Audio_Klark_Teknik', 50339871: 'TC_Electronics', 50339872: 'Doepfer_Musikelektronik_GmbH', 50339873: 'Creative_Technology_Pte_Ltd_c_o', 50339874: 'Seiyddo_Minami', 50339875: 'Goldstar_Co_Ltd', 50339876: 'Midisoft_s_a_s_di_M_Cima_C', 50339877: 'Samick_Musical_Inst_Co_Ltd', 50339878: 'Penny_and_Giles', 50339879: 'Acorn_Computer', 50339880: 'LSC_Electronics_Pty_Ltd', 50339881: 'Novation_EMS', 50339882: 'Samkyung_Mechatronics', 50339883: 'Medeli_Electronics_Co', 50339884: 'Charlie_Lab_SRL', 50339885: 'Blue_Chip_Music_Technology', 50339886: 'BEE_OH_Corp', 50339887: 'LG_Semiconductor', 50339888: 'TESI', 50339889: 'EMAGIC', 50339890: 'Behringer_GmbH', 50339891: 'Access', 50339892: 'Synoptic', 50339893: 'Hanmesoft_Corp', 50339894: 'Terratec_Electronic_GmbH', 50339895: 'Proel_SpA', 50339896: 'IBK_MIDI', 50339897: 'IRCAM', 50339898: 'Propellerhead_Software', 50339899: 'Red_Sound_Systems_Ltd', 50339900: 'Elektron_ESI_AB', 50339901: 'Sintefex_Audio', 50339902: 'MAM_Music_and_More', 50339903: 'Amsaro_GmbH', 50339904: 'CDS_Advanced_Technology_BV', 50339905: 'Touched_By_Sound_GmbH', 50339906: 'DSP_Arts', 50339907: 'Phil_Rees_Music_Tech', 50339908: 'Stamer_Musikanlagen_GmbH', 50339909: 'Soundart_Musical_Muntaner', 50339910: 'C_Mexx_Software', 50339911: 'Klavis_Technologies', 50339912: 'Noteheads_AB', 50339913: 'Algorithmix', 50339914: 'Skrydstrup_RD', 50339915: 'Professional_Audio_Company', 50339916: 'DBTECH', 50339917: 'Vermona', 50339918: 'Nokia', 50339919: 'Wave_Idea', 50339920: 'Hartmann_GmbH', 50339921: 'Lions_Tracs', 50339922: 'Analogue_Systems', 50339923: 'Focal_JMlab', 50339924: 'Ringway_Electronics_Chang_Zhou', 50339925: 'Faith_Technologies_Digiplug', 50339926: 'Showwork', 50339927: 'Manikin_Electoronic', 50339928: '_1_Come_Tech', 50339929: 'Phonic_Corp', 50339930: 'Lake_Technology', 50339931: 'Silansys_Technologies', 50339932: 'Winbond_Electronics', 50339933: 'Cinetix_Medien_und_Interface_GmbH', 50339934: 'AG_Soluzioni_Digitali', 50339935: 'Sequentix_Music_Systems', 50339936: 'Oram_Pro_Audio', 50339937: 'Be4_Ltd', 50339938: 'Infection_Music', 50339939: 'Central_Music_Co_CME', 50339940: 'GenoQs_Machines', 50339941: 'Medialon', 50339942: 'Waves_Audio_Ltd', 50339943: 'Jerash_Labs', 50339944: 'Da_Fact', 50339945: 'Elby_Designs', 50339946: 'Spectral_Audio', 50339947: 'Arturia', 50339948: 'Vixid', 50339949: 'C_Thru_Music', 50348032: 'CRIMSON_TECHNOLOGY_INC', 50348033: 'SOFTBANK_MOBILE_CORP', 50348035: 'DM_HOLDINGS_INC', 50348036: 'XING_INC', 50348037: 'Pioneer_DJ_Corporation'}
+
+
+def pack_id(value)->int:
+    """pack an ID made of 1 to 3 bytes (int or tuple) into a single integer
+    A single byte ID is kept as is, a tuple is packed as (length<<24 | big-endian bytes)
+    """
+    if isinstance(value, int):
+        return value
+    packed = 0
+    for byte in value:
+        packed = (packed<<8) | byte
+    return (len(value)<<24) | packed
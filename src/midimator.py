@@ -1,45 +1,243 @@
-import datetime
 from functools import partial
 import signal
 import argparse, sys, os
 import time
-import mido
 
 from helpers import MidiHelpers, Helpers
-from midimsg import MidiMsg, Manufacturer
+
+# Modules below are only needed by some commands : they are imported by MidiMator.__load_decoder()
+# so that one-shot commands (list, send) start fast
+datetime = None
+MidiMsg = None
+OffloadPool = None
+
+
+class Session:
+    """ Objects used to process the messages received by transfer and capture commands
+        (all optional, but hexa)
+    """
+    def __init__(self, hexa:bool, rule:'Rule' = None):
+        self.hexa:bool = hexa
+        self.rule:'Rule' = rule
+        self.outports:list = []
+        self.schedulers:list['OutputScheduler'] = [] # sender thread of each output port (None : sent by the callback)
+        self.outstr:str = ''                         # output ports, as logged
+        self.router:'SplitRouter' = None             # if set, selects the output ports of each message
+        self.assemblers:list['ParamAssembler'] = []  # if set, assembles parameter changes of each input port
+        self.assemblers_lock:'threading.Lock' = None # assemblers are fed by the callback and flushed by on_tick
+        self.encoder:'ParamEncoder' = None           # encodes assembled parameter changes for output ports
+        self.writer:'RecordWriter' = None            # if set, messages are written as records instead of logged
+        self.pool:'OffloadPool' = None
+        self.recorder:'SmfWriter' = None
+        self.publisher:'RingWriter' = None
+        self.flight:'FlightRecorder' = None          # if set, keeps the last received messages, dumped on triggers
+        self.flight_triggers:'TriggerSet' = None
+        self.breaker:'LoopBreaker' = None            # if set, stops forwarding messages during a feedback loop
+        self.tracker:'ChannelState' = None
+        self.metrics:'Metrics' = None
+        self.profiler:'SamplingProfiler' = None
+        self.on_exit:list = []  # functions called on exit
+        self.on_tick:list = []  # functions called every second
+        # Messages are stamped with time.monotonic_ns() on reception, this offset gives the wall
+        # clock time (ns since epoch) when they are printed
+        self.clock_offset_ns:int = time.time_ns()-time.monotonic_ns()
 
 
 class MidiMator:
+    # An MSB held by a parameter assembler is given alone if its LSB has not come after this time
+    # (seconds, checked by on_tick)
+    __MSB_TIMEOUT = 0.2
+
     def cmd_list_port():
+        from discover import load_cache
         ports = MidiHelpers.get_midi_ports()
+        # Devices found by the last discover command
+        devices = load_cache()
         print('  #| IN|OUT| PORT NAME')
         num = 1
         for port in ports:
             inport = 'X' if 'input_idx' in ports[port] else '-'
             outport = 'X' if 'output_idx' in ports[port] else '-'
-            print(str(num).rjust(3)+'| '+inport+' | '+outport+' | '+port)
+            names = ', '.join(device.get('manufacturer', 'Unknown').replace('_', ' ') for device in devices.get(port, []))
+            print(str(num).rjust(3)+'| '+inport+' | '+outport+' | '+port+(' ('+names+')' if names else ''))
             num += 1
 
-    def cmd_transfer(input_port, output_port, hexa:bool):
+    def cmd_discover(timeout:float = 1.0, cached:bool = False):
+        """send an Identity Request to every output port at once, and print the devices which
+        answer on input ports within timeout seconds (a single wait for all the ports)
+        The result is cached (see discover.CACHE_PATH), if cached is True it is printed without scanning
+        """
+        import mido
+        from discover import ID_REQUEST, IdentityCollector, describe, load_cache, save_cache
+        from encoder import RawSender
+        if cached:
+            devices = load_cache()
+        else:
+            ports = MidiHelpers.get_midi_ports()
+            collector = IdentityCollector()
+            inports = []
+            outports = []
+            try:
+                for name, port in ports.items():
+                    try:
+                        if 'input_idx' in port:
+                            inports.append(mido.open_input(name, callback=partial(collector.callback, name)))
+                        if 'output_idx' in port:
+                            outports.append((mido.open_output(name), name))
+                    except Exception as e:
+                        print('warning: can not open "'+name+'": '+str(e), file=sys.stderr)
+                # Requests are sent before waiting : devices answer concurrently
+                for outport in outports:
+                    RawSender(outport).send_all([ID_REQUEST])
+                time.sleep(timeout)
+            finally:
+                # Also on CTRL+C : opened ports are always closed
+                for port in inports+[outport[0] for outport in outports]:
+                    port.close()
+            devices = collector.devices
+            for name, found in devices.items():
+                for device in found:
+                    if 'output_idx' in ports.get(name, {}):
+                        device['output'] = name
+            try:
+                save_cache(devices)
+            except OSError as e:
+                print('error: can not write device cache: '+str(e), file=sys.stderr)
+        if not devices:
+            print('no device found')
+        for name, found in devices.items():
+            for device in found:
+                print(name+' : '+describe(device))
+
+    def cmd_transfer(input_port, output_ports:list[str], hexa:bool, workers:int = 0, rule:'Rule' = None, panic:bool = True, metrics:str = None,
+                     sysex_bandwidth:int = None, sysex_chunk:int = 256, publish:str = None, queue_size:int = None, overflow:str = 'drop-oldest',
+                     rules_file:str = None, splits:list[str] = None, assemble:bool = False, flight:float = None,
+                     flight_output:str = 'flight-%Y%m%d-%H%M%S.mid', flight_triggers:str = 'AllNotesOff,decode-error', loop_threshold:int = 1000):
+        """transfer messages from input_port to one or several output ports
+        if panic is True, notes still held when the input port disappears or when CTRL+C is
+        pressed are released (NoteOff) on the output ports
+        if metrics is given (TCP port or "unix:<path>"), counters are served in Prometheus format
+        With several output ports, or if sysex_bandwidth or queue_size is given, each output port
+        has its own sender thread (see OutputScheduler), so that a slow port does not delay the
+        others : messages are sent by priority, at most queue_size (default: 1024) messages wait
+        in the queue of a port, then the overflow policy applies. SysEx messages are split in
+        chunks of sysex_chunk bytes, paced to sysex_bandwidth bytes/s (None or 0: no pacing)
+        if publish is given, received messages are published in a shared memory ring buffer (see cmd_tap)
+        if rules_file is given, rule is read from this file again when it is modified (see config.RuleReloader)
+        if splits (like "C1-B3=1", see router.zone_from_string) are given, or if the rules file has
+        "splits", messages are sent to the output ports of their zone (see router.SplitRouter)
+        if assemble is True, RPN/NRPN and 14 bits controllers are logged as one event, and sent
+        without the parts the output already has (see params.ParamAssembler)
+        if flight is given, received messages of the last flight seconds are kept in memory, and
+        written to flight_output (strftime() fields, .mid or records file) when a message of
+        flight_triggers is received, on a decode error or on SIGUSR2 (see flight.FlightRecorder)
+        if more than loop_threshold messages per second are received again shortly after (feedback
+        loop, duplicate storm), messages are dropped for a while (see loopguard.LoopBreaker, 0: disabled)
+        """
+        if isinstance(output_ports, str):
+            output_ports = [output_ports]
         inport = MidiHelpers.get_or_create_port(input_port, False)
-        outport = MidiHelpers.get_or_create_port(output_port, True)
+        outports = [MidiHelpers.get_or_create_port(output_port, True) for output_port in output_ports]
 
-        if inport and outport:
-            inport[0].callback = partial(MidiMator.__callback_receive, inport=inport, outport=outport, hexa=hexa)
-            # Enter infinite loop (until CTRL+C is pressed)
-            signal.signal(signal.SIGINT, MidiMator.__signal_handler)
-            while True:
-                time.sleep(1)
+        if inport and all(outports):
+            session = Session(hexa, rule)
+            session.outports = outports
+            session.outstr = '", to: "'+'", "'.join(outport[1] for outport in outports)+'"'
+            if not MidiMator.__create_router(session, splits, rules_file):
+                return
+            if assemble:
+                import threading
+                from params import ParamAssembler, ParamEncoder
+                session.assemblers = [ParamAssembler()]
+                session.assemblers_lock = threading.Lock()
+                session.encoder = ParamEncoder()
+                session.on_tick.append(partial(MidiMator.__flush_assemblers, inport, session, MidiMator.__MSB_TIMEOUT))
+                session.on_exit.append(partial(MidiMator.__flush_assemblers, inport, session))
+            if flight:
+                from flight import FlightRecorder, TriggerSet
+                try:
+                    session.flight_triggers = TriggerSet(flight_triggers or '')
+                    session.flight = FlightRecorder(flight, flight_output, [inport[1]])
+                except ValueError as e:
+                    print('error: '+str(e), file=sys.stderr)
+                    return
+                session.on_tick.append(session.flight.check)
+            if loop_threshold:
+                from loopguard import LoopBreaker
+                session.breaker = LoopBreaker(loop_threshold, on_trip=partial(MidiMator.__on_loop, inport, session),
+                                              on_resume=partial(MidiMator.__on_loop_end, inport))
+            if len(outports)>1 or sysex_bandwidth is not None or queue_size is not None:
+                from scheduler import OutputScheduler
+                for outport in outports:
+                    try:
+                        scheduler = OutputScheduler(outport[1], outport[0].send, MidiHelpers.get_sysex_chunk_sender(outport),
+                                                    sysex_bandwidth or 0, sysex_chunk, partial(MidiMator.__on_drop, outport[1], session),
+                                                    1024 if queue_size is None else queue_size, overflow)
+                    except ValueError as e:
+                        print('error: '+str(e), file=sys.stderr)
+                        for scheduler in session.schedulers:
+                            scheduler.close(False)
+                        return
+                    session.schedulers.append(scheduler)
+                    session.on_exit.append(scheduler.close)
+            else:
+                session.schedulers = [None]
+            if panic:
+                from state import ChannelState
+                session.tracker = ChannelState()
+                # Before the sender threads are closed : held notes are released through them
+                session.on_exit.insert(0, partial(MidiMator.__send_note_offs, session))
+                # A virtual port (created because the name does not exist) is listed under another
+                # name (i.e. "RtMidiIn Client:<name>") : only ports opened by their listed name are checked
+                if inport[1] in MidiHelpers.get_midi_ports():
+                    session.on_tick.append(partial(MidiMator.__check_input, inport, session))
+            MidiMator.__run(session, [inport], workers, metrics, publish, rules_file)
 
-    def cmd_capture(input_port, hexa:bool):
-        inport = MidiHelpers.get_or_create_port(input_port, False)
+    def cmd_capture(input_ports:list[str], hexa:bool, workers:int = 0, output_file:str = None, smf_type:int = 1, rule:'Rule' = None, metrics:str = None, index:bool = True, publish:str = None, rules_file:str = None,
+                    assemble:bool = False, output_format:str = 'text'):
+        """capture messages from one or several input ports
+        if output_file is given, messages are also recorded in a Standard MIDI File
+        (smf_type 0 : a single track, smf_type 1 : one track per input port), with an index
+        used by the query command (<output_file>.idx) if index is True
+        if publish is given, received messages are published in a shared memory ring buffer (see cmd_tap)
+        if metrics is given (TCP port or "unix:<path>"), counters are served in Prometheus format
+        if rules_file is given, rule is read from this file again when it is modified (see config.RuleReloader)
+        if assemble is True, RPN/NRPN and 14 bits controllers are logged as one event (the recorded
+        file keeps the received messages)
+        output_format is 'text' (decoded messages), or a format of records.FORMATS (one record per
+        message, with integer timestamps and numeric fields)
+        """
+        if isinstance(input_ports, str):
+            input_ports = [input_ports]
+        inports = [MidiHelpers.get_or_create_port(input_port, False) for input_port in input_ports]
 
-        if inport:
-            inport[0].callback = partial(MidiMator.__callback_receive, inport=inport, hexa=hexa)
-            # Enter infinite loop (until CTRL+C is pressed)
-            signal.signal(signal.SIGINT, MidiMator.__signal_handler)
-            while True:
-                time.sleep(1)
+        if all(inports):
+            session = Session(hexa, rule)
+            if assemble:
+                import threading
+                from params import ParamAssembler
+                session.assemblers = [ParamAssembler() for _ in inports]
+                session.assemblers_lock = threading.Lock()
+                session.on_tick.append(partial(MidiMator.__flush_assemblers, None, session, MidiMator.__MSB_TIMEOUT))
+                session.on_exit.append(partial(MidiMator.__flush_assemblers, None, session))
+            if output_format!='text':
+                from records import RecordWriter
+                try:
+                    session.writer = RecordWriter(output_format, [inport[1] for inport in inports])
+                except ValueError as e:
+                    print('error: '+str(e), file=sys.stderr)
+                    return
+                session.on_exit.append(session.writer.close)
+                session.on_tick.append(session.writer.flush)
+            if output_file:
+                from smf import SmfWriter
+                try:
+                    session.recorder = SmfWriter(output_file, [inport[1] for inport in inports], smf_type, index=index)
+                except (OSError, ValueError) as e:
+                    print('error: can not create "'+output_file+'": '+str(e), file=sys.stderr)
+                    return
+                session.on_exit.append(session.recorder.close)
+            MidiMator.__run(session, inports, workers, metrics, publish, rules_file)
 
     def cmd_send(output_port, msg:list, hexa:bool):
         bytes_msg = []
@@ -56,28 +254,591 @@ class MidiMator:
             MidiHelpers.send_bytes(outport, bytes_msg, hexa)
             outport[0].close()
 
-    def __callback_receive(midimsg:mido.Message, inport, outport = None, hexa = False):
-        outstr = ''
+    def cmd_panic(output_port):
+        """send sustain off, AllNotesOff and AllSoundOff on every channel (pre-encoded messages)"""
+        from encoder import PANIC, RawSender
+        outport = MidiHelpers.get_or_create_port(output_port, True, False)
         if outport:
-            outport[0].send(midimsg)
-            outstr = '", to: "'+outport[1]+'"'
-        msg:MidiMsg
+            if RawSender(outport).send_all(PANIC):
+                print('panic messages sent (to: "'+outport[1]+'")')
+            outport[0].close()
+
+    def cmd_dump_send(output_port, file:str, input_port = None, device:int = 0, sample:int = 0, window:int = 1, packet_timeout_ms:float = 20, file_type:str = None):
+        """send a WAV file (.wav) as a sample dump (SDS), or any other file as a file dump, to output_port
+        Handshake (ACK, NAK, Wait, Cancel) is read from input_port, if given (else : open loop).
+        Up to window packets are sent before their ACK is received (see dump.send_dump)
+        """
+        from dump import MessageQueue, send_dump
+        from encoder import RawSender
+        outport = MidiHelpers.get_or_create_port(output_port, True, False)
+        inport = MidiHelpers.get_or_create_port(input_port, False, False) if input_port else None
+        if not outport or (input_port and not inport):
+            return
+        messages = None
+        if inport:
+            messages = MessageQueue()
+            inport[0].callback = messages.callback
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        try:
+            stats = send_dump(file, RawSender(outport).send, messages, device, sample, window, packet_timeout_ms/1000, file_type=file_type)
+            if stats:
+                print('dump sent (to: "'+outport[1]+'"): '+stats.summary())
+        finally:
+            if inport:
+                inport[0].close()
+            outport[0].close()
+
+    def cmd_dump_receive(input_port, file:str, output_port = None, device:int = None, request:int = None, timeout:float = 10.0):
+        """receive a sample dump (written as a WAV file) or a file dump from input_port, in file
+        (or in this directory, with the name given by the dump)
+        Handshake is sent to output_port, if given (else : open loop). if request is given, this
+        sample number is asked for (Sample Dump Request) (see dump.receive_dump)
+        """
+        from dump import MessageQueue, receive_dump
+        from encoder import RawSender
+        inport = MidiHelpers.get_or_create_port(input_port, False, False)
+        outport = MidiHelpers.get_or_create_port(output_port, True, False) if output_port else None
+        if not inport or (output_port and not outport):
+            return
+        messages = MessageQueue()
+        inport[0].callback = messages.callback
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        try:
+            stats = receive_dump(file, messages, RawSender(outport).send if outport else None, device, request, timeout)
+            if stats:
+                print('dump received (from: "'+inport[1]+'"): '+stats.summary())
+        finally:
+            inport[0].close()
+            if outport:
+                outport[0].close()
+
+    def cmd_clock(output_port, bpm:float, start:bool = True, resume:bool = False, duration:float = None, spin_us:int = 1000):
+        """send MIDI clock to output_port at bpm quarter notes per minute, until CTRL+C is pressed
+        (or for duration seconds). Start (or Continue if resume is True) is sent first, unless
+        start is False, and Stop at the end. Measured jitter is printed at the end.
+        """
+        from clock import MidiClock, DeadlineScheduler
+        from encoder import RawSender
+        outport = MidiHelpers.get_or_create_port(output_port, True)
+        if not outport:
+            return
+        try:
+            # Real-time messages are pre-encoded, and sent without building mido messages
+            clock = MidiClock(RawSender(outport).send, bpm, DeadlineScheduler(spin_us*1000))
+        except ValueError as e:
+            print('error: '+str(e), file=sys.stderr)
+            return
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        print('sending clock at '+str(bpm)+' BPM to "'+outport[1]+'" (CTRL+C to stop)')
+        try:
+            clock.run((0xFB if resume else 0xFA) if start else None, duration)
+        finally:
+            print('clock jitter: '+clock.scheduler.stats.to_string())
+            outport[0].close()
+
+    def cmd_replay(output_port, file:str, spin_us:int = 1000):
+        """send the messages of a Standard MIDI File to output_port, at their time"""
+        import mido
+        from clock import DeadlineScheduler
+        try:
+            midifile = mido.MidiFile(file)
+        except (OSError, ValueError, EOFError) as e:
+            print('error: can not read "'+file+'": '+str(e), file=sys.stderr)
+            return
+        outport = MidiHelpers.get_or_create_port(output_port, True)
+        if not outport:
+            return
+        def events():
+            # Iterating a MidiFile gives messages with delta times in seconds (tempo map applied)
+            offset = 0.0
+            for msg in midifile:
+                offset += msg.time
+                if not msg.is_meta:
+                    yield (round(offset*1e9), msg)
+        scheduler = DeadlineScheduler(spin_us*1000)
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        try:
+            scheduler.play(events(), outport[0].send)
+        finally:
+            print('replay jitter: '+scheduler.stats.to_string())
+            outport[0].reset()
+            outport[0].close()
+
+    def cmd_bridge(port, listen:str, remote:str = None, batch_ms:float = 1.0, redundancy:int = 2):
+        """bridge a midi port over UDP : messages received on port are sent to the remote
+        "host:port" endpoint, messages received on the local listen "[host:]port" are sent to port
+        (run a bridge on each host, with crossed addresses)
+        """
+        import mido
+        from bridge import UdpBridge, parse_address
+        try:
+            listen_address = parse_address(listen)
+            remote_address = parse_address(remote, '127.0.0.1') if remote else None
+        except ValueError as e:
+            print('error: invalid address: '+str(e), file=sys.stderr)
+            return
+        outport = MidiHelpers.get_or_create_port(port, True)
+        inport = MidiHelpers.get_or_create_port(port, False) if remote else None
+        if not outport or (remote and not inport):
+            return
+        send_raw = MidiHelpers.get_raw_sender(outport)
+        def on_message(msg:list[int], sender_time_ns:int):
+            try:
+                if send_raw:
+                    send_raw(msg)
+                else:
+                    outport[0].send(mido.Message.from_bytes(msg))
+            except Exception as e:
+                print('error: can not send message to "'+outport[1]+'": '+str(e), file=sys.stderr)
         try:
-            msg = MidiMsg.from_list(midimsg.bytes())
-        except:
-            print('error: exception in MidiMsg.from_list(); data: '+str(midimsg.bytes()), file=sys.stderr)
+            bridge = UdpBridge(listen_address, remote_address, on_message, batch_ms, redundancy)
+        except OSError as e:
+            print('error: can not listen on "'+listen+'": '+str(e), file=sys.stderr)
             return
+        if inport:
+            # Timestamp is taken first, so that batching does not change the time between messages
+            inport[0].callback = lambda midimsg: bridge.send(midimsg.bytes(), time.monotonic_ns())
+        print('bridging "'+outport[1]+'", listening on '+listen_address[0]+':'+str(listen_address[1])+
+              (', sending to '+remote_address[0]+':'+str(remote_address[1]) if remote_address else ''))
+        def close():
+            bridge.close()
+            print('bridge '+bridge.stats())
+        MidiMator.__wait_for_ctrl_c([close])
+
+    def cmd_query(file:str, rule:'Rule' = None, time_from:float = None, time_to:float = None, controllers:str = None,
+                  manufacturer:str = None, raw:bool = False, hexa:bool = False):
+        """print the messages of a capture file selected by the arguments, using its index
+        (see cmd_capture). time_from and time_to are in seconds from the start of the capture
+        if raw is True, messages are written as raw bytes to the standard output
+        """
+        from index import CaptureIndex, INDEX_EXTENSION
+        from midi_tables import MANUFACTURER_NAMES
+        MidiMator.__load_decoder()
+        try:
+            index = CaptureIndex(file+INDEX_EXTENSION)
+        except (OSError, ValueError) as e:
+            print('error: can not read the index of "'+file+'" (is it a file recorded by capture?): '+str(e), file=sys.stderr)
+            return
+        controller_range = None
+        if controllers:
+            controller_range = Helpers.str_to_range(controllers, 0, 127)
+            if not controller_range:
+                print('error: invalid controller range "'+controllers+'"', file=sys.stderr)
+                return
+        manufacturer_id = None
+        if manufacturer:
+            manufacturer_id = Helpers.str_to_int(manufacturer)
+            if manufacturer_id is None:
+                names = {name.lower():value for value, name in MANUFACTURER_NAMES.items()}
+                manufacturer_id = names.get(manufacturer.lower())
+            elif manufacturer_id>0x7F:
+                # 3 bytes ID, like 0x002109
+                manufacturer_id = (3<<24)|(manufacturer_id&0xFFFF)
+            if manufacturer_id is None:
+                print('error: unknown manufacturer "'+manufacturer+'"', file=sys.stderr)
+                return
+        tick_min = index.ns_to_tick(time_from*1e9) if time_from else 0
+        tick_max = index.ns_to_tick(time_to*1e9) if time_to is not None else None
+        try:
+            results = index.query(file, rule, tick_min, tick_max, controller_range, manufacturer_id)
+            if raw:
+                for _, _, msg in results:
+                    sys.stdout.buffer.write(msg)
+                sys.stdout.buffer.flush()
+                return
+            for tick, track, msg in results:
+                msg_str = MidiMsg.describe(list(msg), hexa)
+                if msg_str:
+                    print(Helpers.get_timestr_ns(index.tick_to_ns(tick))+' | '+msg_str+' (from: "'+index.tracks[track][2]+'")')
+        except OSError as e:
+            print('error: can not read "'+file+'": '+str(e), file=sys.stderr)
+
+    def cmd_tap(name:str, hexa:bool):
+        """print the messages published by a transfer or capture command started with publish=name,
+        from another process (without opening the midi ports)
+        """
+        from shmring import RingReader
+        MidiMator.__load_decoder()
+        try:
+            reader = RingReader(name)
+        except (OSError, ValueError) as e:
+            print('error: can not read shared memory "'+name+'": '+str(e), file=sys.stderr)
+            return
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        # Timestamps are monotonic : converted to wall clock time with the current offset
+        offset_ns = time.time_ns()-time.monotonic_ns()
+        lost = 0
+        try:
+            for port_idx, timestamp_ns, msg in reader.messages():
+                if reader.lost!=lost:
+                    print('warning: '+str(reader.lost-lost)+' message(s) lost (reader too slow)', file=sys.stderr)
+                    lost = reader.lost
+                msg_str = MidiMsg.describe(list(msg), hexa)
+                if msg_str:
+                    port = reader.ports[port_idx] if port_idx<len(reader.ports) else str(port_idx)
+                    print(Helpers.get_timestr_ns(timestamp_ns+offset_ns)+' | '+msg_str+' (from: "'+port+'")')
+        finally:
+            reader.close()
+
+    def cmd_process(files:list[str], output_dir:str, workers:int = None, rule:'Rule' = None)->bool:
+        """apply rule to Standard MIDI Files, results are written in output_dir"""
+        from midimsg import Rule
+        from offline import process_files
+        return process_files(files, output_dir, rule if rule else Rule(), workers)
+
+    def __load_decoder():
+        """import modules needed to decode and print received messages"""
+        global datetime, MidiMsg, OffloadPool
+        import datetime
+        from midimsg import MidiMsg
+        from offload import OffloadPool
+
+    def __run(session:'Session', inports:list, workers:int, metrics:str, publish:str = None, rules_file:str = None):
+        """start receiving messages from inports, until CTRL+C is pressed
+        if publish is given, received messages are published in a shared memory ring buffer of this name
+        if rules_file is given, session rule is reloaded when the file is modified, or on SIGHUP
+        SIGUSR1 starts and stops a profiler, SIGUSR2 prints counters and queue depths (and dumps
+        the flight recorder, if any)
+        """
+        MidiMator.__load_decoder()
+        if publish:
+            from shmring import RingWriter
+            try:
+                session.publisher = RingWriter(publish, [inport[1] for inport in inports])
+            except (OSError, ValueError) as e:
+                print('error: can not create shared memory "'+publish+'": '+str(e), file=sys.stderr)
+                return
+            session.on_exit.append(session.publisher.close)
+        # Counters are always kept, so that they can be printed on SIGUSR2
+        from metrics import Metrics
+        session.metrics = Metrics()
+        if metrics:
+            try:
+                session.metrics.start_server(metrics)
+            except (OSError, ValueError) as e:
+                print('error: can not serve metrics on "'+metrics+'": '+str(e), file=sys.stderr)
+                return
+            session.on_exit.append(session.metrics.stop_server)
+        if workers>0:
+            session.pool = OffloadPool(partial(MidiMsg.describe, hexa=session.hexa), MidiMator.__send_offloaded, workers)
+            # Pool must be emptied before any other exit function is called
+            session.on_exit.insert(0, session.pool.shutdown)
+            session.metrics.add_gauge('offload', session.pool.pending)
+        for scheduler in session.schedulers:
+            if scheduler:
+                session.metrics.add_gauge('output:'+scheduler.name, scheduler.pending, scheduler.high_water)
+        if session.publisher:
+            session.metrics.add_gauge('publish:'+session.publisher.name+' (bytes)', session.publisher.lag)
+        if rules_file:
+            from config import RuleReloader
+            reloader = RuleReloader(rules_file, partial(MidiMator.__set_rule, session))
+            session.on_tick.append(reloader.check)
+            if hasattr(signal, 'SIGHUP'):
+                signal.signal(signal.SIGHUP, lambda signum, frame: reloader.reload())
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, partial(MidiMator.__toggle_profiler, session))
+            signal.signal(signal.SIGUSR2, partial(MidiMator.__dump_state, session))
+            session.on_exit.append(partial(MidiMator.__stop_profiler, session))
+        # Wall clock may be adjusted (NTP) : the offset of monotonic timestamps follows it
+        session.on_tick.append(partial(MidiMator.__update_clock_offset, session))
+        for idx, inport in enumerate(inports):
+            inport[0].callback = partial(MidiMator.__callback_receive, inport=inport, port_idx=idx, session=session)
+        MidiMator.__wait_for_ctrl_c(session.on_exit, session.on_tick)
+
+    def __wait_for_ctrl_c(on_exit:list = None, on_tick:list = None):
+        """Enter infinite loop (until CTRL+C is pressed), then call the functions of on_exit
+        functions of on_tick are called every second
+        """
+        signal.signal(signal.SIGINT, MidiMator.__signal_handler)
+        try:
+            while True:
+                time.sleep(1)
+                for func in on_tick or []:
+                    func()
+        finally:
+            for func in on_exit or []:
+                func()
+
+    def __create_router(session:'Session', splits:list[str], rules_file:str)->bool:
+        """set session.router from splits or from the rules file (reloaded when it is modified)"""
+        from config import load_splits, RuleReloader
+        from router import SplitRouter, Zone, zone_from_string
+        names = [outport[1] for outport in session.outports]
         try:
-            msg_str = (msg.to_raw_string(hexa) + ' = ' + msg.to_string(hexa)) if msg else 'INVALID MESSAGE'
-        except:
-            print('error: exception in MidiMsg.to_string(); data: '+str(midimsg.bytes()), file=sys.stderr)
+            zones = load_splits(rules_file, names) if rules_file else None
+            if zones is not None and splits:
+                raise ValueError('--split can not be used with "splits" of a rules file')
+            if splits:
+                zones = [zone_from_string(split, names) for split in splits]
+        except (OSError, ValueError) as e:
+            print('error: '+str(e), file=sys.stderr)
+            return False
+        if zones is None:
+            return True
+        session.router = SplitRouter(len(names), zones)
+        if rules_file:
+            def apply(zones:list):
+                # "splits" removed from the file : every message goes to every output
+                session.router.set_zones(zones if zones is not None else [Zone((1<<len(names))-1)])
+            reloader = RuleReloader(rules_file, apply, partial(load_splits, outputs=names))
+            session.on_tick.append(reloader.check)
+        return True
+
+    def __update_clock_offset(session:'Session'):
+        session.clock_offset_ns = time.time_ns()-time.monotonic_ns()
+
+    def __set_rule(session:'Session', rule:'Rule'):
+        # A single reference assignment : the reception thread uses either the old or the new rule
+        session.rule = rule
+
+    def __check_input(inport, session:'Session'):
+        """release held notes if the input port has disappeared"""
+        if inport[1] not in MidiHelpers.get_midi_ports():
+            MidiMator.__send_note_offs(session)
+
+    def __send_note_offs(session:'Session'):
+        """release the notes held on the output ports (queued after pending messages if the port has a sender thread)"""
+        import mido
+        from encoder import RawSender
+        note_offs = session.tracker.note_offs()
+        if not note_offs:
+            return
+        for outport, scheduler in zip(session.outports, session.schedulers):
+            if scheduler:
+                for msg in note_offs:
+                    scheduler.put(msg, mido.Message.from_bytes(msg))
+            else:
+                RawSender(outport).send_all(note_offs)
+            print(Helpers.get_timestr(datetime.datetime.now())+' | '+str(len(note_offs))+' held note(s) released (to: "'+outport[1]+'")')
+
+    def __callback_receive(midimsg:'mido.Message', inport, port_idx:int, session:'Session'):
+        # mido rtmidi backend does not give the time of rtmidi : messages are stamped as soon as possible
+        timestamp_ns = time.monotonic_ns()
+        bytes_msg = midimsg.bytes()
+        if session.metrics:
+            session.metrics.received(inport[1], bytes_msg)
+        if session.flight:
+            # Before the filter : the dump shows what the port really received
+            session.flight.write(port_idx, bytes_msg, timestamp_ns)
+            if session.flight_triggers.match(bytes_msg):
+                session.flight.trigger(MidiMsg.describe(bytes_msg, session.hexa) or 'message')
+        if session.breaker and not session.breaker.check(port_idx, bytes_msg, timestamp_ns):
+            # Feedback loop : dropped before any processing, the loop stops and the load with it
+            if session.metrics:
+                session.metrics.dropped(inport[1])
             return
-        print(Helpers.get_timestr(datetime.datetime.now())+' | '+ msg_str + ' (from: "'+inport[1]+'"'+outstr+')')
+        rule = session.rule # read once : the rule may be replaced by another thread
+        if rule and not rule.accept(bytes_msg):
+            if session.metrics:
+                session.metrics.filtered(inport[1])
+            return
+        if session.tracker:
+            session.tracker.update_bytes(bytes_msg)
+        if session.recorder:
+            session.recorder.write(port_idx, bytes_msg, timestamp_ns)
+        if session.publisher:
+            session.publisher.write(port_idx, bytes_msg, timestamp_ns)
+        if session.writer:
+            # Records are made from the raw bytes, without decoding (nor sending : capture only)
+            time_ns = timestamp_ns+session.clock_offset_ns
+            if not session.assemblers:
+                session.writer.write(time_ns, port_idx, bytes_msg)
+                return
+            with session.assemblers_lock:
+                for item in session.assemblers[port_idx].feed(bytes_msg, timestamp_ns):
+                    session.writer.write(time_ns, port_idx, item)
+            return
+        if session.assemblers:
+            with session.assemblers_lock:
+                items = session.assemblers[port_idx].feed(bytes_msg, timestamp_ns)
+                if len(items)!=1 or items[0] is not bytes_msg:
+                    for item in items:
+                        MidiMator.__dispatch_assembled(item, timestamp_ns, inport, session)
+                    return
+                if session.encoder:
+                    session.encoder.encode(bytes_msg)
+        if session.pool:
+            # Decoding is done by the pool, which calls __send_offloaded() in reception order
+            session.pool.submit(inport[1], bytes_msg, (timestamp_ns, midimsg, inport, session))
+            return
+        outstr = MidiMator.__forward(midimsg, session)
+        MidiMator.__log(MidiMsg.describe(bytes_msg, session.hexa), timestamp_ns, inport, session, outstr)
+
+    def __flush_assemblers(inport, session:'Session', max_age:float = None):
+        """give the MSBs held by the assemblers for more than max_age seconds (all if None) :
+        the LSB that would complete them is not coming
+        """
+        timestamp_ns = time.monotonic_ns()
+        before_ns = None if max_age is None else timestamp_ns-round(max_age*1e9)
+        with session.assemblers_lock:
+            for port_idx, assembler in enumerate(session.assemblers):
+                for item in assembler.flush(before_ns):
+                    if session.writer:
+                        session.writer.write(timestamp_ns+session.clock_offset_ns, port_idx, item)
+                    else:
+                        MidiMator.__dispatch_assembled(item, timestamp_ns, inport, session)
+
+    def __dispatch_assembled(item, timestamp_ns:int, inport, session:'Session'):
+        """send and print a message given by the parameter assembler (raw message or ParamEvent)"""
+        import mido
+        if isinstance(item, list):
+            msg = item
+            midimsg = mido.Message.from_bytes(item)
+            if session.encoder:
+                session.encoder.encode(item)
+        else:
+            # The encoded event may have fewer messages than the received ones
+            msg = item.msgs[-1]
+            midimsg = (item, [mido.Message.from_bytes(raw) for raw in session.encoder.encode(item)] if session.encoder else [])
+        context = (timestamp_ns, midimsg, inport, session)
+        if session.pool:
+            # Through the pool, so that messages of the port stay in reception order
+            session.pool.submit(inport[1], msg, context)
+            return
+        MidiMator.__send_offloaded(msg, MidiMsg.describe(msg, session.hexa) if midimsg.__class__ is not tuple else None, context)
+
+    def __send_offloaded(bytes_msg:list[int], msg_str:str, context):
+        """send a message to the output port and print it, once decoded by the pool"""
+        timestamp_ns, midimsg, inport, session = context
+        if midimsg.__class__ is tuple:
+            # Parameter event, and its encoded messages
+            event, midimsgs = midimsg
+            outstr = ''
+            for msg in midimsgs:
+                outstr = MidiMator.__forward(msg, session)
+            MidiMator.__log(event.to_string(session.hexa), timestamp_ns, inport, session, outstr)
+            return
+        outstr = MidiMator.__forward(midimsg, session)
+        MidiMator.__log(msg_str, timestamp_ns, inport, session, outstr)
+
+    def __forward(midimsg:'mido.Message', session:'Session')->str:
+        """send a message to the output ports (if any), return the destination string to log
+        Messages are only queued for output ports that have a sender thread
+        """
+        bytes_msg = None
+        outputs = -1
+        outstr = session.outstr
+        if session.router:
+            bytes_msg = midimsg.bytes()
+            outputs = session.router.route(bytes_msg)
+            outstr = '", to: "'+'", "'.join(outport[1] for idx, outport in enumerate(session.outports) if (outputs>>idx)&1)+'"' if outputs else ''
+        for idx, (outport, scheduler) in enumerate(zip(session.outports, session.schedulers)):
+            if not (outputs>>idx)&1:
+                continue
+            if scheduler:
+                if bytes_msg is None:
+                    bytes_msg = midimsg.bytes()
+                scheduler.put(bytes_msg, midimsg)
+                continue
+            try:
+                outport[0].send(midimsg)
+            except Exception as e:
+                print('error: can not send message to "'+outport[1]+'": '+str(e), file=sys.stderr)
+                MidiMator.__on_drop(outport[1], session, midimsg)
+        return outstr
+
+    def __on_loop(inport, session:'Session', msg:list[int], duplicates:int):
+        """the loop breaker has tripped (msg : last duplicate)"""
+        msg_str = MidiMsg.describe(msg, session.hexa) or MidiHelpers.bytes_to_raw_string(msg, session.hexa)
+        print(Helpers.get_timestr(datetime.datetime.now())+' | error: feedback loop or duplicate storm on route (from: "'+inport[1]+session.outstr+'), '
+              +str(duplicates)+' duplicates (last: '+msg_str+'), messages dropped for '+('%g' % session.breaker.cooldown())+' s', file=sys.stderr)
+        if session.flight:
+            session.flight.trigger('feedback loop')
+
+    def __on_loop_end(inport, dropped:int):
+        print(Helpers.get_timestr(datetime.datetime.now())+' | messages forwarded again (from: "'+inport[1]+'"), '+str(dropped)+' dropped', file=sys.stderr)
+
+    def __on_drop(port:str, session:'Session', item):
+        """message that could not be sent to port"""
+        if session.metrics:
+            session.metrics.dropped(port)
+
+    def __log(msg_str:str, timestamp_ns:int, inport, session:'Session', outstr:str):
+        """print a message received at timestamp_ns (time.monotonic_ns() value)"""
+        if msg_str is None or msg_str==MidiMsg.INVALID_MESSAGE:
+            if session.metrics:
+                if msg_str is None:
+                    session.metrics.decode_error(inport[1])
+                else:
+                    session.metrics.invalid(inport[1])
+            if session.flight and session.flight_triggers.decode_error:
+                session.flight.trigger('decode error' if msg_str is None else 'invalid message')
+        if msg_str:
+            print(Helpers.get_timestr_ns(timestamp_ns+session.clock_offset_ns)+' | '+ msg_str + ' (from: "'+inport[1]+'"'+outstr+')')
 
     def __signal_handler(signal, frame):
         """Handler for Ctrl-C"""
         sys.exit(0)
 
+    def __toggle_profiler(session:'Session', signum, frame):
+        """Handler for SIGUSR1"""
+        if session.profiler and session.profiler.running():
+            MidiMator.__stop_profiler(session)
+            return
+        from profiler import SamplingProfiler
+        session.profiler = SamplingProfiler()
+        session.profiler.start()
+        print(Helpers.get_timestr(datetime.datetime.now())+' | profiler started (send SIGUSR1 again to stop it)', file=sys.stderr)
+
+    def __stop_profiler(session:'Session'):
+        """stop the profiler if it is running, and write its stacks in the current directory"""
+        if not session.profiler or not session.profiler.running():
+            return
+        session.profiler.stop()
+        path = 'midimator-'+str(os.getpid())+'-'+datetime.datetime.now().strftime('%Y%m%d-%H%M%S')+'.folded'
+        try:
+            session.profiler.write(path)
+        except OSError as e:
+            print('error: can not write profile to "'+path+'": '+str(e), file=sys.stderr)
+            path = None
+        print(session.profiler.summary(), file=sys.stderr)
+        if path:
+            print(Helpers.get_timestr(datetime.datetime.now())+' | profile written to "'+path+'" (folded stacks)', file=sys.stderr)
+
+    def __dump_state(session:'Session', signum, frame):
+        """Handler for SIGUSR2"""
+        print(Helpers.get_timestr(datetime.datetime.now())+' | counters and queue depths :', file=sys.stderr)
+        print(session.metrics.to_prometheus(), end='', file=sys.stderr)
+        if session.flight:
+            # Written by the main loop, not in the signal handler
+            session.flight.trigger('SIGUSR2')
+
+def add_filter_arguments(parser:argparse.ArgumentParser):
+    parser.add_argument('--types', help='comma separated list of message types (NoteOn, ProgramChange, SystemExclusive, ...) or categories (CVM, CC, CM, SCM, RTM) to select', type=str)
+    parser.add_argument('--channels', help='range of channels to select, like "1-4" or "10"', type=str)
+    parser.add_argument('--velocities', help='range of note velocities to select, like "1-64"', type=str)
+    parser.add_argument('--exclude', help='remove selected messages, instead of keeping them', action='store_true')
+    parser.add_argument('--rules', help='read filters from this JSON configuration file (see config.py), instead of the options above. Live commands reload it when it is modified, or on SIGHUP', type=str)
+
+def rule_from_args(args)->'Rule':
+    """return a rule made of the filter given by add_filter_arguments() options (or read from
+    the --rules file), None if no option is set
+    raises ValueError if an option or the rules file is invalid
+    """
+    options = args.types or args.channels or args.velocities or args.exclude
+    if args.rules:
+        if options:
+            raise ValueError('--rules can not be used with --types, --channels, --velocities or --exclude')
+        from config import load_rule
+        try:
+            return load_rule(args.rules)
+        except OSError as e:
+            raise ValueError('can not read rules file: '+str(e))
+    if not options:
+        return None
+    from config import filter_from_dict
+    from midimsg import Rule
+    value = {'exclude': args.exclude}
+    if args.types:
+        value['types'] = args.types
+    if args.channels:
+        value['channels'] = args.channels
+    if args.velocities:
+        value['velocities'] = args.velocities
+    rule = Rule()
+    rule.filters = [[filter_from_dict(value)]]
+    return rule
+
 def main(argv):
     argParser = argparse.ArgumentParser(description="Midimator can transfer midi messages from one interface to another")
     subparsers = argParser.add_subparsers(title="commands", dest="cmd", description="use -h argument after command name to get help", required=True)
@@ -86,12 +847,101 @@ def main(argv):
 
     parser = subparsers.add_parser('transfer', help='transfer midi messages from one port to another')
     parser.add_argument('input_port', help="name (or number) of the midi port to read messages from. If the given port does not exists, a virtual port is created", type=str)
-    parser.add_argument('output_port', help="name (or number) of the midi port to write messages to. If the given port does not exists, a virtual port is created", type=str)
+    parser.add_argument('output_port', help="name (or number) of the midi port(s) to write messages to. If a given port does not exists, a virtual port is created", type=str, nargs='+')
     parser.add_argument('-H', help='integer values are logged in hexa format', action='store_true')
+    parser.add_argument('-w', '--workers', help='number of worker processes used to decode heavy messages (SysEx). Order of messages is kept. Default is 0 (decode in reception thread)', type=int, default=0)
+    parser.add_argument('--no-panic', help='do not release held notes when the input port disappears or on exit', action='store_true')
+    parser.add_argument('--sysex-bandwidth', help='send messages by priority from a dedicated thread (real-time, then channel, then SysEx), and pace SysEx to this number of bytes per second (0: no pacing, 3125: MIDI DIN link)', type=int)
+    parser.add_argument('--split', help='keyboard split : send notes of a zone to some output ports, like "C1-B3=1" or "10/C4-=2,3" ([channels/]notes=outputs, outputs are numbers from 1 or names). Other channel messages go to the outputs of their channel. Can be given several times', type=str, action='append')
+    parser.add_argument('--queue-size', help='send messages from a dedicated thread per output port (always the case with several output ports), with at most this number of messages waiting (default: 1024)', type=int)
+    parser.add_argument('--overflow', help='what to do when the queue of an output port is full : drop the oldest message (default), drop the new one, or update a waiting control change with the new value (coalesce-cc, always done when a control change is waiting, then drop-oldest)', choices=['drop-oldest', 'drop-newest', 'coalesce-cc'], default='drop-oldest')
+    parser.add_argument('--sysex-chunk', help='with --sysex-bandwidth, size of the chunks SysEx messages are split into, so that real-time messages can be sent between them (default: 256)', type=int, default=256)
+    parser.add_argument('--metrics', help='serve counters in Prometheus text format (GET /metrics) on this local TCP port, or on "unix:<path>" socket', type=str)
+    parser.add_argument('--publish', help='publish received messages in a shared memory ring buffer of this name, read by the tap command (or shmring.RingReader) from other processes', type=str)
+    parser.add_argument('--assemble', help='log RPN, NRPN and 14 bits controllers (MSB + LSB) as one parameter change, and send them without the parameter numbers or MSB the output already has', action='store_true')
+    parser.add_argument('--flight', help='flight recorder : keep the messages received in the last FLIGHT seconds in memory, and write them to a file on a trigger (see --flight-trigger) or on SIGUSR2', type=float)
+    parser.add_argument('--flight-output', help='with --flight, path of the files written, with strftime() fields. The extension gives the format : .mid (default: flight-%%Y%%m%%d-%%H%%M%%S.mid), .ndjson, .csv or .txt (compact records)', type=str, default='flight-%Y%m%d-%H%M%S.mid')
+    parser.add_argument('--loop-threshold', help='feedback loop protection : drop messages for a while when more than this number of messages per second are received again shortly after, i.e. when an output is connected back to the input (0: disabled, default: 1000)', type=int, default=1000)
+    parser.add_argument('--flight-trigger', help='with --flight, comma separated list of message types, channel modes, controllers or "decode-error" that trigger a dump (default: AllNotesOff,decode-error)', type=str, default='AllNotesOff,decode-error')
+    add_filter_arguments(parser)
 
     parser = subparsers.add_parser('capture', help='capture and print received midi messages')
-    parser.add_argument('input_port', help="name (or number) of the midi port to read messages from. If the given port does not exists, a virtual port is created", type=str)
+    parser.add_argument('input_port', help="name (or number) of the midi port(s) to read messages from. If a given port does not exists, a virtual port is created", type=str, nargs='+')
+    parser.add_argument('-H', help='integer values are logged in hexa format', action='store_true')
+    parser.add_argument('-w', '--workers', help='number of worker processes used to decode heavy messages (SysEx). Order of messages is kept. Default is 0 (decode in reception thread)', type=int, default=0)
+    parser.add_argument('-o', '--output', help='record received messages in this Standard MIDI File (.mid). System common and real-time messages are not recorded', type=str)
+    parser.add_argument('--smf-type', help='type of the Standard MIDI File : 0 (single track) or 1 (one track per input port, default)', type=int, choices=[0, 1], default=1)
+    parser.add_argument('--no-index', help='do not write the index used by the query command (<output>.idx)', action='store_true')
+    parser.add_argument('--publish', help='publish received messages in a shared memory ring buffer of this name, read by the tap command (or shmring.RingReader) from other processes', type=str)
+    parser.add_argument('--metrics', help='serve counters in Prometheus text format (GET /metrics) on this local TCP port, or on "unix:<path>" socket', type=str)
+    parser.add_argument('--assemble', help='log RPN, NRPN and 14 bits controllers (MSB + LSB) as one parameter change. The recorded file keeps the received messages', action='store_true')
+    parser.add_argument('--format', help='output format : decoded messages (text, default), or one record per message with an integer timestamp (ns since epoch) and numeric fields, as JSON lines (ndjson), CSV with a header (csv) or space separated values (compact). Records are written by blocks, at least every second', choices=['text', 'ndjson', 'csv', 'compact'], default='text')
+    add_filter_arguments(parser)
+
+    parser = subparsers.add_parser('clock', help='send MIDI clock (TimingClock) messages at a given tempo')
+    parser.add_argument('output_port', help="name (or number) of the midi port to write messages to. If the given port does not exists, a virtual port is created", type=str)
+    parser.add_argument('bpm', help="tempo, in beats (quarter notes) per minute", type=float)
+    parser.add_argument('--continue', help='send Continue instead of Start first', action='store_true', dest='resume')
+    parser.add_argument('--no-start', help='do not send Start (or Continue) first', action='store_true')
+    parser.add_argument('-d', '--duration', help='stop after this number of seconds (default: until CTRL+C is pressed)', type=float)
+    parser.add_argument('--spin-us', help='the scheduler sleeps until this number of microseconds before each deadline, then spins (default: 1000)', type=int, default=1000)
+
+    parser = subparsers.add_parser('replay', help='send the messages of a Standard MIDI File at their time')
+    parser.add_argument('output_port', help="name (or number) of the midi port to write messages to. If the given port does not exists, a virtual port is created", type=str)
+    parser.add_argument('file', help="Standard MIDI File (.mid) to play", type=str)
+    parser.add_argument('--spin-us', help='the scheduler sleeps until this number of microseconds before each deadline, then spins (default: 1000)', type=int, default=1000)
+
+    parser = subparsers.add_parser('query', help='print the messages of a file recorded by capture, selected with its index (without reading the whole file)')
+    parser.add_argument('file', help="Standard MIDI File recorded by capture -o (its index <file>.idx is used)", type=str)
+    parser.add_argument('--from', help='start time, in seconds from the start of the capture', type=float, dest='time_from')
+    parser.add_argument('--to', help='end time, in seconds from the start of the capture', type=float, dest='time_to')
+    parser.add_argument('--controllers', help='select control changes with a number in this range, like "64" or "0-31"', type=str)
+    parser.add_argument('--manufacturer', help='select SysEx of this manufacturer, by name (like ROLAND_CORPORATION) or ID (like 0x41 or 0x002109)', type=str)
+    parser.add_argument('--raw', help='write selected messages as raw bytes to the standard output', action='store_true')
     parser.add_argument('-H', help='integer values are logged in hexa format', action='store_true')
+    add_filter_arguments(parser)
+
+    parser = subparsers.add_parser('tap', help='print the messages published by a transfer or capture command started with --publish')
+    parser.add_argument('name', help="name given to --publish", type=str)
+    parser.add_argument('-H', help='integer values are logged in hexa format', action='store_true')
+
+    parser = subparsers.add_parser('process', help='apply filters to Standard MIDI Files, as transfer does for live messages')
+    parser.add_argument('files', help="Standard MIDI Files (.mid) to process", type=str, nargs='+')
+    parser.add_argument('-o', '--output-dir', help='directory where processed files are written', type=str, required=True)
+    parser.add_argument('-w', '--workers', help='number of worker processes (one file per task). Default is the number of CPUs', type=int)
+    add_filter_arguments(parser)
+
+    parser = subparsers.add_parser('bridge', help='bridge a midi port to another host over UDP (several messages per datagram, lost datagrams detection)')
+    parser.add_argument('port', help="name (or number) of the local midi port. If the given port does not exists, virtual ports are created", type=str)
+    parser.add_argument('listen', help="local UDP address to receive messages on, like \"5004\" or \"0.0.0.0:5004\"", type=str)
+    parser.add_argument('remote', help="UDP address of the remote bridge to send messages to, like \"192.168.1.10:5004\" (default: receive only)", type=str, nargs='?')
+    parser.add_argument('-b', '--batch-ms', help='messages are grouped in a datagram for at most this number of milliseconds (0: one datagram per message, default: 1)', type=float, default=1.0)
+    parser.add_argument('-r', '--redundancy', help='NoteOffs are repeated in this number of following datagrams, so that a lost datagram does not leave a note held (0: none, default: 2)', type=int, default=2)
+
+    parser = subparsers.add_parser('discover', help='find the devices connected to the midi ports (Identity Request sent to every output port)')
+    parser.add_argument('-t', '--timeout', help='seconds to wait for the answers of all the devices (default: 1)', type=float, default=1.0)
+    parser.add_argument('--cached', help='print the devices found by the last scan, without scanning', action='store_true')
+
+    parser = subparsers.add_parser('panic', help='release every note of a midi port (sustain off, AllNotesOff and AllSoundOff on every channel)')
+    parser.add_argument('output_port', help="name (or number) of the midi port to write messages to", type=str)
+
+    parser = subparsers.add_parser('dump-send', help='send a sample (WAV file, Sample Dump Standard) or any file (MIDI File Dump) to a device')
+    parser.add_argument('output_port', help="name (or number) of the midi port to send the dump to", type=str)
+    parser.add_argument('file', help="file to send : a mono WAV file (.wav) is sent as a sample, other files as a file dump", type=str)
+    parser.add_argument('-i', '--input', help='name (or number) of the midi port the device answers on (ACK, NAK, Wait, Cancel). Without it, packets are sent without handshake (open loop)', type=str)
+    parser.add_argument('-d', '--device', help='device ID (SysEx channel) of the dump (default: 0)', type=int, default=0)
+    parser.add_argument('-s', '--sample', help='sample number the sample is stored as (default: 0)', type=int, default=0)
+    parser.add_argument('--window', help='number of packets sent before their ACK is received (default: 1, as required by most devices, at most 64)', type=int, default=1)
+    parser.add_argument('--packet-timeout', help='milliseconds to wait for the ACK of a packet, and between packets in open loop (default: 20)', type=float, default=20)
+    parser.add_argument('--file-type', help='type of a file dump (4 characters, default: MIDI for .mid files, TEXT for .txt files, else "BIN ")', type=str)
+
+    parser = subparsers.add_parser('dump-receive', help='receive a sample (written as a WAV file, Sample Dump Standard) or a file (MIDI File Dump) from a device')
+    parser.add_argument('input_port', help="name (or number) of the midi port to receive the dump from", type=str)
+    parser.add_argument('file', help="file to write, or directory (the name is given by the dump)", type=str)
+    parser.add_argument('-o', '--output', help='name (or number) of the midi port to send the handshake to (ACK, NAK). Without it, packets are received without handshake (open loop)', type=str)
+    parser.add_argument('-d', '--device', help='only receive the dump of this device ID (SysEx channel)', type=int)
+    parser.add_argument('-r', '--request', help='ask the device for this sample number (Sample Dump Request), instead of waiting for a dump', type=int)
+    parser.add_argument('-t', '--timeout', help='seconds to wait for the dump, and for each packet (default: 10)', type=float, default=10.0)
 
     parser = subparsers.add_parser('send', help='send a midi message')
     parser.add_argument('output_port', help="name (or number) of the midi port to write the message to", type=str)
@@ -100,14 +950,46 @@ def main(argv):
 
     args = argParser.parse_args()
 
+    rule = None
+    if 'types' in args:
+        try:
+            rule = rule_from_args(args)
+        except ValueError as e:
+            print('error: '+str(e), file=sys.stderr)
+            return
+
     if args.cmd=='list':
         MidiMator.cmd_list_port()
     elif args.cmd=='transfer':
-        MidiMator.cmd_transfer(args.input_port.strip('"'), args.output_port.strip('"'), args.H)
+        MidiMator.cmd_transfer(args.input_port.strip('"'), [port.strip('"') for port in args.output_port], args.H, args.workers, rule, not args.no_panic, args.metrics,
+                               args.sysex_bandwidth, args.sysex_chunk, args.publish, args.queue_size, args.overflow, args.rules, args.split, args.assemble,
+                               args.flight, args.flight_output, args.flight_trigger, args.loop_threshold)
     elif args.cmd=='capture':
-        MidiMator.cmd_capture(args.input_port.strip('"'), args.H)
+        MidiMator.cmd_capture([port.strip('"') for port in args.input_port], args.H, args.workers, args.output, args.smf_type, rule, args.metrics, not args.no_index, args.publish, args.rules, args.assemble, args.format)
+    elif args.cmd=='clock':
+        MidiMator.cmd_clock(args.output_port.strip('"'), args.bpm, not args.no_start, args.resume, args.duration, args.spin_us)
+    elif args.cmd=='replay':
+        MidiMator.cmd_replay(args.output_port.strip('"'), args.file, args.spin_us)
+    elif args.cmd=='query':
+        MidiMator.cmd_query(args.file, rule, args.time_from, args.time_to, args.controllers, args.manufacturer, args.raw, args.H)
+    elif args.cmd=='tap':
+        MidiMator.cmd_tap(args.name, args.H)
+    elif args.cmd=='process':
+        # Batch processing : a failure must be visible to the calling script
+        sys.exit(0 if MidiMator.cmd_process(args.files, args.output_dir, args.workers, rule) else 1)
+    elif args.cmd=='bridge':
+        MidiMator.cmd_bridge(args.port.strip('"'), args.listen, args.remote, args.batch_ms, args.redundancy)
     elif args.cmd=='send':
         MidiMator.cmd_send(args.output_port.strip('"'), args.value, args.H)
+    elif args.cmd=='panic':
+        MidiMator.cmd_panic(args.output_port.strip('"'))
+    elif args.cmd=='discover':
+        MidiMator.cmd_discover(args.timeout, args.cached)
+    elif args.cmd=='dump-send':
+        MidiMator.cmd_dump_send(args.output_port.strip('"'), args.file, args.input.strip('"') if args.input else None, args.device, args.sample,
+                                args.window, args.packet_timeout, args.file_type)
+    elif args.cmd=='dump-receive':
+        MidiMator.cmd_dump_receive(args.input_port.strip('"'), args.file, args.output.strip('"') if args.output else None, args.device, args.request, args.timeout)
 
 if __name__ == "__main__":
    main(sys.argv[1:])
\ No newline at end of file
@@ -1,8 +1,15 @@
-import datetime
-from enum import Enum, auto
-from typing import Self
+import sys
 from helpers import Helpers
-from midi_enum import *
+from midi_tables import *
+
+
+def __getattr__(name:str):
+    # Enumerations are still available from this module (i.e. midimsg.Manufacturer),
+    # but midi_enum is only imported when one of them is used
+    import midi_enum
+    if not name.startswith('_') and hasattr(midi_enum, name):
+        return getattr(midi_enum, name)
+    raise AttributeError("module '"+__name__+"' has no attribute '"+name+"'")
 
 
 class MidiMsg:
@@ -31,23 +38,70 @@ class MidiMsg:
     """
     def __init__(self):
         self.bytes:list[int] = []
-        self.category:MsgCategory = None
-        self.type:(ChannelMsg | SystemCommonMsg | RealTimeMsg) = None
+        # Decoded values are stored as integers (see midi_tables.py), the matching
+        # midi_enum members are only built when the properties below are read
+        self.category_id:int = 0            # MsgCategory value, 0 if unknown
+        self.type_id:int = -1               # ChannelMsg value, or status byte for system messages
         self.note:int = -1
         self.channel:int = -1
         self.velocity:int = -1
-        self.control_change:ControlChange = None
-        self.channel_mode:ControlChange = None
+        self.control_change_id:int = -1     # ControlChange value
+        self.channel_mode_id:int = -1       # ChannelMode value
         self.value:int = -1
         self.sys_ex_type:str = ''
         self.sys_ex_data:int = []
         self.sys_ex_type_data = None
-        self.sys_ex_manufacturer:Manufacturer = None
+        self.sys_ex_manufacturer_id:int = -1 # packed manufacturer ID (see midi_tables.pack_id())
         self.sys_ex_dev_id:int = -1
-        self.sys_ex_nrt:NRTSysEx = None
-        self.sys_ex_rt:RTSysEx = None
+        self.sys_ex_nrt_id:int = -1         # packed NRTSysEx value
+        self.sys_ex_rt_id:int = -1          # packed RTSysEx value
+
+    @property
+    def category(self)->'MsgCategory':
+        from midi_enum import MsgCategory
+        return MsgCategory(self.category_id) if self.category_id else None
+
+    @property
+    def type(self)->'ChannelMsg | SystemCommonMsg | RealTimeMsg':
+        from midi_enum import ChannelMsg, SystemCommonMsg, RealTimeMsg
+        if self.type_id<0:
+            return None
+        if self.type_id<0x10:
+            return ChannelMsg(self.type_id)
+        if self.category_id==MsgCategory_SCM:
+            return SystemCommonMsg(self.type_id)
+        return RealTimeMsg(self.type_id)
+
+    @property
+    def control_change(self)->'ControlChange':
+        from midi_enum import ControlChange
+        return ControlChange(self.control_change_id) if self.control_change_id>=0 else None
+
+    @property
+    def channel_mode(self)->'ChannelMode':
+        from midi_enum import ChannelMode
+        return ChannelMode(self.channel_mode_id) if self.channel_mode_id>=0 else None
 
-    def from_list(msg:list[int])->Self:
+    @property
+    def sys_ex_manufacturer(self)->'Manufacturer':
+        from midi_enum import Manufacturer
+        if self.sys_ex_manufacturer_id<0:
+            return None
+        if self.sys_ex_manufacturer_id in MANUFACTURER_NAMES:
+            return Manufacturer(MidiMsg.__unpack_id(self.sys_ex_manufacturer_id))
+        return Manufacturer.Unknown
+
+    @property
+    def sys_ex_nrt(self)->'NRTSysEx':
+        from midi_enum import NRTSysEx
+        return NRTSysEx(MidiMsg.__unpack_id(self.sys_ex_nrt_id)) if self.sys_ex_nrt_id>=0 else None
+
+    @property
+    def sys_ex_rt(self)->'RTSysEx':
+        from midi_enum import RTSysEx
+        return RTSysEx(MidiMsg.__unpack_id(self.sys_ex_rt_id)) if self.sys_ex_rt_id>=0 else None
+
+    def from_list(msg:list[int])->'MidiMsg':
         res:MidiMsg = MidiMsg()
         size = len(msg)
         invalid_data = True
@@ -55,46 +109,46 @@ class MidiMsg:
             res.bytes = msg
             MSB = (msg[0]>>4)&0xF
             LSB = msg[0]&0xF
-            if MidiMsg.__has_value(ChannelMsg, MSB):
-                res.category = MsgCategory.CVM
-                res.type = ChannelMsg(MSB)
-                res.channel = LSB                
-                if res.type==ChannelMsg.NoteOff or res.type==ChannelMsg.NoteOn or res.type==ChannelMsg.PolyphonicKeyPressure:
+            if CHANNEL_MSG_NAMES[MSB]:
+                res.category_id = MsgCategory_CVM
+                res.type_id = MSB
+                res.channel = LSB
+                if MSB==ChannelMsg_NoteOff or MSB==ChannelMsg_NoteOn or MSB==ChannelMsg_PolyphonicKeyPressure:
                     if size==3:
                         res.note = msg[1]
                         res.velocity = msg[2]
                         invalid_data = False
-                
-                elif res.type==ChannelMsg.CtrlChangeOrChannelMode:
+
+                elif MSB==ChannelMsg_CtrlChangeOrChannelMode:
                     if size==3:
-                        if msg[1]<120 and msg[1] in ControlChange:
-                            res.category = MsgCategory.CC
-                            res.control_change = ControlChange(msg[1])
+                        if msg[1]<120:
+                            res.category_id = MsgCategory_CC
+                            res.control_change_id = msg[1]
                             if msg[2]<128:
                                 res.value = msg[2]
                                 invalid_data = False
-                        elif msg[1]>=120 and msg[1] in ChannelMode:
-                            res.category = MsgCategory.CM
-                            res.channel_mode = ChannelMode(msg[1])
+                        elif msg[1]<128:
+                            res.category_id = MsgCategory_CM
+                            res.channel_mode_id = msg[1]
                             if msg[2]<128:
                                 res.value = msg[2]
                                 invalid_data = False
-                                
-                elif res.type==ChannelMsg.ProgramChange or res.type==ChannelMsg.ChannelPressure:
+
+                elif MSB==ChannelMsg_ProgramChange or MSB==ChannelMsg_ChannelPressure:
                     if size==2:
                         res.value = msg[1]
                         invalid_data = False
-                        
-                elif res.type==ChannelMsg.PitchBendChange:
+
+                elif MSB==ChannelMsg_PitchBendChange:
                     if size==3:
                         res.value = (msg[2]<<7)+msg[1]
                         invalid_data = False
-                
-            elif MidiMsg.__has_value(SystemCommonMsg, msg[0]):
-                res.category = MsgCategory.SCM
-                res.type = SystemCommonMsg(msg[0])
-                if res.type==SystemCommonMsg.SystemExclusive:
-                    if size>2 and (msg[len(msg)-1] == SystemCommonMsg.EndOfExclusive.value):
+
+            elif msg[0]<0xF8 and STATUS_NAMES[msg[0]]:
+                res.category_id = MsgCategory_SCM
+                res.type_id = msg[0]
+                if msg[0]==SystemCommonMsg_SystemExclusive:
+                    if size>2 and (msg[size-1] == SystemCommonMsg_EndOfExclusive):
                         # url : https://encyclopedia.pub/entry/34593
                         # Start of SysEx is followed by either a Manufacturer ID byte, or three Manufacturer ID bytes when the first byte is zero:
                         # F0 <ID number> <data Bytes>... F7
@@ -102,20 +156,7 @@ class MidiMsg:
                         # ID number and data bytes use 7-bit values and their high bit is always set to 0.
                         # Universal System Exclusive messages are formed from Manufacturer ID number 0x7E for non-realtime and 0x7F for realtime messages, a SysEx 'Device ID' (SysEx 'channel' set in each instrument's settings) or 0x7F to broadcast to all devices, then one or two Sub-ID bytes to indicate function then data bytes:
                         # F0 <7E or 7F> <device ID> <sub ID#1> ... <data Bytes> ... F7
-
-                        id = None
                         pos = 2
-                        if msg[1]==0:
-                            id = (0, msg[2], msg[3])
-                            pos = 4
-                        elif msg[1] != 0x7E and msg[1] != 0x7F:
-                            id = (msg[1])
-                        if id:
-                            if id in Manufacturer:
-                                res.sys_ex_manufacturer = Manufacturer(id)
-                            else:
-                                res.sys_ex_manufacturer = Manufacturer.Unknown
-                        
                         if msg[1] == 0x7E or msg[1] == 0x7F:
                             if size>4:
                                 res.sys_ex_dev_id = msg[2]
@@ -123,121 +164,136 @@ class MidiMsg:
                                 pos = 4
                                 if msg[1] == 0x7E: # Non real-time message
                                     res.sys_ex_type = 'NRT'
-                                    if (sub_id1) in NRTSysEx:
-                                        res.sys_ex_nrt = NRTSysEx((sub_id1))
-                                        res.sys_ex_type_data = (sub_id1)
-                                    elif (sub_id1, msg[4]) in NRTSysEx:
-                                        res.sys_ex_nrt = NRTSysEx((sub_id1, msg[4]))
-                                        res.sys_ex_type_data = (sub_id1, msg[4])
-                                        pos = 5
-                                    elif (sub_id1, 0xFF) in NRTSysEx:
-                                        res.sys_ex_nrt = NRTSysEx((sub_id1, 0xFF))
-                                        res.sys_ex_type_data = (sub_id1, msg[4])
-                                        pos = 5
-                                    else:
-                                        res.sys_ex_nrt = NRTSysEx.Unknown
-                                        res.sys_ex_type_data = (sub_id1)
-                                if msg[1] == 0x7F: # Real-time message
+                                    names = NRT_SYSEX_NAMES
+                                else: # Real-time message
                                     res.sys_ex_type = 'RT'
-                                    if (sub_id1) in RTSysEx:
-                                        res.sys_ex_nrt = RTSysEx((sub_id1))
-                                        res.sys_ex_type_data = (sub_id1)
-                                    elif (sub_id1, msg[4]) in RTSysEx:
-                                        res.sys_ex_nrt = RTSysEx((sub_id1, msg[4]))
-                                        res.sys_ex_type_data = (sub_id1, msg[4])
-                                        pos = 5
-                                    elif (sub_id1, 0xFF) in RTSysEx:
-                                        res.sys_ex_nrt = RTSysEx((sub_id1, 0xFF))
-                                        res.sys_ex_type_data = (sub_id1, msg[4])
-                                        pos = 5
-                                    else:
-                                        res.sys_ex_nrt = RTSysEx.Unknown
-                                        res.sys_ex_type_data = (sub_id1)
+                                    names = RT_SYSEX_NAMES
+                                sub_id = (2<<24)|(sub_id1<<8)|msg[4]
+                                if sub_id1 in names:
+                                    res.sys_ex_type_data = (sub_id1)
+                                    packed = sub_id1
+                                elif sub_id in names:
+                                    res.sys_ex_type_data = (sub_id1, msg[4])
+                                    packed = sub_id
+                                    pos = 5
+                                elif (sub_id|0xFF) in names:
+                                    res.sys_ex_type_data = (sub_id1, msg[4])
+                                    packed = sub_id|0xFF
+                                    pos = 5
+                                else:
+                                    res.sys_ex_type_data = (sub_id1)
+                                    packed = 0 # Unknown
+                                if msg[1] == 0x7E:
+                                    res.sys_ex_nrt_id = packed
+                                else:
+                                    res.sys_ex_rt_id = packed
+                                invalid_data = False
+                        elif msg[1]==0:
+                            if size>4:
+                                res.sys_ex_manufacturer_id = (3<<24)|(msg[2]<<8)|msg[3]
+                                pos = 4
+                                # Manufacturer specific message
+                                res.sys_ex_type = 'MS'
                                 invalid_data = False
                         else:
+                            res.sys_ex_manufacturer_id = msg[1]
                             # Manufacturer specific message
                             res.sys_ex_type = 'MS'
                             invalid_data = False
-                        res.sys_ex_data = msg[pos:len(msg)-1]
-                        
-                elif size>1 and res.type==SystemCommonMsg.MidiTimeCodeQuarterFrame:
+                        res.sys_ex_data = msg[pos:size-1]
+
+                elif size>1 and msg[0]==SystemCommonMsg_MidiTimeCodeQuarterFrame:
                     # Spec is unclear ... TBD
                     res.value = msg[1]
                     invalid_data = False
-                elif size==3 and res.type==SystemCommonMsg.SongPositionPointer:
+                elif size==3 and msg[0]==SystemCommonMsg_SongPositionPointer:
                     res.value = (msg[2]<<7)+msg[1]
                     invalid_data = False
-                elif size==2 and res.type==SystemCommonMsg.SongSelect:
+                elif size==2 and msg[0]==SystemCommonMsg_SongSelect:
                     res.value = msg[1]
                     invalid_data = False
-                elif size==1 and res.type==SystemCommonMsg.TuneRequest:
+                elif size==1 and msg[0]==SystemCommonMsg_TuneRequest:
                     invalid_data = False
 
-            elif MidiMsg.__has_value(RealTimeMsg, msg[0]):
-                res.category = MsgCategory.RTM
-                res.type = RealTimeMsg(msg[0])
-                if size==1 and (
-                    res.type==RealTimeMsg.TimingClock or
-                    res.type==RealTimeMsg.Start or
-                    res.type==RealTimeMsg.Continue or
-                    res.type==RealTimeMsg.Stop or
-                    res.type==RealTimeMsg.ActiveSensing or
-                    res.type==RealTimeMsg.Reset):
+            elif STATUS_NAMES[msg[0]]:
+                res.category_id = MsgCategory_RTM
+                res.type_id = msg[0]
+                if size==1:
                     invalid_data = False
-            
+
             else:
                 return None
-    
+
         if invalid_data:
             return None
 
         return res
-    
+
+    INVALID_MESSAGE = 'INVALID MESSAGE'
+
+    def describe(msg:list[int], hexa:bool = False)->str:
+        """decode a raw message and return its printable form ('[raw] = [decoded]')
+        returns INVALID_MESSAGE if the message is not valid,
+        or None (after printing an error) if the message can not be decoded
+        """
+        midimsg:MidiMsg
+        try:
+            midimsg = MidiMsg.from_list(msg)
+        except:
+            print('error: exception in MidiMsg.from_list(); data: '+str(msg), file=sys.stderr)
+            return None
+        try:
+            return (midimsg.to_raw_string(hexa) + ' = ' + midimsg.to_string(hexa)) if midimsg else MidiMsg.INVALID_MESSAGE
+        except:
+            print('error: exception in MidiMsg.to_string(); data: '+str(msg), file=sys.stderr)
+            return None
+
     def to_raw_string(self, hexa:bool = False)->str:
         return '[' + ', '.join(Helpers.int_to_str(x,hexa) for x in self.bytes) + ']'
     
     def to_string(self, hexa:bool = False)->str:
         data_str:list = []
-        
-        if isinstance(self.type, ChannelMsg):
-            data_str.append(MidiMsg.__enum2str(ChannelMsg(self.type),hexa))
+
+        if self.category_id==MsgCategory_CVM or self.category_id==MsgCategory_CC or self.category_id==MsgCategory_CM:
+            data_str.append(MidiMsg.__name2str(CHANNEL_MSG_NAMES[self.type_id],self.type_id,hexa))
             data_str.append('channel:' + Helpers.int_to_str(self.channel+1, hexa))
-            if self.type==ChannelMsg.NoteOff or self.type==ChannelMsg.NoteOn or self.type==ChannelMsg.PolyphonicKeyPressure:
+            if self.type_id==ChannelMsg_NoteOff or self.type_id==ChannelMsg_NoteOn or self.type_id==ChannelMsg_PolyphonicKeyPressure:
                 data_str.append('note:'+MidiMsg.note_to_string(self.note)+'('+Helpers.int_to_str(self.note,hexa)+')')
                 data_str.append('velocity:' + Helpers.int_to_str(self.velocity,hexa))
-            elif self.type==ChannelMsg.CtrlChangeOrChannelMode:
-                if self.control_change:
-                    data_str[0] = MidiMsg.__enum2str(ControlChange(self.control_change),hexa)
+            elif self.type_id==ChannelMsg_CtrlChangeOrChannelMode:
+                if self.control_change_id>=0:
+                    data_str[0] = MidiMsg.__name2str(CONTROL_CHANGE_NAMES[self.control_change_id],self.control_change_id,hexa)
                     data_str.append(Helpers.int_to_str(self.value,hexa))
-                elif self.channel_mode:
-                    data_str[0] = MidiMsg.__enum2str(ChannelMode(self.channel_mode),hexa)
+                elif self.channel_mode_id>=0:
+                    data_str[0] = MidiMsg.__name2str(CHANNEL_MODE_NAMES[self.channel_mode_id],self.channel_mode_id,hexa)
                     data_str.append(Helpers.int_to_str(self.value,hexa))
-            elif self.type==ChannelMsg.ProgramChange or self.type==ChannelMsg.ChannelPressure or self.type==ChannelMsg.PitchBendChange:
+            elif self.type_id==ChannelMsg_ProgramChange or self.type_id==ChannelMsg_ChannelPressure or self.type_id==ChannelMsg_PitchBendChange:
                 data_str.append(Helpers.int_to_str(self.value,hexa))
-        
-        elif isinstance(self.type, SystemCommonMsg):
-            data_str.append(MidiMsg.__enum2str(SystemCommonMsg(self.type),hexa))
-            if self.type==SystemCommonMsg.SystemExclusive:
+
+        elif self.category_id==MsgCategory_SCM:
+            data_str.append(MidiMsg.__name2str(STATUS_NAMES[self.type_id],self.type_id,hexa))
+            if self.type_id==SystemCommonMsg_SystemExclusive:
                 if self.sys_ex_type=='MS':
-                    manufacturer = ''.join([Helpers.hex_to_str(i,pref='',suff='') for i in self.sys_ex_manufacturer.value])
-                    data_str.append('manufacturer:'+MidiMsg.__enum2str(self.sys_ex_manufacturer,hexa,False)+'("'+manufacturer+'")')
+                    manufacturer = ''.join([Helpers.hex_to_str(i,pref='',suff='') for i in self.bytes[1:4 if self.bytes[1]==0 else 2]])
+                    data_str.append('manufacturer:'+MANUFACTURER_NAMES.get(self.sys_ex_manufacturer_id, 'Unknown')+'("'+manufacturer+'")')
                 else:
                     data_str.append(self.sys_ex_type)
                     data_str.append('device:'+('ALL' if self.sys_ex_dev_id==0x7F else Helpers.int_to_str(self.sys_ex_dev_id,hexa)))
+                    type_data = self.sys_ex_type_data if isinstance(self.sys_ex_type_data, tuple) else (self.sys_ex_type_data,)
                     if self.sys_ex_type=='NRT':
-                        data_str.append(MidiMsg.__enum2str(self.sys_ex_nrt,hexa,False)+'('+','.join([Helpers.int_to_str(i,hexa) for i in self.sys_ex_type_data])+')')
+                        data_str.append(NRT_SYSEX_NAMES[self.sys_ex_nrt_id]+'('+','.join([Helpers.int_to_str(i,hexa) for i in type_data])+')')
                     elif self.sys_ex_type=='RT':
-                        data_str.append(MidiMsg.__enum2str(self.sys_ex_rt,hexa,False)+'('+','.join([Helpers.int_to_str(i,hexa) for i in self.sys_ex_type_data])+')')
+                        data_str.append(RT_SYSEX_NAMES[self.sys_ex_rt_id]+'('+','.join([Helpers.int_to_str(i,hexa) for i in type_data])+')')
                 data_str.append('data:'+'['+','.join([Helpers.int_to_str(i,hexa) for i in self.sys_ex_data])+']')
             else:
                 data_str.append('value:'+Helpers.int_to_str(self.value,hexa))
-        
-        elif isinstance(self.type, RealTimeMsg):
-             data_str.append(MidiMsg.__enum2str(RealTimeMsg(self.type),hexa))
-        
-        data_str[0] = MidiMsg.__enum2str(MsgCategory(self.category),hexa,False) + '.' + data_str[0]
+
+        elif self.category_id==MsgCategory_RTM:
+             data_str.append(MidiMsg.__name2str(STATUS_NAMES[self.type_id],self.type_id,hexa))
+
+        data_str[0] = CATEGORY_NAMES[self.category_id] + '.' + data_str[0]
         return '['+', '.join(data_str)+']'
-    
+
     __notes_str = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     def note_to_string(value:int, err_str:str = 'invalid note')->str:
             if value>127:
@@ -245,27 +301,141 @@ class MidiMsg:
             note = value%12
             octave = value//12
             return MidiMsg.__notes_str[note]+str(octave+1)
-    
-    def __has_value(enum, value)->bool:
-        return value in enum._value2member_map_     
-    def __enum2str(enumvalue, hexa:bool,add_value:bool=True)->str:
-        if add_value:
-            return str(enumvalue).split('.')[1]+'('+Helpers.int_to_str(enumvalue.value,hexa)+')'
-        else:
-            return str(enumvalue).split('.')[1]
+
+    def string_to_note(value:str)->int:
+        """reverse of note_to_string() (i.e. "C#3"), a number is also accepted, returns None if invalid"""
+        value = value.strip()
+        note = Helpers.str_to_int(value)
+        if note is None:
+            name = value.rstrip('0123456789').upper()
+            octave = Helpers.str_to_int(value[len(name):])
+            if name not in MidiMsg.__notes_str or octave is None:
+                return None
+            note = (octave-1)*12+MidiMsg.__notes_str.index(name)
+        return note if 0<=note<=127 else None
+
+    def __name2str(name:str, value:int, hexa:bool)->str:
+        return name+'('+Helpers.int_to_str(value,hexa)+')'
+
+    def __unpack_id(packed:int):
+        """reverse of midi_tables.pack_id()"""
+        size = packed>>24
+        if size==0:
+            return packed
+        return tuple((packed>>(8*i))&0xFF for i in reversed(range(size)))
 
 
 
 class Filter:
+    """ Select messages by type, channel and velocity
+
+        types : names of categories (CVM, CC, ...) or message types (NoteOn, SystemExclusive, ...)
+                as printed by MidiMsg.to_string(), case is ignored. Empty list means all types
+        channel range applies to channel messages, velocity range to NoteOff/NoteOn/PolyphonicKeyPressure
+        An inclusive filter keeps messages it matches, an exclusive filter removes them
+
+        Matching works on raw bytes with a table built by compile(), which must be called
+        again if attributes are modified after the first call to matches()
+    """
     def __init__(self):
         self.inclusive:bool = True
         self.types:list = []
         self.velocity_min:int = 0
-        self.velocity_max:int = 127		
+        self.velocity_max:int = 127
         self.channel_min:int = 0
         self.channel_max:int = 15
+        self.__status_table:bytearray = None
+
+    # Values of the status table
+    __NO = 0
+    __YES = 1
+    __IF_CC = 2 # depends on data1 : Control Change (data1<120) or Channel Mode
+    __IF_CM = 3
+    __IF_VELOCITY = 4
+
+    def compile(self):
+        """build the status byte -> match table used by matches()"""
+        names = [name.lower() for name in self.types]
+        table = bytearray(256)
+        for status in range(0x80, 0x100):
+            msb = status>>4
+            if msb<0xF:
+                if status&0xF<self.channel_min or status&0xF>self.channel_max:
+                    continue
+                type_names = [CHANNEL_MSG_NAMES[msb], CATEGORY_NAMES[MsgCategory_CVM]]
+            elif STATUS_NAMES[status]:
+                type_names = [STATUS_NAMES[status], CATEGORY_NAMES[MsgCategory_SCM if status<0xF8 else MsgCategory_RTM]]
+            else:
+                continue
+            if msb==ChannelMsg_CtrlChangeOrChannelMode:
+                is_cc = not names or CATEGORY_NAMES[MsgCategory_CC].lower() in names
+                is_cm = not names or CATEGORY_NAMES[MsgCategory_CM].lower() in names
+                if not names or type_names[0].lower() in names or (is_cc and is_cm):
+                    table[status] = Filter.__YES
+                elif is_cc or is_cm:
+                    table[status] = Filter.__IF_CC if is_cc else Filter.__IF_CM
+            elif not names or any(name.lower() in names for name in type_names):
+                table[status] = Filter.__YES
+                if msb==ChannelMsg_NoteOff or msb==ChannelMsg_NoteOn or msb==ChannelMsg_PolyphonicKeyPressure:
+                    if self.velocity_min>0 or self.velocity_max<127:
+                        table[status] = Filter.__IF_VELOCITY
+        for name in names:
+            if name not in Filter.__known_names():
+                raise ValueError('unknown message type: '+name)
+        self.__status_table = table
+
+    def matches(self, msg:list[int])->bool:
+        """return True if the message is selected by this filter (whatever the inclusive flag)"""
+        if self.__status_table is None:
+            self.compile()
+        match = self.__status_table[msg[0]]
+        if match==Filter.__YES:
+            return True
+        if match==Filter.__NO or len(msg)<3:
+            return False
+        if match==Filter.__IF_VELOCITY:
+            return self.velocity_min<=msg[2]<=self.velocity_max
+        return (msg[1]<120) == (match==Filter.__IF_CC)
+
+    def may_match(self, status:int)->bool:
+        """return False if no message with this status byte can match this filter"""
+        if self.__status_table is None:
+            self.compile()
+        return self.__status_table[status]!=Filter.__NO
+
+    def __known_names()->set:
+        names = CHANNEL_MSG_NAMES+STATUS_NAMES+CATEGORY_NAMES
+        return set(name.lower() for name in names if name)
 
 class Rule:
+    """ Messages from inports pass through a rule if they pass every group of filters
+        A message passes a group if it matches at least one of its inclusive filters
+        (or if the group has none), and none of its exclusive filters
+    """
     def __init__(self):
         self.inports = []
-        self.filters:list[list[Filter]] = []
\ No newline at end of file
+        self.filters:list[list[Filter]] = []
+
+    def accept(self, msg:list[int])->bool:
+        for group in self.filters:
+            included = None
+            for flt in group:
+                if flt.matches(msg):
+                    if not flt.inclusive:
+                        return False
+                    included = True
+                elif flt.inclusive and included is None:
+                    included = False
+            if included==False:
+                return False
+        return True
+
+    def may_accept(self, status:int)->bool:
+        """return False if no message with this status byte can pass through this rule
+        (used to skip data without reading messages)
+        """
+        for group in self.filters:
+            inclusive = [flt for flt in group if flt.inclusive]
+            if inclusive and not any(flt.may_match(status) for flt in inclusive):
+                return False
+        return True
@@ -0,0 +1,118 @@
+import os, struct, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from midimsg import Rule
+from smf import DATA_LEN, read_var_len, var_len
+
+# Apply the rules used by live commands to Standard MIDI Files
+# Events are filtered on their raw bytes (see Filter.matches()), no MidiMsg is built
+
+def filter_track(track:bytes, rule:Rule)->tuple[bytearray, int, int]:
+    """return (filtered track data, number of events, number of kept events)
+    Meta events and escaped (F7) events are always kept
+    """
+    result = bytearray()
+    data_len = DATA_LEN
+    nb_events = 0
+    nb_kept = 0
+    pos = 0
+    size = len(track)
+    status = 0
+    delta_sum = 0 # time of removed events, added to the next kept event
+    while pos<size:
+        delta, pos = read_var_len(track, pos)
+        delta_sum += delta
+        start = pos
+        byte = track[pos]
+        if byte==0xFF:
+            length, pos = read_var_len(track, pos+2)
+            pos += length
+            keep = True
+        elif byte==0xF0 or byte==0xF7:
+            length, pos = read_var_len(track, pos+1)
+            pos += length
+            nb_events += 1
+            keep = byte==0xF7 or rule.accept(b'\xF0'+track[pos-length:pos])
+        else:
+            if byte>=0x80:
+                status = byte
+                pos += 1
+            elif status==0:
+                raise ValueError('running status without previous status')
+            msg = bytes((status,))+track[pos:pos+data_len[status]]
+            pos += data_len[status]
+            nb_events += 1
+            keep = rule.accept(msg)
+            if keep:
+                # Running status is not kept, as the previous message may have been removed
+                result += var_len(delta_sum)+msg
+                delta_sum = 0
+                nb_kept += 1
+            continue
+        if keep:
+            result += var_len(delta_sum)+track[start:pos]
+            delta_sum = 0
+            nb_kept += byte!=0xFF
+    return result, nb_events, nb_kept
+
+def process_file(src:str, dst:str, rule:Rule)->tuple[int, int]:
+    """filter src Standard MIDI File into dst, return (number of events, number of kept events)"""
+    with open(src, 'rb') as file:
+        data = file.read()
+    if data[:4]!=b'MThd':
+        raise ValueError('"'+src+'" is not a Standard MIDI File')
+    header_len = struct.unpack('>I', data[4:8])[0]
+    pos = 8+header_len
+    nb_events = 0
+    nb_kept = 0
+    with open(dst, 'wb') as out:
+        out.write(data[:pos])
+        while pos+8<=len(data):
+            chunk_type = data[pos:pos+4]
+            chunk_len = struct.unpack('>I', data[pos+4:pos+8])[0]
+            chunk = data[pos+8:pos+8+chunk_len]
+            pos += 8+chunk_len
+            if chunk_type==b'MTrk':
+                chunk, events, kept = filter_track(chunk, rule)
+                nb_events += events
+                nb_kept += kept
+            out.write(chunk_type+struct.pack('>I', len(chunk))+chunk)
+    return nb_events, nb_kept
+
+def process_files(files:list[str], output_dir:str, rule:Rule, workers:int = None)->bool:
+    """filter files into output_dir (one file per task in a pool of worker processes)
+    print a line per file and the global throughput
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    destinations = [os.path.join(output_dir, os.path.basename(src)) for src in files]
+    sources:dict = {}
+    for src, dst in zip(files, destinations):
+        if os.path.abspath(src)==os.path.abspath(dst):
+            print('error: output file would overwrite input file "'+src+'"', file=sys.stderr)
+            return False
+        # Files of different directories with the same name would be written to the same output file
+        other = sources.setdefault(os.path.normcase(os.path.abspath(dst)), src)
+        if other is not src:
+            print('error: "'+other+'" and "'+src+'" would both be written to "'+dst+'"', file=sys.stderr)
+            return False
+
+    start = time.perf_counter()
+    total_events = 0
+    total_kept = 0
+    success = True
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_file, src, dst, rule) for src, dst in zip(files, destinations)]
+        for src, future in zip(files, futures):
+            try:
+                nb_events, nb_kept = future.result()
+            except Exception as e:
+                print('error: can not process "'+src+'": '+str(e), file=sys.stderr)
+                success = False
+                continue
+            total_events += nb_events
+            total_kept += nb_kept
+            print(src+' : '+str(nb_kept)+'/'+str(nb_events)+' events kept')
+    duration = time.perf_counter()-start
+    rate = total_events/duration if duration>0 else 0
+    print(str(len(files))+' file(s), '+str(total_kept)+'/'+str(total_events)+' events kept in '+
+          ('%.3f' % duration)+' s ('+str(int(rate))+' events/s)')
+    return success
@@ -0,0 +1,92 @@
+import sys, threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from functools import partial
+from midi_tables import *
+
+
+class OffloadPool:
+    """ Run heavy per-message work (SysEx decoding, scripted transforms) in a pool of
+        worker processes, while light messages (NoteOn, CC, ...) stay on the calling thread.
+
+        Each message submitted for a given port gets a sequence number, and results are
+        given to the sender in that order (a reorder buffer holds results that complete
+        too early), so the output of a port is never reordered.
+    """
+    def __init__(self, work, sender, workers:int, heavy_types:list = None):
+        """
+        Args:
+            work: function(msg:list[int]) -> result, must be picklable (module or class level function)
+            sender: function(msg:list[int], result, context), called in submission order for each port
+            workers (int): number of worker processes
+            heavy_types (list): ChannelMsg, SystemCommonMsg or RealTimeMsg values (members or midi_tables
+                                constants) to run in the pool (default: SystemExclusive)
+        """
+        self.__work = work
+        self.__sender = sender
+        self.__executor = ProcessPoolExecutor(max_workers=workers)
+        self.__heavy = bytearray(256)
+        for msg_type in heavy_types if heavy_types is not None else [SystemCommonMsg_SystemExclusive]:
+            value = getattr(msg_type, 'value', msg_type)
+            if value<0x10:
+                for channel in range(16):
+                    self.__heavy[(value<<4)+channel] = 1
+            else:
+                self.__heavy[value] = 1
+        self.__ports:dict = {}
+        self.__lock = threading.Lock()
+
+    def submit(self, port:str, msg:list[int], context = None):
+        """Process a message received from port, then give the result to the sender
+
+        Args:
+            port (str): name of the port the message comes from (ordering is kept per port)
+            msg (list[int]): raw midi message
+            context: any value, given as is to the sender
+        """
+        state = self.__ports.get(port)
+        if not state:
+            with self.__lock:
+                state = self.__ports.setdefault(port, _PortState())
+        with state.lock:
+            seq = state.next_seq
+            state.next_seq += 1
+
+        if msg and self.__heavy[msg[0]]:
+            future = self.__executor.submit(self.__work, msg)
+            future.add_done_callback(partial(self.__on_done, port, state, seq, msg, context))
+        else:
+            self.__complete(state, seq, msg, self.__work(msg), context)
+
+    def pending(self)->int:
+        """return the number of messages waiting for their result or for a previous one"""
+        return sum(state.next_seq-state.next_emit for state in list(self.__ports.values()))
+
+    def shutdown(self, wait:bool = True):
+        self.__executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __on_done(self, port:str, state, seq:int, msg:list[int], context, future:Future):
+        try:
+            result = future.result()
+        except Exception as e:
+            # Worker crashed or pool was shut down: the sender still gets the message
+            print('error: can not process message '+bytes(msg).hex(' ')+' from "'+port+'": '+(str(e) or e.__class__.__name__), file=sys.stderr)
+            result = None
+        self.__complete(state, seq, msg, result, context)
+
+    def __complete(self, state, seq:int, msg:list[int], result, context):
+        with state.lock:
+            state.done[seq] = (msg, result, context)
+            # Send every result that is now in order (sender is called under the port lock,
+            # so two threads cannot interleave the output of a port)
+            while state.next_emit in state.done:
+                msg, result, context = state.done.pop(state.next_emit)
+                state.next_emit += 1
+                self.__sender(msg, result, context)
+
+
+class _PortState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_seq:int = 0
+        self.next_emit:int = 0
+        self.done:dict = {}
@@ -0,0 +1,264 @@
+from midi_tables import *
+from helpers import Helpers
+
+# High resolution parameters sent as several control changes :
+#   - 14 bits controllers : MSB (CC 0-31) then LSB (CC 32-63, optional)
+#   - RPN : parameter number (CC 101 MSB, CC 100 LSB) then data entry (CC 6 MSB, CC 38 LSB optional)
+#           or data increment/decrement (CC 96/97). RPN 0x3FFF ("null") deselects the parameter
+#   - NRPN : same as RPN, with the parameter number in CC 99 (MSB) and CC 98 (LSB)
+# The parameter number stays selected on its channel : a receiver may only get new data entries
+_DATA_ENTRY_MSB = 0x06
+_DATA_ENTRY_LSB = 0x26
+_DATA_INCREMENT = 0x60
+_DATA_DECREMENT = 0x61
+_NRPN_LSB = 0x62
+_NRPN_MSB = 0x63
+_RPN_LSB = 0x64
+_RPN_MSB = 0x65
+_RPN_NULL = 0x3FFF
+_UNKNOWN = 0xFF
+
+RPN_NAMES = {0x0000: 'PitchBendSensitivity', 0x0001: 'ChannelFineTuning', 0x0002: 'ChannelCoarseTuning',
+             0x0003: 'TuningProgramChange', 0x0004: 'TuningBankSelect', 0x0005: 'ModulationDepthRange'}
+
+
+class ParamEvent:
+    """ A parameter change assembled from several control changes """
+    CONTROLLER = 0  # 14 bits controller, number is the MSB controller (0-31)
+    RPN = 1
+    NRPN = 2
+    __slots__ = ('kind', 'channel', 'number', 'value', 'fine', 'delta', 'msgs')
+
+    def __init__(self, kind:int, channel:int, number:int, value:int, fine:bool = False, delta:int = 0, msgs:list = None):
+        self.kind = kind
+        self.channel = channel
+        self.number = number    # controller, or 14 bits parameter number
+        self.value = value      # 14 bits value (MSB<<7 | LSB), or data byte of an increment/decrement
+        self.fine = fine        # LSB received (else the LSB of value is 0)
+        self.delta = delta      # +1 : data increment, -1 : data decrement, 0 : value set
+        self.msgs:list[list[int]] = msgs if msgs is not None else [] # raw messages of the event
+
+    def to_string(self, hexa:bool = False)->str:
+        """printable form, like MidiMsg.describe() ('[raw messages] = [decoded]')"""
+        if self.kind==ParamEvent.CONTROLLER:
+            name = 'CC14.'+CONTROL_CHANGE_NAMES[self.number]+'('+Helpers.int_to_str(self.number, hexa)+')'
+        else:
+            name = ('RPN' if self.kind==ParamEvent.RPN else 'NRPN')+'.'
+            name += (RPN_NAMES.get(self.number, 'Parameter') if self.kind==ParamEvent.RPN else 'Parameter')
+            name += '('+Helpers.int_to_str(self.number, hexa)+')'
+        data = [name, 'channel:'+Helpers.int_to_str(self.channel+1, hexa)]
+        if self.delta:
+            data.append(('increment:' if self.delta>0 else 'decrement:')+Helpers.int_to_str(self.value, hexa))
+        else:
+            data.append(Helpers.int_to_str(self.value, hexa)+('' if self.fine else ' (MSB)'))
+        raw = ', '.join('['+', '.join(Helpers.int_to_str(x, hexa) for x in msg)+']' for msg in self.msgs)
+        return '['+raw+'] = ['+', '.join(data)+']'
+
+
+class ParamAssembler:
+    """ Assemble control changes of a midi stream into ParamEvent (one per parameter change)
+
+        feed() returns the messages to give downstream instead of the received one : raw messages
+        (lists, given back as is) and ParamEvent. Parameter number selections are kept until the
+        next data entry. An MSB is given at once, unless an LSB has already been received for this
+        controller : it is then held until the next message, which is either its LSB (both make
+        one event) or any other message (the MSB alone is given first). flush() gives a held MSB
+        when no message follows (i.e. on a timer).
+
+        Note : there is no lock, feed() and flush() must not be called by several threads at once
+    """
+    def __init__(self):
+        self.__msb = bytearray([_UNKNOWN])*(16*32)  # [channel*32 + controller] -> last MSB
+        self.__data_msb = bytearray([_UNKNOWN])*16  # [channel] -> last data entry MSB
+        self.__fine = [0]*16                        # [channel] -> bit n set if CC 32+n has been received
+        self.__param = [-1]*16                      # [channel] -> (kind<<14)|number selected, -1 if none
+        self.__param_msb = bytearray([_UNKNOWN])*16
+        self.__param_lsb = bytearray([_UNKNOWN])*16
+        self.__selection:list = [None]*16           # [channel] -> raw messages of the parameter selection
+        self.__pending:ParamEvent = None            # MSB waiting for its LSB
+        self.__pending_ns:int = 0                   # time the pending MSB was received
+
+    def feed(self, msg:list[int], timestamp_ns:int = 0)->list:
+        status = msg[0]
+        if status>=0xF8:
+            # Real time messages do not release a pending MSB
+            return [msg]
+        result = []
+        pending = self.__pending
+        if pending:
+            if status>>4==ChannelMsg_CtrlChangeOrChannelMode and len(msg)>2 and status&0xF==pending.channel \
+                    and msg[1]==ParamAssembler.__lsb_controller(pending):
+                self.__pending = None
+                pending.value |= msg[2]
+                pending.fine = True
+                pending.msgs.append(msg)
+                return [pending]
+            self.__pending = None
+            result.append(pending)
+        if status>>4!=ChannelMsg_CtrlChangeOrChannelMode or len(msg)<3:
+            result.append(msg)
+            return result
+        channel = status&0xF
+        controller = msg[1]
+        value = msg[2]
+        if controller<0x20 and controller!=_DATA_ENTRY_MSB:
+            self.__msb[(channel<<5)+controller] = value
+            self.__coarse(result, ParamEvent(ParamEvent.CONTROLLER, channel, controller, value<<7, msgs=[msg]), timestamp_ns)
+        elif 0x20<=controller<0x40 and controller!=_DATA_ENTRY_LSB:
+            self.__fine[channel] |= 1<<(controller-0x20)
+            msb = self.__msb[(channel<<5)+controller-0x20]
+            if msb==_UNKNOWN:
+                result.append(msg)
+            else:
+                result.append(ParamEvent(ParamEvent.CONTROLLER, channel, controller-0x20, (msb<<7)|value, True, msgs=[msg]))
+        elif controller>=_NRPN_LSB and controller<=_RPN_MSB:
+            self.__select(result, channel, msg)
+        elif self.__param[channel]<0 or (controller!=_DATA_ENTRY_MSB and controller!=_DATA_ENTRY_LSB
+                                         and controller!=_DATA_INCREMENT and controller!=_DATA_DECREMENT):
+            result.append(msg)
+        else:
+            kind = self.__param[channel]>>14
+            number = self.__param[channel]&0x3FFF
+            msgs = self.__selection[channel]+[msg]
+            self.__selection[channel] = []
+            if controller==_DATA_ENTRY_MSB:
+                self.__data_msb[channel] = value
+                self.__coarse(result, ParamEvent(kind, channel, number, value<<7, msgs=msgs), timestamp_ns)
+            elif controller==_DATA_ENTRY_LSB:
+                self.__fine[channel] |= 1<<(_DATA_ENTRY_LSB-0x20)
+                msb = self.__data_msb[channel]
+                if msb==_UNKNOWN:
+                    result.append(msg)
+                else:
+                    result.append(ParamEvent(kind, channel, number, (msb<<7)|value, True, msgs=msgs))
+            else:
+                result.append(ParamEvent(kind, channel, number, value, delta=1 if controller==_DATA_INCREMENT else -1, msgs=msgs))
+        return result
+
+    def flush(self, before_ns:int = None)->list:
+        """return the held MSB, if any (if before_ns is given : only if it was fed before this time)"""
+        pending = self.__pending
+        if pending is None or (before_ns is not None and self.__pending_ns>=before_ns):
+            return []
+        self.__pending = None
+        return [pending]
+
+    def __coarse(self, result:list, event:ParamEvent, timestamp_ns:int):
+        lsb = event.number if event.kind==ParamEvent.CONTROLLER else _DATA_ENTRY_MSB
+        if (self.__fine[event.channel]>>lsb)&1:
+            self.__pending = event
+            self.__pending_ns = timestamp_ns
+        else:
+            result.append(event)
+
+    def __select(self, result:list, channel:int, msg:list[int]):
+        controller = msg[1]
+        if controller==_RPN_MSB or controller==_NRPN_MSB:
+            self.__param_msb[channel] = msg[2]
+        else:
+            self.__param_lsb[channel] = msg[2]
+        kind = ParamEvent.RPN if controller>=_RPN_LSB else ParamEvent.NRPN
+        msb = self.__param_msb[channel]
+        lsb = self.__param_lsb[channel]
+        if not self.__selection[channel]:
+            self.__selection[channel] = []
+        self.__selection[channel].append(msg)
+        if msb==_UNKNOWN or lsb==_UNKNOWN:
+            # Other half of the parameter number still to come
+            self.__param[channel] = -1
+        elif kind==ParamEvent.RPN and (msb<<7)|lsb==_RPN_NULL:
+            # Null RPN (protects the last parameter from data entries) : the receiver must get
+            # the selection, which is not part of any event
+            self.__param[channel] = -1
+            result.extend(self.__selection[channel])
+            self.__selection[channel] = []
+        else:
+            self.__param[channel] = (kind<<14)|(msb<<7)|lsb
+        self.__data_msb[channel] = _UNKNOWN
+
+    def __lsb_controller(event:ParamEvent)->int:
+        """return the controller number of the LSB completing an event"""
+        return event.number+0x20 if event.kind==ParamEvent.CONTROLLER else _DATA_ENTRY_LSB
+
+
+class ParamEncoder:
+    """ Encode ParamEvent as control changes, without sending again what the receiver already has :
+        the parameter number if it is still selected on the channel, and the MSB if it has not
+        changed and the LSB is sent (the LSB alone only changes the fine part of the value)
+
+        Raw messages sent to the same output must be given to encode() too, so that the state of the
+        receiver is known. Note : there is no lock, messages must be encoded by a single thread
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """forget the state of the receiver (i.e. after a reconnection)"""
+        self.__msb = bytearray([_UNKNOWN])*(16*32)
+        self.__lsb = bytearray([_UNKNOWN])*(16*32)
+        self.__data_msb = bytearray([_UNKNOWN])*16
+        self.__data_lsb = bytearray([_UNKNOWN])*16
+        self.__param = [-1]*16
+
+    def encode(self, item)->list[list[int]]:
+        """return the raw messages of a ParamEvent, or [item] for a raw message"""
+        if not isinstance(item, ParamEvent):
+            self.__track(item)
+            return [item]
+        channel = item.channel
+        control = (ChannelMsg_CtrlChangeOrChannelMode<<4)|channel
+        result = []
+        if item.kind==ParamEvent.CONTROLLER:
+            self.__encode_value(result, control, item, self.__msb, self.__lsb, (channel<<5)+item.number, item.number, item.number+0x20)
+            return result
+        param = (item.kind<<14)|item.number
+        if self.__param[channel]!=param:
+            msb, lsb = (_RPN_MSB, _RPN_LSB) if item.kind==ParamEvent.RPN else (_NRPN_MSB, _NRPN_LSB)
+            result.append([control, msb, item.number>>7])
+            result.append([control, lsb, item.number&0x7F])
+            self.__param[channel] = param
+            self.__data_msb[channel] = _UNKNOWN
+            self.__data_lsb[channel] = _UNKNOWN
+        if item.delta:
+            result.append([control, _DATA_INCREMENT if item.delta>0 else _DATA_DECREMENT, item.value])
+            # The receiver computes the new value
+            self.__data_msb[channel] = _UNKNOWN
+            self.__data_lsb[channel] = _UNKNOWN
+        else:
+            self.__encode_value(result, control, item, self.__data_msb, self.__data_lsb, channel, _DATA_ENTRY_MSB, _DATA_ENTRY_LSB)
+        return result
+
+    def __encode_value(self, result:list, control:int, item:ParamEvent, msbs:bytearray, lsbs:bytearray, idx:int, msb_controller:int, lsb_controller:int):
+        msb = item.value>>7
+        lsb = item.value&0x7F
+        if item.fine:
+            if msbs[idx]!=msb:
+                result.append([control, msb_controller, msb])
+            if msbs[idx]!=msb or lsbs[idx]!=lsb:
+                result.append([control, lsb_controller, lsb])
+        elif msbs[idx]!=msb or lsbs[idx]!=0:
+            # An MSB resets the LSB of the receiver
+            result.append([control, msb_controller, msb])
+        msbs[idx] = msb
+        lsbs[idx] = lsb
+
+    def __track(self, msg:list[int]):
+        if msg[0]>>4!=ChannelMsg_CtrlChangeOrChannelMode or len(msg)<3:
+            return
+        channel = msg[0]&0xF
+        controller = msg[1]
+        if controller==_DATA_ENTRY_MSB:
+            self.__data_msb[channel] = msg[2]
+            self.__data_lsb[channel] = 0
+        elif controller==_DATA_ENTRY_LSB:
+            self.__data_lsb[channel] = msg[2]
+        elif controller<0x20:
+            self.__msb[(channel<<5)+controller] = msg[2]
+            self.__lsb[(channel<<5)+controller] = 0
+        elif controller<0x40:
+            self.__lsb[(channel<<5)+controller-0x20] = msg[2]
+        elif controller>=_DATA_INCREMENT and controller<=_RPN_MSB:
+            # Parameter number or value changed without the encoder
+            self.__param[channel] = -1
+            self.__data_msb[channel] = _UNKNOWN
+            self.__data_lsb[channel] = _UNKNOWN
@@ -0,0 +1,72 @@
+import os, sys, threading, time
+
+
+class SamplingProfiler:
+    """ Statistical profiler of every Python thread of the process, including threads created by
+        the midi backend to run input callbacks (which cProfile, enabled per thread, does not see)
+
+        A background thread reads the current stack of every thread every `interval` seconds,
+        the profiled code is never instrumented, so it can be started on a running process.
+        Stacks are saved in "folded" format (one line per stack : "thread;func;func count"),
+        which flame graph tools (flamegraph.pl, speedscope, ...) read.
+    """
+    def __init__(self, interval:float = 0.002):
+        self.interval = interval
+        self.samples:int = 0
+        self.__stacks:dict = {}  # (thread name, stack) -> count
+        self.__running = False
+        self.__thread:threading.Thread = None
+        self.__started:float = 0.0
+
+    def running(self)->bool:
+        return self.__running
+
+    def start(self):
+        self.samples = 0
+        self.__stacks = {}
+        self.__running = True
+        self.__started = time.monotonic()
+        self.__thread = threading.Thread(target=self.__run, name='profiler', daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        self.__thread.join()
+
+    def write(self, path:str):
+        """write the stacks in folded format"""
+        with open(path, 'w') as file:
+            for (thread, stack), count in sorted(self.__stacks.items(), key=lambda item: -item[1]):
+                file.write(';'.join((thread,)+stack)+' '+str(count)+'\n')
+
+    def summary(self, count:int = 10)->str:
+        """return the functions that were the most often on top of the stacks"""
+        duration = time.monotonic()-self.__started
+        own:dict = {}
+        for (thread, stack), value in self.__stacks.items():
+            if stack:
+                own[stack[-1]] = own.get(stack[-1], 0)+value
+        lines = [str(self.samples)+' samples in '+('%.1f' % duration)+' s, most frequent functions :']
+        for func, value in sorted(own.items(), key=lambda item: -item[1])[:count]:
+            lines.append(('%5.1f' % (100*value/max(1, self.samples)))+'% '+func)
+        return '\n'.join(lines)
+
+    def __run(self):
+        own_id = threading.get_ident()
+        stacks = self.__stacks
+        while self.__running:
+            names = {thread.ident:thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident==own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(code.co_name+' ('+os.path.basename(code.co_filename)+':'+str(frame.f_lineno)+')')
+                    frame = frame.f_back
+                stack.reverse()
+                # Threads not created by threading module (midi callbacks) have no name
+                key = (names.get(ident, 'thread-'+str(ident)), tuple(stack))
+                stacks[key] = stacks.get(key, 0)+1
+                self.samples += 1
+            time.sleep(self.interval)
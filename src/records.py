@@ -0,0 +1,144 @@
+import sys, threading
+from midi_tables import *
+from index import sysex_manufacturer
+from params import ParamEvent
+
+# Structured output of the capture command : one record per message, made from the raw bytes
+# (no MidiMsg is built), with integer timestamps (ns since epoch) and numeric fields
+#   ndjson  : {"t":1700000000000000000,"port":"name","type":"NoteOn","ch":1,"d1":60,"d2":100}
+#   csv     : time_ns,port,type,channel,data1,data2,value,name,data (with a header line)
+#   compact : <time_ns> <port index> <type> <channel> <data1> <data2> <value> <name> <data>
+#             (- if missing), after a header line "# ports: 0=name, ..."
+# Fields : channel from 1, data1/data2 data bytes, value 14 bits value of PitchBendChange and
+# SongPositionPointer (else the meaningful data byte), name of the controller, channel mode or
+# SysEx manufacturer, data of SysEx (hexadecimal, without F0/F7)
+FORMATS = ('ndjson', 'csv', 'compact')
+CSV_HEADER = 'time_ns,port,type,channel,data1,data2,value,name,data\n'
+
+def _type_name(status:int)->str:
+    if status<0x80:
+        return 'Invalid'
+    if status<0xF0:
+        return CHANNEL_MSG_NAMES[status>>4]
+    return STATUS_NAMES[status] or 'Undefined'
+
+# Precomputed parts of the records : [status] -> type and channel, [controller] -> name
+_JSON_TYPES = [',"type":"'+_type_name(status)+'"'+(',"ch":'+str((status&0xF)+1) if 0x80<=status<0xF0 else '') for status in range(256)]
+_CSV_TYPES = [','+_type_name(status)+','+(str((status&0xF)+1) if 0x80<=status<0xF0 else '') for status in range(256)]
+_COMPACT_TYPES = [' '+_type_name(status)+' '+(str((status&0xF)+1) if 0x80<=status<0xF0 else '-') for status in range(256)]
+_EVENT_NAMES = ('CC14', 'RPN', 'NRPN') # by ParamEvent kind
+_CONTROLLER_NAMES = [CHANNEL_MODE_NAMES[controller] or CONTROL_CHANGE_NAMES[controller] for controller in range(128)]
+
+
+def _decode(msg:list[int])->tuple:
+    """return data1, data2, value, name, data of a message (None if not relevant)"""
+    status = msg[0]
+    size = len(msg)
+    d1 = msg[1] if size>1 else None
+    d2 = msg[2] if size>2 else None
+    msb = status>>4
+    if msb==ChannelMsg_CtrlChangeOrChannelMode and size>2:
+        return d1, d2, d2, _CONTROLLER_NAMES[d1&0x7F], None
+    if msb==ChannelMsg_PitchBendChange or status==SystemCommonMsg_SongPositionPointer:
+        return d1, d2, (d2<<7)|d1 if size>2 else None, None, None
+    if msb==ChannelMsg_ProgramChange or msb==ChannelMsg_ChannelPressure or status==SystemCommonMsg_SongSelect \
+            or status==SystemCommonMsg_MidiTimeCodeQuarterFrame:
+        return d1, None, d1, None, None
+    if status==SystemCommonMsg_SystemExclusive:
+        end = size-1 if msg[-1]==SystemCommonMsg_EndOfExclusive else size
+        manufacturer = sysex_manufacturer(msg)
+        return None, None, None, MANUFACTURER_NAMES.get(manufacturer, 'Unknown') if manufacturer>=0 else None, bytes(msg[1:end]).hex()
+    return d1, d2, None, None, None
+
+
+class RecordWriter:
+    """ Write messages as records (see FORMATS) to a binary stream, through a buffer written by
+        blocks of block_size bytes. flush() must be called periodically (i.e. every second), so that
+        records of a slow stream do not stay in the buffer, and close() at the end
+        Messages may be written by several threads (input callbacks)
+    """
+    def __init__(self, format:str, ports:list[str], stream = None, block_size:int = 1<<16):
+        """raises ValueError if format is unknown"""
+        if format not in FORMATS:
+            raise ValueError('unknown format "'+format+'", expected one of: '+', '.join(FORMATS))
+        self.__stream = stream if stream is not None else sys.stdout.buffer
+        self.__block_size = block_size
+        self.__lines:list[str] = []
+        self.__size:int = 0
+        self.__lock = threading.Lock()
+        if format=='ndjson':
+            self.__ports = [',"port":'+RecordWriter.__json_string(name) for name in ports]
+            self.__format = self.__ndjson
+        elif format=='csv':
+            self.__ports = [','+RecordWriter.__csv_string(name) for name in ports]
+            self.__format = self.__csv
+            self.__append(CSV_HEADER)
+        else:
+            self.__ports = [' '+str(idx) for idx in range(len(ports))]
+            self.__format = self.__compact
+            self.__append('# ports: '+', '.join(str(idx)+'='+name for idx, name in enumerate(ports))+'\n')
+
+    def write(self, timestamp_ns:int, port_idx:int, msg):
+        """write a raw message (list[int]), or a parameter change (ParamEvent)"""
+        if msg.__class__ is ParamEvent:
+            # Parameter number in data1, value in value
+            name = CONTROL_CHANGE_NAMES[msg.number] if msg.kind==ParamEvent.CONTROLLER else None
+            line = self.__format(timestamp_ns, port_idx, (_EVENT_NAMES[msg.kind], str(msg.channel+1)), (msg.number, None, msg.value, name, None))
+        else:
+            line = self.__format(timestamp_ns, port_idx, msg[0], _decode(msg))
+        self.__append(line)
+
+    def flush(self):
+        with self.__lock:
+            self.__write_lines()
+        self.__stream.flush()
+
+    def close(self):
+        self.flush()
+
+    def __append(self, line:str):
+        with self.__lock:
+            self.__lines.append(line)
+            self.__size += len(line)
+            if self.__size>=self.__block_size:
+                self.__write_lines()
+
+    def __write_lines(self):
+        if self.__lines:
+            self.__stream.write(''.join(self.__lines).encode('utf-8'))
+            self.__lines = []
+            self.__size = 0
+
+    def __ndjson(self, timestamp_ns:int, port_idx:int, head, fields:tuple)->str:
+        d1, d2, value, name, data = fields
+        line = '{"t":'+str(timestamp_ns)+self.__ports[port_idx]
+        line += _JSON_TYPES[head] if head.__class__ is int else ',"type":"'+head[0]+'","ch":'+head[1]
+        if d1 is not None:
+            line += ',"d1":'+str(d1)
+        if d2 is not None:
+            line += ',"d2":'+str(d2)
+        if value is not None:
+            line += ',"value":'+str(value)
+        if name is not None:
+            line += ',"name":"'+name+'"'
+        if data is not None:
+            line += ',"data":"'+data+'"'
+        return line+'}\n'
+
+    def __csv(self, timestamp_ns:int, port_idx:int, head, fields:tuple)->str:
+        head = _CSV_TYPES[head] if head.__class__ is int else ','+head[0]+','+head[1]
+        return str(timestamp_ns)+self.__ports[port_idx]+head+','+','.join('' if field is None else str(field) for field in fields)+'\n'
+
+    def __compact(self, timestamp_ns:int, port_idx:int, head, fields:tuple)->str:
+        line = str(timestamp_ns)+self.__ports[port_idx]
+        line += _COMPACT_TYPES[head] if head.__class__ is int else ' '+head[0]+' '+head[1]
+        for field in fields:
+            line += ' -' if field is None else ' '+str(field)
+        return line+'\n'
+
+    def __json_string(value:str)->str:
+        import json
+        return json.dumps(value)
+
+    def __csv_string(value:str)->str:
+        return '"'+value.replace('"', '""')+'"' if any(char in value for char in ',"\n') else value
@@ -0,0 +1,115 @@
+from array import array
+from helpers import Helpers
+from midi_tables import *
+from midimsg import MidiMsg
+
+
+class Zone:
+    """ Part of the keyboard (range of channels and notes) sent to some outputs """
+    def __init__(self, outputs:int, channel_min:int = 0, channel_max:int = 15, note_min:int = 0, note_max:int = 127):
+        """outputs is a bitmask of output indexes (bit n set : sent to output n)"""
+        self.outputs = outputs
+        self.channel_min = channel_min
+        self.channel_max = channel_max
+        self.note_min = note_min
+        self.note_max = note_max
+
+
+def zone_from_string(value:str, outputs:list[str])->Zone:
+    """parse a zone like "[channels/]notes=outputs", i.e. "C1-B3=1" or "10/C4-=2,Synth"
+    notes are numbers or names (as printed by MidiMsg.note_to_string()), outputs are indexes
+    (from 1) or names of the output ports
+    raises ValueError if the zone is not valid
+    """
+    keys, sep, destinations = value.partition('=')
+    if not sep:
+        raise ValueError('invalid split "'+value+'", format is [channels/]notes=outputs')
+    channels, sep, notes = keys.rpartition('/')
+    return zone_from_values(channels if sep else None, notes, destinations.split(','), outputs)
+
+def zone_from_values(channels:str, notes:str, destinations:list, outputs:list[str])->Zone:
+    """build a zone from a channel range ("1-16", None for all), a note range ("C1-B3", "60-") and
+    a list of output indexes (from 1) or names, raises ValueError if a value is not valid
+    """
+    channel_range = Helpers.str_to_range(channels, 1, 16) if channels else (1, 16)
+    if not channel_range:
+        raise ValueError('invalid channel range "'+str(channels)+'"')
+    low, sep, high = notes.partition('-')
+    note_min = MidiMsg.string_to_note(low) if low.strip() else 0
+    note_max = (MidiMsg.string_to_note(high) if high.strip() else 127) if sep else note_min
+    if note_min is None or note_max is None or note_min>note_max:
+        raise ValueError('invalid note range "'+notes+'"')
+    mask = 0
+    for destination in destinations:
+        destination = str(destination).strip()
+        idx = Helpers.str_to_int(destination)
+        if idx is None and destination in outputs:
+            idx = outputs.index(destination)+1
+        if idx is None or idx<1 or idx>len(outputs):
+            raise ValueError('unknown output "'+destination+'"')
+        mask |= 1<<(idx-1)
+    return Zone(mask, channel_range[0]-1, channel_range[1]-1, note_min, note_max)
+
+
+class SplitRouter:
+    """ Route messages of one input to several outputs, by channel and note (keyboard split)
+
+        Zones are compiled into a flat table : [channel*128 + note] -> bitmask of outputs, so that
+        routing a note message costs one lookup. The outputs a NoteOn has been sent to are kept
+        until its NoteOff, which goes to the same outputs even if zones have changed in between.
+        - NoteOn, NoteOff, PolyphonicKeyPressure : outputs of the note
+        - other channel messages (CC, ProgramChange, PitchBend, ...) : outputs of any note of the channel
+        - system messages : all outputs
+
+        Note : the table of held notes is updated without lock, messages must be routed by a single thread
+    """
+    def __init__(self, nb_outputs:int, zones:list[Zone] = None):
+        self.__all = (1<<nb_outputs)-1
+        self.__held = array('I', bytes(4*16*128)) # [channel*128 + note] -> outputs of the held note
+        self.set_zones(zones if zones is not None else [])
+
+    def set_zones(self, zones:list[Zone]):
+        """compile zones, then install them with a single assignment (can be called from any thread)"""
+        table = array('I', bytes(4*16*128))
+        channels = array('I', bytes(4*16))
+        for zone in zones:
+            outputs = zone.outputs & self.__all
+            for channel in range(zone.channel_min, zone.channel_max+1):
+                channels[channel] |= outputs
+                base = channel*128
+                for note in range(zone.note_min, zone.note_max+1):
+                    table[base+note] |= outputs
+        self.__tables = (table, channels)
+
+    def route(self, msg:list[int])->int:
+        """return the bitmask of the outputs a raw message must be sent to"""
+        status = msg[0]
+        if status>=0xF0:
+            return self.__all
+        table, channels = self.__tables
+        msb = status>>4
+        if msb==ChannelMsg_NoteOn or msb==ChannelMsg_NoteOff or msb==ChannelMsg_PolyphonicKeyPressure:
+            if len(msg)<3:
+                return 0
+            idx = ((status&0xF)<<7)+msg[1]
+            if msb==ChannelMsg_NoteOn and msg[2]>0:
+                # A note played again before its NoteOff : the NoteOff goes to both destinations
+                outputs = table[idx]
+                self.__held[idx] |= outputs
+                return outputs
+            held = self.__held[idx]
+            if msb==ChannelMsg_NoteOn or msb==ChannelMsg_NoteOff:
+                self.__held[idx] = 0
+            # Note not played through the router (i.e. held before it started) : current zones apply
+            return held if held else table[idx]
+        if msb==ChannelMsg_CtrlChangeOrChannelMode and len(msg)>1 and msg[1]>=120:
+            # Channel mode messages go where notes of the channel are held, and most of them
+            # (AllNotesOff, ...) release these notes
+            base = (status&0xF)<<7
+            outputs = channels[status&0xF]
+            for note in range(128):
+                outputs |= self.__held[base+note]
+            if msg[1]!=0x79 and msg[1]!=0x7A:
+                self.__held[base:base+128] = array('I', bytes(4*128))
+            return outputs
+        return channels[status&0xF]
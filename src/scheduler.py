@@ -0,0 +1,210 @@
+import sys, threading, time
+from collections import deque
+
+
+class OutputScheduler:
+    """ Send messages to an output port from a dedicated thread, by priority :
+        1. real-time messages (TimingClock, Start, ...)
+        2. channel and system common messages
+        3. SysEx messages
+
+        SysEx messages longer than chunk_size are sent in chunks (if send_raw accepts SysEx fragments),
+        so that real-time messages can be sent between two chunks, as allowed by the MIDI spec.
+        Other messages can not be inserted in a SysEx, so they wait for its end.
+        If bandwidth is not 0, SysEx bytes are paced to this number of bytes per second
+        (a MIDI 1.0 DIN link transfers 3125 bytes per second), other messages are never delayed.
+
+        If max_size is not 0, put() never waits : when max_size messages are pending, the overflow
+        policy applies :
+        - DROP_OLDEST : the oldest pending message of the same priority (or of the lowest priority) is dropped
+        - DROP_NEWEST : the new message is dropped
+        - COALESCE_CC : the last pending control change for the same channel and controller is updated
+                        with the value of the new one, else DROP_OLDEST applies
+    """
+    REALTIME = 0
+    CHANNEL = 1
+    SYSEX = 2
+
+    DROP_OLDEST = 'drop-oldest'
+    DROP_NEWEST = 'drop-newest'
+    COALESCE_CC = 'coalesce-cc'
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE_CC)
+
+    # Controllers that are part of a sequence (bank select, parameter numbers, data entry) : never coalesced
+    __NOT_COALESCED = (0x00, 0x06, 0x20, 0x26, 0x60, 0x61, 0x62, 0x63, 0x64, 0x65)
+
+    def __init__(self, name:str, send, send_raw = None, bandwidth:int = 0, chunk_size:int = 256, on_drop = None,
+                 max_size:int = 0, overflow:str = DROP_OLDEST):
+        """
+        Args:
+            name (str): name of the output port (used in logs)
+            send: function(item) sending a complete message
+            send_raw: function(list[int]) sending a part of a SysEx, None if the port does not accept it
+            bandwidth (int): SysEx pacing, in bytes per second (0 : no pacing)
+            chunk_size (int): maximum size of SysEx chunks
+            on_drop: function(item) called when a message could not be sent, or was dropped on overflow
+            max_size (int): maximum number of pending messages (0 : no limit)
+            overflow (str): policy applied when the queue is full (one of POLICIES)
+        """
+        if overflow not in OutputScheduler.POLICIES:
+            raise ValueError('unknown overflow policy: '+str(overflow))
+        self.name = name
+        self.__send = send
+        self.__send_raw = send_raw
+        self.__bandwidth = bandwidth
+        self.__chunk_size = max(1, chunk_size)
+        self.__on_drop = on_drop
+        self.__max_size = max_size
+        self.__overflow = overflow
+        self.__queues = (deque(), deque(), deque())
+        self.__pending:int = 0
+        self.__cc:dict = {} # (status, controller) -> pending entry, with COALESCE_CC policy
+        self.__high_water:int = 0
+        self.__cond = threading.Condition()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='output:'+name, daemon=True)
+        self.__thread.start()
+
+    def priority(msg:list[int])->int:
+        if msg[0]>=0xF8:
+            return OutputScheduler.REALTIME
+        if msg[0]==0xF0:
+            return OutputScheduler.SYSEX
+        return OutputScheduler.CHANNEL
+
+    def put(self, msg:list[int], item = None):
+        """queue a message : item (msg if None) will be given to the send function"""
+        entry = [msg, msg if item is None else item]
+        dropped = None
+        with self.__cond:
+            priority = OutputScheduler.priority(msg)
+            if (self.__overflow==OutputScheduler.COALESCE_CC and msg[0]>>4==0xB and len(msg)==3
+                    and msg[1]<120 and msg[1] not in OutputScheduler.__NOT_COALESCED):
+                key = (msg[0], msg[1])
+                pending = self.__cc.get(key)
+                if pending is not None and self.__max_size and self.__pending>=self.__max_size:
+                    dropped = pending[1]
+                    pending[0], pending[1] = entry
+                    entry = None
+                else:
+                    self.__cc[key] = entry # most recent pending entry of the controller
+            if entry is not None:
+                if self.__max_size and self.__pending>=self.__max_size:
+                    if self.__overflow==OutputScheduler.DROP_NEWEST:
+                        dropped = entry[1]
+                        self.__forget(entry)
+                        entry = None
+                    else:
+                        dropped = self.__drop_oldest(priority)
+                if entry is not None:
+                    self.__queues[priority].append(entry)
+                    self.__pending += 1
+                    if self.__pending>self.__high_water:
+                        self.__high_water = self.__pending
+                    self.__cond.notify()
+        if dropped is not None and self.__on_drop:
+            self.__on_drop(dropped)
+
+    def pending(self)->int:
+        return self.__pending
+
+    def high_water(self)->int:
+        """return the maximum number of messages that have been pending"""
+        return self.__high_water
+
+    def close(self, flush:bool = True):
+        """stop the sender thread, after sending queued messages if flush is True"""
+        with self.__cond:
+            if not flush:
+                for queue in self.__queues:
+                    queue.clear()
+                self.__cc.clear()
+                self.__pending = 0
+            self.__running = False
+            self.__cond.notify()
+        self.__thread.join()
+
+    def __run(self):
+        realtime, channel, sysex = self.__queues
+        current:list[int] = None # SysEx being sent in chunks
+        current_item = None
+        offset = 0
+        next_time = 0.0 # SysEx pacing : time when next SysEx bytes can be sent
+        while True:
+            with self.__cond:
+                while True:
+                    now = time.monotonic()
+                    if realtime:
+                        msg, item = self.__pop(realtime)
+                        break
+                    if current is None and channel:
+                        msg, item = self.__pop(channel)
+                        break
+                    if now>=next_time and (current is not None or sysex):
+                        msg = item = None
+                        if current is None:
+                            next_sysex, next_item = self.__pop(sysex)
+                        break
+                    if not self.__running and current is None and not channel and not sysex:
+                        return
+                    self.__cond.wait(next_time-now if (current is not None or sysex) else None)
+
+            if msg is not None:
+                self.__do_send(self.__send, item)
+                continue
+
+            if current is None:
+                if self.__send_raw is None or len(next_sysex)<=self.__chunk_size:
+                    self.__do_send(self.__send, next_item)
+                    next_time = self.__pace(next_time, len(next_sysex))
+                    continue
+                current, current_item, offset = next_sysex, next_item, 0
+            chunk = current[offset:offset+self.__chunk_size]
+            if not self.__do_send(self.__send_raw, chunk, current_item):
+                # Terminate the SysEx started by previous chunks, so that the receiver drops it
+                if offset>0:
+                    try:
+                        self.__send_raw([0xF7])
+                    except Exception:
+                        pass
+                current = None
+                continue
+            offset += len(chunk)
+            next_time = self.__pace(next_time, len(chunk))
+            if offset>=len(current):
+                current = None
+
+    def __pop(self, queue:deque)->list:
+        """remove the first entry of a queue (lock must be held)"""
+        entry = queue.popleft()
+        self.__pending -= 1
+        self.__forget(entry)
+        return entry
+
+    def __forget(self, entry:list):
+        msg = entry[0]
+        if self.__cc and msg[0]>>4==0xB and len(msg)==3 and self.__cc.get((msg[0], msg[1])) is entry:
+            del self.__cc[(msg[0], msg[1])]
+
+    def __drop_oldest(self, priority:int):
+        """remove the oldest message of the queue of a priority, or of the lowest priority (lock must be held)"""
+        queue = self.__queues[priority]
+        if not queue:
+            queue = next(queue for queue in reversed(self.__queues) if queue)
+        return self.__pop(queue)[1]
+
+    def __pace(self, next_time:float, size:int)->float:
+        if not self.__bandwidth:
+            return 0.0
+        return max(next_time, time.monotonic()) + size/self.__bandwidth
+
+    def __do_send(self, func, arg, item = None)->bool:
+        """call func(arg), item (arg if None) is given to on_drop if it fails"""
+        try:
+            func(arg)
+            return True
+        except Exception as e:
+            print('error: can not send message to "'+self.name+'": '+str(e), file=sys.stderr)
+            if self.__on_drop:
+                self.__on_drop(arg if item is None else item)
+            return False
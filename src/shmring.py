@@ -0,0 +1,233 @@
+import os, struct, sys, threading, time
+from multiprocessing import shared_memory
+
+# Single producer / multiple consumers ring buffer of raw midi messages in shared memory
+# Consumers (other processes) read at their own pace : the producer never waits for them,
+# a consumer that is too slow detects that the data it had not read yet has been overwritten
+#
+# Shared memory = header, consumer slots, port names, data (ring of records)
+#   header : magic, version, data capacity (power of 2), write position and number of written
+#            messages (both only increase, the data offset of a position is position % capacity)
+#   consumer slot : pid of the consumer (0 if free), read position (updated by the consumer,
+#                   read by the producer to know the lag of consumers)
+#   record : <size (2 bytes)> <port index (1 byte)> <unused (1 byte)> <timestamp (8 bytes)> <bytes>
+#            padded to 4 bytes. A record never wraps : a size of 0xFFFF means "skip to the start"
+# Timestamps are time.monotonic_ns() values, which are shared by the processes of a host
+# Messages are at most capacity/16 bytes (and less than 0xFFFF). The record being written (and the wrap before it) is not
+# published yet : a consumer must not lag more than capacity minus the size of two maximum records
+_MAGIC = b'MRNG'
+_VERSION = 1
+_HEADER = struct.Struct('<4sII4xQQ')    # magic, version, capacity, write position, written messages
+_POSITIONS = struct.Struct('<QQ')       # write position, written messages (at _HEADER offset 16)
+_SLOT = struct.Struct('<IxxxxQ')        # pid, read position
+_RECORD = struct.Struct('<HBxQ')        # size, port index, timestamp
+_WRAP = 0xFFFF
+MAX_CONSUMERS = 16
+_PORTS_SIZE = 1024
+_SLOTS_OFFSET = _HEADER.size
+_PORTS_OFFSET = _SLOTS_OFFSET+MAX_CONSUMERS*_SLOT.size
+_DATA_OFFSET = _PORTS_OFFSET+_PORTS_SIZE
+
+
+def _max_size(capacity:int)->int:
+    """maximum size of a message, in a ring of capacity bytes"""
+    return min(capacity//16, _WRAP-1)
+
+
+def _attach(name:str)->shared_memory.SharedMemory:
+    """open an existing shared memory, without letting the resource tracker of this process
+    remove it when the process exits (it belongs to the producer)
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python<3.13 : no track argument
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class RingWriter:
+    """ Producer side : create the shared memory, and publish messages """
+    def __init__(self, name:str, ports:list[str], capacity:int = 1<<20):
+        """
+        Args:
+            name (str): name of the shared memory, given to consumers
+            ports (list[str]): names of the ports, messages refer to them by index
+            capacity (int): size of the data ring, rounded up to a power of 2
+        """
+        capacity = 1<<max(12, (capacity-1).bit_length())
+        self.name = name
+        self.__capacity = capacity
+        self.__shm = shared_memory.SharedMemory(name, create=True, size=_DATA_OFFSET+capacity)
+        self.__buf = self.__shm.buf
+        self.__position:int = 0
+        self.__count:int = 0
+        self.__lock = threading.Lock() # input callbacks of several ports may run in different threads
+        _HEADER.pack_into(self.__buf, 0, _MAGIC, _VERSION, capacity, 0, 0)
+        self.__buf[_SLOTS_OFFSET:_DATA_OFFSET] = bytes(_DATA_OFFSET-_SLOTS_OFFSET)
+        names = '\n'.join(ports).encode('utf-8')[:_PORTS_SIZE]
+        self.__buf[_PORTS_OFFSET:_PORTS_OFFSET+len(names)] = names
+
+    def write(self, port_idx:int, msg:list[int], timestamp_ns:int):
+        size = len(msg)
+        if size>_max_size(self.__capacity):
+            return
+        record_size = (_RECORD.size+size+3)&~3
+        with self.__lock:
+            buf = self.__buf
+            if buf is None:
+                return
+            position = self.__position
+            offset = position&(self.__capacity-1)
+            if offset+record_size>self.__capacity:
+                # Not enough room before the end of the ring : the record is written at the start
+                _RECORD.pack_into(buf, _DATA_OFFSET+offset, _WRAP, 0, 0)
+                position += self.__capacity-offset
+                offset = 0
+            start = _DATA_OFFSET+offset
+            _RECORD.pack_into(buf, start, size, port_idx, timestamp_ns)
+            buf[start+_RECORD.size:start+_RECORD.size+size] = bytes(msg)
+            self.__position = position+record_size
+            self.__count += 1
+            # The record is complete before the position that publishes it is updated
+            _POSITIONS.pack_into(buf, 16, self.__position, self.__count)
+
+    def lag(self)->int:
+        """return the number of bytes the slowest consumer has not read yet (0 once closed)"""
+        result = 0
+        with self.__lock:
+            buf = self.__buf
+            if buf is None:
+                return result
+            for slot in range(MAX_CONSUMERS):
+                pid, position = _SLOT.unpack_from(buf, _SLOTS_OFFSET+slot*_SLOT.size)
+                if pid:
+                    result = max(result, self.__position-position)
+        return result
+
+    def close(self):
+        with self.__lock:
+            if self.__buf is None:
+                return
+            self.__buf = None
+            self.__shm.close()
+            self.__shm.unlink()
+
+
+class RingReader:
+    """ Consumer side : read messages published by a RingWriter, from another process
+
+        for port_idx, timestamp_ns, msg in reader.messages():
+            midimsg = MidiMsg.from_list(msg)
+
+        If the consumer is too slow and the producer overwrites messages it has not read yet,
+        reading resumes at the most recent message, and `lost` counts skipped messages
+    """
+    def __init__(self, name:str):
+        """raises FileNotFoundError if no producer publishes with this name, ValueError if the
+        shared memory is not a ring or if there are already MAX_CONSUMERS consumers
+        """
+        self.__shm = _attach(name)
+        self.__buf = self.__shm.buf
+        magic, version, self.__capacity, position, count = _HEADER.unpack_from(self.__buf)
+        if magic!=_MAGIC or version!=_VERSION:
+            self.__shm.close()
+            raise ValueError('"'+name+'" is not a midimator ring buffer')
+        names = bytes(self.__buf[_PORTS_OFFSET:_DATA_OFFSET]).rstrip(b'\x00').decode('utf-8', 'replace')
+        self.ports:list[str] = names.split('\n')
+        self.lost:int = 0
+        self.__position = position
+        self.__count = count
+        # Bytes that the producer may be overwriting beyond the published write position
+        self.__margin = 2*((_RECORD.size+_max_size(self.__capacity)+3)&~3)
+        self.__slot = self.__register()
+
+    def read(self, max_count:int = 1024)->list[tuple[int, int, bytes]]:
+        """return the messages published since the last call (at most max_count), as
+        (port index, timestamp_ns, raw bytes), without waiting. Raises ValueError once closed
+        """
+        buf = self.__buf
+        if buf is None:
+            raise ValueError('read from a closed ring buffer')
+        capacity = self.__capacity
+        result = []
+        written, count = _POSITIONS.unpack_from(buf, 16)
+        if written-self.__position>capacity-self.__margin:
+            self.__overrun(written, count)
+        position = self.__position
+        while position<written and len(result)<max_count:
+            offset = position&(capacity-1)
+            size, port_idx, timestamp = _RECORD.unpack_from(buf, _DATA_OFFSET+offset)
+            if size==_WRAP:
+                position += capacity-offset
+                continue
+            start = _DATA_OFFSET+offset+_RECORD.size
+            result.append((port_idx, timestamp, bytes(buf[start:start+size])))
+            position += (_RECORD.size+size+3)&~3
+        # Records read may have been overwritten while they were copied
+        written, count = _POSITIONS.unpack_from(buf, 16)
+        if written-self.__position>capacity-self.__margin:
+            self.__overrun(written, count)
+            return []
+        self.__count += len(result)
+        self.__position = position
+        _SLOT.pack_into(buf, _SLOTS_OFFSET+self.__slot*_SLOT.size, os.getpid(), position)
+        return result
+
+    def messages(self, poll:float = 0.001):
+        """yield (port index, timestamp_ns, raw bytes) of published messages, forever
+        poll is the time to sleep when there is no message
+        """
+        while True:
+            messages = self.read()
+            if not messages:
+                time.sleep(poll)
+            yield from messages
+
+    def close(self):
+        if self.__buf is None:
+            return
+        _SLOT.pack_into(self.__buf, _SLOTS_OFFSET+self.__slot*_SLOT.size, 0, 0)
+        self.__buf = None
+        self.__shm.close()
+
+    def __overrun(self, written:int, count:int):
+        self.lost += count-self.__count
+        self.__count = count
+        self.__position = written
+
+    def __register(self)->int:
+        pid = os.getpid()
+        for slot in range(MAX_CONSUMERS):
+            offset = _SLOTS_OFFSET+slot*_SLOT.size
+            if not RingReader.__alive(_SLOT.unpack_from(self.__buf, offset)[0]):
+                _SLOT.pack_into(self.__buf, offset, pid, self.__position)
+                return slot
+        self.__shm.close()
+        raise ValueError('too many consumers (maximum is '+str(MAX_CONSUMERS)+')')
+
+    def __alive(pid:int)->bool:
+        """return False if the slot of a consumer is free (pid 0, or process that has exited without closing)"""
+        if pid==0:
+            return False
+        if sys.platform=='win32':
+            # os.kill(pid, 0) would send CTRL_C_EVENT to the process
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(0x1000, False, pid) # PROCESS_QUERY_LIMITED_INFORMATION
+            if not handle:
+                return kernel32.GetLastError()==5 # ERROR_ACCESS_DENIED : the process exists
+            try:
+                exit_code = ctypes.c_ulong()
+                return not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)) or exit_code.value==259 # STILL_ACTIVE
+            finally:
+                kernel32.CloseHandle(handle)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
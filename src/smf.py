@@ -0,0 +1,182 @@
+import os, struct, tempfile, threading, time
+
+# Standard MIDI File format
+# url : https://midi.org/standard-midi-files-specification
+# File = header chunk ("MThd") + track chunks ("MTrk")
+#   MThd <length=6> <format> <number of tracks> <division>
+#   MTrk <length> <event>...
+# Event = <delta-time (variable length quantity)> <MIDI event | SysEx event | meta event>
+
+META_TRACK_NAME = 0x03
+META_END_OF_TRACK = 0x2F
+META_TEMPO = 0x51
+
+# Number of data bytes of midi messages, by status byte (0 for data bytes, SysEx and undefined statuses)
+DATA_LEN = bytes([0]*0x80 + [2]*0x40 + [1]*0x20 + [2]*0x10 + [0, 1, 2, 1, 0, 0, 0, 0] + [0]*8)
+
+def var_len(value:int)->bytes:
+    """encode an integer as a variable length quantity (7 bits per byte, MSB first)"""
+    result = bytearray([value&0x7F])
+    value >>= 7
+    while value:
+        result.insert(0, 0x80|(value&0x7F))
+        value >>= 7
+    return bytes(result)
+
+def read_var_len(data:bytes, pos:int)->tuple[int, int]:
+    """return (value, position after the value) of the variable length quantity at data[pos]"""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value<<7) | (byte&0x7F)
+        if byte<0x80:
+            return value, pos
+
+def is_storable(msg:list[int])->bool:
+    """return True if the message can be stored in a SMF
+    Only channel messages and SysEx can be : system common and real-time messages (clock, ...)
+    are not allowed in a file (status 0xFF is used by meta events)
+    """
+    return len(msg)>0 and (msg[0]<0xF0 or msg[0]==0xF0)
+
+def encode_event(delta:int, msg:list[int])->bytes:
+    """return the SMF event for a raw midi message (see is_storable())"""
+    if msg[0]==0xF0:
+        # F0 <length> <bytes after F0>
+        return var_len(delta)+b'\xF0'+var_len(len(msg)-1)+bytes(msg[1:])
+    return var_len(delta)+bytes(msg)
+
+def encode_meta(delta:int, meta_type:int, data:bytes)->bytes:
+    return var_len(delta)+bytes([0xFF, meta_type])+var_len(len(data))+data
+
+
+class _Track:
+    def __init__(self, file, offset:int, name:str, number:int):
+        self.file = file
+        self.name = name
+        self.number = number
+        self.length_offset = offset+4 # position of the chunk length, patched on close
+        self.length:int = 0
+        self.last_tick:int = 0
+        self.ended:bool = False
+
+    def write(self, data:bytes):
+        self.file.write(data)
+        self.length += len(data)
+
+
+class SmfWriter:
+    """ Write midi messages to a Standard MIDI File, while they are received
+
+        Events are written to disk as they come (through a buffered file) and track chunk
+        lengths are written back when the file is closed, so memory usage does not depend
+        on the capture duration.
+        - type 0 : all messages in a single track
+        - type 1 : a tempo track, then one track per input port. The first port track is
+                   written in the output file, the others in temporary files that are
+                   appended to it on close
+        Time is measured with a monotonic clock, and converted to ticks with the division
+        (pulses per quarter note) and tempo given at creation.
+        If index is True, a secondary index is written next to the file (see index.IndexWriter).
+    """
+    BUFFER_SIZE = 1<<16
+
+    def __init__(self, path:str, ports:list[str], smf_type:int = 1, ppq:int = 960, tempo:int = 500000, start_ns:int = None, index:bool = False):
+        """
+        Args:
+            path (str): path of the file to create
+            ports (list[str]): names of the input ports (used as track names)
+            smf_type (int): 0 or 1
+            ppq (int): division, in ticks per quarter note
+            tempo (int): tempo in microseconds per quarter note (default is 120 BPM)
+            start_ns (int): time.monotonic_ns() value matching tick 0 (default is now)
+        """
+        if smf_type!=0 and smf_type!=1:
+            raise ValueError('unsupported SMF type: '+str(smf_type))
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__start_ns = time.monotonic_ns() if start_ns is None else start_ns
+        self.__ticks_per_ns = ppq*1000/(tempo*1000000)
+        self.__file = open(path, 'wb', buffering=SmfWriter.BUFFER_SIZE)
+        nb_tracks = 1 if smf_type==0 else len(ports)+1
+        self.__file.write(b'MThd'+struct.pack('>IHHH', 6, smf_type, nb_tracks, ppq))
+        self.__index = None
+        if index:
+            from index import IndexWriter, INDEX_EXTENSION
+            start_time_ns = time.time_ns()-(time.monotonic_ns()-self.__start_ns)
+            self.__index = IndexWriter(path+INDEX_EXTENSION, ppq, tempo, start_time_ns)
+
+        tempo_event = encode_meta(0, META_TEMPO, tempo.to_bytes(3, 'big'))
+        self.__tracks:list[_Track] = []
+        if smf_type==0:
+            track = self.__open_track(self.__file, ', '.join(ports))
+            track.write(tempo_event)
+            track.write(encode_meta(0, META_TRACK_NAME, track.name.encode('utf-8')))
+            self.__track_of_port = [track]*len(ports)
+        else:
+            # Tempo track is complete from the beginning
+            track = self.__open_track(self.__file, '')
+            track.write(tempo_event)
+            self.__end_track(track, 0)
+            self.__track_of_port = []
+            for idx, port in enumerate(ports):
+                track = self.__open_track(self.__file if idx==0 else tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))), port)
+                track.write(encode_meta(0, META_TRACK_NAME, port.encode('utf-8')))
+                self.__track_of_port.append(track)
+
+    def write(self, port_idx:int, msg:list[int], timestamp_ns:int):
+        """add a message received at timestamp_ns (time.monotonic_ns()) on ports[port_idx]
+        Messages that can not be stored in a SMF are ignored (see is_storable())
+        """
+        if not is_storable(msg):
+            return
+        tick = round((timestamp_ns-self.__start_ns)*self.__ticks_per_ns)
+        with self.__lock:
+            if not self.__track_of_port:
+                # Closed : the callback of a port may still run while the session ends
+                return
+            track = self.__track_of_port[port_idx]
+            # Ticks are computed from absolute time, so that rounding errors do not accumulate
+            delta = max(0, tick-track.last_tick)
+            if self.__index:
+                self.__index.add(track.number, track.length, track.last_tick+delta, track.last_tick, msg)
+            track.last_tick += delta
+            track.write(encode_event(delta, msg))
+
+    def close(self):
+        with self.__lock:
+            if not self.__track_of_port:
+                return
+            tick = round((time.monotonic_ns()-self.__start_ns)*self.__ticks_per_ns)
+            for track in self.__tracks:
+                if not track.ended:
+                    self.__end_track(track, max(0, tick-track.last_tick))
+                track.file.seek(track.length_offset)
+                track.file.write(struct.pack('>I', track.length))
+                track.file.seek(0, os.SEEK_END)
+            # Append tracks written in temporary files
+            offsets = []
+            for track in self.__tracks:
+                if track.file is self.__file:
+                    offsets.append(track.length_offset+4)
+                else:
+                    offsets.append(self.__file.tell()+track.length_offset+4)
+                    track.file.seek(0)
+                    while block := track.file.read(SmfWriter.BUFFER_SIZE):
+                        self.__file.write(block)
+                    track.file.close()
+            self.__file.close()
+            self.__track_of_port = []
+            if self.__index:
+                self.__index.close([(offset, track.length, track.name) for offset, track in zip(offsets, self.__tracks)])
+
+    def __open_track(self, file, name:str)->_Track:
+        track = _Track(file, file.tell(), name, len(self.__tracks))
+        file.write(b'MTrk\x00\x00\x00\x00')
+        self.__tracks.append(track)
+        return track
+
+    def __end_track(self, track:_Track, delta:int):
+        track.write(encode_meta(delta, META_END_OF_TRACK, b''))
+        track.ended = True
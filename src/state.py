@@ -0,0 +1,140 @@
+import threading
+from array import array
+from midi_tables import *
+
+
+class ChannelState:
+    """ Keep the state of the 16 channels of a midi stream : held notes, controllers,
+        program, channel pressure and pitch bend, updated in O(1) for each message
+
+        - notes : one 128 bits integer per channel (bit n set if note n is held)
+        - controllers : [channel*128 + controller] -> last value, UNKNOWN if never received
+        - programs, pressures : [channel] -> last value, UNKNOWN if never received
+        - pitch_bends : [channel] -> last value (14 bits), -1 if never received
+
+        Messages update the state from the reception thread, while note_offs() and snapshot() may
+        be called from another one (i.e. on exit) : they are all done under a lock (not taken by
+        the other methods, which must be called by the updating thread)
+    """
+    UNKNOWN = 0xFF
+
+    # Controllers that are not a state (parameter number, data entry, ...) : not restored by to_messages()
+    __NOT_RESTORED = (0x06, 0x26, 0x60, 0x61, 0x62, 0x63, 0x64, 0x65)
+    __SUSTAIN = 0x40
+
+    def __init__(self):
+        self.notes:list[int] = [0]*16
+        self.controllers = bytearray([ChannelState.UNKNOWN])*(16*128)
+        self.programs = bytearray([ChannelState.UNKNOWN])*16
+        self.pressures = bytearray([ChannelState.UNKNOWN])*16
+        self.pitch_bends = array('i', [-1]*16)
+        self.__lock = threading.Lock()
+
+    def update(self, msg:'MidiMsg'):
+        """update state from a decoded message"""
+        if msg.type_id<0 or msg.type_id>=0x10:
+            return
+        with self.__lock:
+            if msg.type_id==ChannelMsg_CtrlChangeOrChannelMode:
+                self.__update(msg.type_id, msg.channel, msg.control_change_id if msg.control_change_id>=0 else msg.channel_mode_id, msg.value)
+            elif msg.type_id==ChannelMsg_PitchBendChange:
+                self.pitch_bends[msg.channel] = msg.value
+            else:
+                self.__update(msg.type_id, msg.channel, msg.note if msg.note>=0 else msg.value, msg.velocity)
+
+    def update_bytes(self, msg:list[int]):
+        """update state from a raw message (same as update(MidiMsg.from_list(msg)), without decoding)"""
+        size = len(msg)
+        if size<2 or msg[0]>=0xF0 or msg[0]<0x80:
+            return
+        with self.__lock:
+            if size==2:
+                self.__update(msg[0]>>4, msg[0]&0xF, msg[1], 0)
+            elif msg[0]>>4==ChannelMsg_PitchBendChange:
+                self.pitch_bends[msg[0]&0xF] = (msg[2]<<7)+msg[1]
+            else:
+                self.__update(msg[0]>>4, msg[0]&0xF, msg[1], msg[2])
+
+    def held_notes(self, channel:int)->list[int]:
+        return ChannelState.__bits(self.notes[channel])
+
+    def note_offs(self)->list[list[int]]:
+        """return the NoteOff messages releasing every held note (and sustain pedal if it is down),
+        and forget held notes
+        """
+        result = []
+        with self.__lock:
+            for channel in range(16):
+                for note in ChannelState.__bits(self.notes[channel]):
+                    result.append([(ChannelMsg_NoteOff<<4)|channel, note, 0])
+                self.notes[channel] = 0
+                sustain = channel*128+ChannelState.__SUSTAIN
+                if self.controllers[sustain]!=ChannelState.UNKNOWN and self.controllers[sustain]>=64:
+                    result.append([(ChannelMsg_CtrlChangeOrChannelMode<<4)|channel, ChannelState.__SUSTAIN, 0])
+                    self.controllers[sustain] = 0
+        return result
+
+    def snapshot(self)->'ChannelState':
+        """return a copy of the current state"""
+        state = ChannelState.__new__(ChannelState)
+        with self.__lock:
+            state.notes = self.notes[:]
+            state.controllers = self.controllers[:]
+            state.programs = self.programs[:]
+            state.pressures = self.pressures[:]
+            state.pitch_bends = self.pitch_bends[:]
+        state.__lock = threading.Lock()
+        return state
+
+    def to_messages(self, with_notes:bool = False)->list[list[int]]:
+        """return messages that bring a device to this state (i.e. an output connected late)
+        held notes are only sent (as NoteOn) if with_notes is True
+        """
+        result = []
+        for channel in range(16):
+            if self.programs[channel]!=ChannelState.UNKNOWN:
+                result.append([(ChannelMsg_ProgramChange<<4)|channel, self.programs[channel]])
+            base = channel*128
+            for controller in range(120):
+                value = self.controllers[base+controller]
+                if value!=ChannelState.UNKNOWN and controller not in ChannelState.__NOT_RESTORED:
+                    result.append([(ChannelMsg_CtrlChangeOrChannelMode<<4)|channel, controller, value])
+            if self.pressures[channel]!=ChannelState.UNKNOWN:
+                result.append([(ChannelMsg_ChannelPressure<<4)|channel, self.pressures[channel]])
+            if self.pitch_bends[channel]>=0:
+                result.append([(ChannelMsg_PitchBendChange<<4)|channel, self.pitch_bends[channel]&0x7F, self.pitch_bends[channel]>>7])
+            if with_notes:
+                for note in ChannelState.__bits(self.notes[channel]):
+                    result.append([(ChannelMsg_NoteOn<<4)|channel, note, 64])
+        return result
+
+    def __update(self, msg_type:int, channel:int, data1:int, data2:int):
+        if msg_type==ChannelMsg_NoteOn:
+            if data2>0:
+                self.notes[channel] |= 1<<data1
+            else:
+                self.notes[channel] &= ~(1<<data1)
+        elif msg_type==ChannelMsg_NoteOff:
+            self.notes[channel] &= ~(1<<data1)
+        elif msg_type==ChannelMsg_CtrlChangeOrChannelMode:
+            if data1<120:
+                self.controllers[channel*128+data1] = data2
+            elif data1==0x79: # ResetAllControllers
+                base = channel*128
+                self.controllers[base:base+120] = bytearray([ChannelState.UNKNOWN])*120
+                self.pressures[channel] = 0
+                self.pitch_bends[channel] = 0x2000
+            elif data1!=0x7A: # all channel modes but LocalControl release notes
+                self.notes[channel] = 0
+        elif msg_type==ChannelMsg_ProgramChange:
+            self.programs[channel] = data1
+        elif msg_type==ChannelMsg_ChannelPressure:
+            self.pressures[channel] = data1
+
+    def __bits(value:int)->list[int]:
+        result = []
+        while value:
+            low = value & -value
+            result.append(low.bit_length()-1)
+            value ^= low
+        return result
@@ -0,0 +1,344 @@
+import sys
+from array import array
+from midi_tables import *
+from smf import DATA_LEN
+
+# MIDI 2.0 Universal MIDI Packets (UMP), stored as 32-bit words in an array('I') (or any buffer of
+# native uint32, i.e. a NumPy uint32 array, see as_words()) : packets are read and written in place,
+# no object is built per word
+#
+# First word of a packet : <message type (4 bits)> <group (4 bits)> <24 bits depending on the type>
+#   0 utility (1 word)                 : status (4 bits), data (20 bits), i.e. NOOP, JR timestamp
+#   1 system real time/common (1 word) : status byte, data 1, data 2 (as MIDI 1.0)
+#   2 MIDI 1.0 channel voice (1 word)  : status byte, data 1, data 2 (as MIDI 1.0)
+#   3 data 64 bits (2 words)           : SysEx7 status (4 bits), byte count (4 bits), 6 bytes
+#   4 MIDI 2.0 channel voice (2 words) : status byte, index, index/flags, then a 32-bit value
+#                                        (NoteOn/NoteOff : 16-bit velocity and 16-bit attribute)
+#   5 data 128 bits (4 words)          : SysEx8 and mixed data sets
+# Packets of types 6 to F are reserved, their size is known so they can be skipped
+MT_UTILITY = 0x0
+MT_SYSTEM = 0x1
+MT_MIDI1_CHANNEL_VOICE = 0x2
+MT_DATA64 = 0x3
+MT_MIDI2_CHANNEL_VOICE = 0x4
+MT_DATA128 = 0x5
+
+# Number of words of a packet, by message type
+PACKET_WORDS = bytes([1, 1, 1, 2, 2, 4, 1, 1, 2, 2, 2, 3, 3, 4, 4, 4])
+
+# SysEx7 status (data 64 packets)
+SYSEX_COMPLETE = 0x0
+SYSEX_START = 0x1
+SYSEX_CONTINUE = 0x2
+SYSEX_END = 0x3
+
+# MIDI 2.0 channel voice status nibbles that are not MIDI 1.0 messages
+_REGISTERED_CONTROLLER = 0x2
+_ASSIGNABLE_CONTROLLER = 0x3
+
+
+def scale_up(value:int, src_bits:int, dst_bits:int)->int:
+    """upscale a value with the min-center-max scaling of the MIDI 2.0 specification : 0, the
+    center value and the maximum value of the source range give 0, the center and the maximum of
+    the destination range (i.e. velocity 127 -> 0xFFFF, and not 0xFE00)
+    """
+    scale_bits = dst_bits-src_bits
+    shifted = value<<scale_bits
+    if value<=1<<(src_bits-1):
+        return shifted
+    # Above the center, the bits after the MSB are repeated to fill the lower bits
+    repeat_bits = src_bits-1
+    repeat = value&((1<<repeat_bits)-1)
+    if scale_bits>repeat_bits:
+        repeat <<= scale_bits-repeat_bits
+    else:
+        repeat >>= repeat_bits-scale_bits
+    while repeat:
+        shifted |= repeat
+        repeat >>= repeat_bits
+    return shifted
+
+def scale_down(value:int, src_bits:int, dst_bits:int)->int:
+    return value>>(src_bits-dst_bits)
+
+# Upscaling tables of MIDI 1.0 values
+_UP7_16 = array('I', [scale_up(value, 7, 16) for value in range(128)])
+_UP7_32 = array('I', [scale_up(value, 7, 32) for value in range(128)])
+_UP14_32:array = None # built on first use (16384 values)
+
+
+def as_words(buffer)->memoryview:
+    """return a memoryview of native uint32 words on any contiguous buffer (bytes, bytearray,
+    array('I'), NumPy uint32 array, ...), without copy
+    Indexing a NumPy array builds a NumPy scalar per word, indexing the memoryview builds an int
+    """
+    view = memoryview(buffer)
+    if view.format=='I' and view.ndim==1:
+        return view
+    return view.cast('B').cast('I')
+
+def packet_offsets(words, offsets:array = None, start:int = 0, end:int = None)->array:
+    """return the offsets of the packets of words[start:end], in offsets (array('I'), cleared) if it is
+    given, so that a buffer can be reused. A truncated packet at the end is not included
+    """
+    if offsets is None:
+        offsets = array('I')
+    else:
+        del offsets[:]
+    if end is None:
+        end = len(words)
+    sizes = PACKET_WORDS
+    append = offsets.append
+    pos = start
+    while pos<end:
+        size = sizes[words[pos]>>28]
+        if pos+size>end:
+            break
+        append(pos)
+        pos += size
+    return offsets
+
+def count_packets(words, types:array = None)->int:
+    """return the number of complete packets of words, and count them by message type in types
+    (array of 16 integers, incremented) if it is given
+    """
+    sizes = PACKET_WORDS
+    end = len(words)
+    pos = 0
+    count = 0
+    if types is None:
+        while pos<end:
+            pos += sizes[words[pos]>>28]
+            count += 1
+    else:
+        while pos<end:
+            mt = words[pos]>>28
+            types[mt] += 1
+            pos += sizes[mt]
+            count += 1
+    if pos>end:
+        # Truncated last packet
+        count -= 1
+        if types is not None:
+            types[mt] -= 1
+    return count
+
+
+def from_midi1(data:bytes, group:int = 0, midi2:bool = False, out:array = None)->array:
+    """encode a MIDI 1.0 byte stream (running status and real time messages between data bytes are
+    accepted) as UMP, appended to out (a new array('I') if None)
+    Channel voice messages are MIDI 1.0 packets (type 2), or MIDI 2.0 packets (type 4) with upscaled
+    values if midi2 is True. SysEx are split in data 64 packets (type 3).
+    Note : controllers are translated one by one, RPN/NRPN sequences (CC 101/100/99/98, 6, 38) are
+    not merged into MIDI 2.0 registered/assignable controller messages
+    """
+    if out is None:
+        out = array('I')
+    append = out.append
+    group <<= 24
+    data_len = DATA_LEN
+    running = 0
+    sysex:bytearray = None
+    pos = 0
+    end = len(data)
+    while pos<end:
+        status = data[pos]
+        if status>=0xF8:
+            # Real time : may be anywhere, even in a SysEx
+            append((MT_SYSTEM<<28)|group|(status<<16))
+            pos += 1
+            continue
+        if status==0xF0:
+            sysex = bytearray()
+            pos += 1
+            continue
+        if sysex is not None:
+            if status<0x80:
+                sysex.append(status)
+                pos += 1
+                continue
+            # SysEx ended by F7 (or by any other status, which is then decoded)
+            _sysex7(out, group, sysex)
+            sysex = None
+            if status==0xF7:
+                pos += 1
+                continue
+        if status<0x80:
+            # Running status
+            if not running:
+                pos += 1
+                continue
+            status = running
+        else:
+            pos += 1
+            if status<0xF0:
+                running = status
+            elif status==0xF7:
+                # End of a SysEx that has not been started
+                continue
+            else:
+                running = 0
+        size = data_len[status]
+        if pos+size>end:
+            break
+        d1 = data[pos] if size>0 else 0
+        d2 = data[pos+1] if size>1 else 0
+        pos += size
+        if status>=0xF0:
+            append((MT_SYSTEM<<28)|group|(status<<16)|(d1<<8)|d2)
+        elif not midi2:
+            append((MT_MIDI1_CHANNEL_VOICE<<28)|group|(status<<16)|(d1<<8)|d2)
+        else:
+            _midi2_channel_voice(out, group, status, d1, d2)
+    if sysex:
+        # Unfinished SysEx at the end of the stream
+        _sysex7(out, group, sysex)
+    return out
+
+def _sysex7(out:array, group:int, sysex:bytearray):
+    """append the data 64 packets of a SysEx (without F0/F7)"""
+    size = len(sysex)
+    for start in range(0, max(size, 1), 6):
+        chunk = sysex[start:start+6]
+        if size<=6:
+            status = SYSEX_COMPLETE
+        elif start==0:
+            status = SYSEX_START
+        elif start+6>=size:
+            status = SYSEX_END
+        else:
+            status = SYSEX_CONTINUE
+        value = int.from_bytes(bytes(chunk).ljust(6, b'\x00'), 'big')
+        out.append((MT_DATA64<<28)|group|(status<<20)|(len(chunk)<<16)|(value>>32))
+        out.append(value&0xFFFFFFFF)
+
+def _midi2_channel_voice(out:array, group:int, status:int, d1:int, d2:int):
+    global _UP14_32
+    msb = status>>4
+    if msb==ChannelMsg_NoteOn and d2==0:
+        # NoteOn with velocity 0 is a NoteOff in MIDI 2.0 (velocity 0 is a NoteOn)
+        status = (ChannelMsg_NoteOff<<4)|(status&0xF)
+        msb = ChannelMsg_NoteOff
+    first = (MT_MIDI2_CHANNEL_VOICE<<28)|group|(status<<16)
+    if msb==ChannelMsg_NoteOn or msb==ChannelMsg_NoteOff:
+        out.append(first|(d1<<8))
+        out.append(_UP7_16[d2]<<16)
+    elif msb==ChannelMsg_PolyphonicKeyPressure or msb==ChannelMsg_CtrlChangeOrChannelMode:
+        out.append(first|(d1<<8))
+        out.append(_UP7_32[d2])
+    elif msb==ChannelMsg_ProgramChange:
+        # No bank : "bank valid" flag not set
+        out.append(first)
+        out.append(d1<<24)
+    elif msb==ChannelMsg_ChannelPressure:
+        out.append(first)
+        out.append(_UP7_32[d1])
+    else:
+        if _UP14_32 is None:
+            _UP14_32 = array('I', [scale_up(value, 14, 32) for value in range(16384)])
+        out.append(first)
+        out.append(_UP14_32[(d2<<7)|d1])
+
+
+def to_midi1(words, group:int = None, out:bytearray = None)->bytearray:
+    """decode UMP words as a MIDI 1.0 byte stream (without running status), appended to out
+    (a new bytearray if None). Only packets of group are decoded, or of all groups if group is None
+    MIDI 2.0 channel voice values are downscaled, a program change with a bank is preceded by bank
+    select controllers, registered/assignable controllers become RPN/NRPN sequences.
+    Utility packets, data 128 packets and MIDI 2.0 messages that MIDI 1.0 does not have (per-note
+    controllers, relative controllers, ...) are skipped
+    """
+    if out is None:
+        out = bytearray()
+    sizes = PACKET_WORDS
+    data_len = DATA_LEN
+    end = len(words)
+    pos = 0
+    while pos<end:
+        word = words[pos]
+        mt = word>>28
+        size = sizes[mt]
+        if pos+size>end:
+            break
+        if group is not None and (word>>24)&0xF!=group:
+            pos += size
+            continue
+        if mt==MT_MIDI1_CHANNEL_VOICE or mt==MT_SYSTEM:
+            status = (word>>16)&0xFF
+            if status>=0x80:
+                out.append(status)
+                size_data = data_len[status]
+                if size_data>0:
+                    out.append((word>>8)&0x7F)
+                if size_data>1:
+                    out.append(word&0x7F)
+        elif mt==MT_MIDI2_CHANNEL_VOICE:
+            _midi1_channel_voice(out, word, words[pos+1])
+        elif mt==MT_DATA64:
+            status = (word>>20)&0xF
+            count = min(6, (word>>16)&0xF)
+            if status==SYSEX_COMPLETE or status==SYSEX_START:
+                out.append(0xF0)
+            value = ((word&0xFFFF)<<32)|words[pos+1]
+            out += value.to_bytes(6, 'big')[:count]
+            if status==SYSEX_COMPLETE or status==SYSEX_END:
+                out.append(0xF7)
+        pos += size
+    return out
+
+def _midi1_channel_voice(out:bytearray, word:int, value:int):
+    status = (word>>16)&0xFF
+    msb = status>>4
+    channel = status&0xF
+    index = (word>>8)&0x7F
+    if msb==ChannelMsg_NoteOn or msb==ChannelMsg_NoteOff:
+        velocity = value>>25
+        if msb==ChannelMsg_NoteOn and velocity==0:
+            # Velocity 0 would be a NoteOff in MIDI 1.0
+            velocity = 1
+        out += bytes((status, index, velocity))
+    elif msb==ChannelMsg_PolyphonicKeyPressure or msb==ChannelMsg_CtrlChangeOrChannelMode:
+        out += bytes((status, index, value>>25))
+    elif msb==ChannelMsg_ProgramChange:
+        if word&1:
+            # Bank valid
+            control = 0xB0|channel
+            out += bytes((control, 0x00, (value>>8)&0x7F, control, 0x20, value&0x7F))
+        out += bytes((status, (value>>24)&0x7F))
+    elif msb==ChannelMsg_ChannelPressure:
+        out += bytes((status, value>>25))
+    elif msb==ChannelMsg_PitchBendChange:
+        value >>= 18
+        out += bytes((status, value&0x7F, value>>7))
+    elif msb==_REGISTERED_CONTROLLER or msb==_ASSIGNABLE_CONTROLLER:
+        # bank = parameter MSB, index = parameter LSB, 32-bit value -> 14-bit data entry
+        control = 0xB0|channel
+        value >>= 18
+        number = (101, 100) if msb==_REGISTERED_CONTROLLER else (99, 98)
+        out += bytes((control, number[0], index, control, number[1], word&0x7F,
+                      control, 6, value>>7, control, 38, value&0x7F))
+
+
+def benchmark(count:int = 1000000):
+    """print the decoding rates of a buffer of MIDI 2.0 channel voice and system packets"""
+    import time
+    midi1 = bytes([0x90, 60, 100, 0xB0, 7, 127, 0xE0, 0, 64, 0xF8, 0x80, 60, 0])
+    words = from_midi1(midi1*(count//5+1), midi2=True)
+    nb_packets = count_packets(words)
+    tests = [
+        ('count packets', lambda: count_packets(words)),
+        ('count packets by type', lambda: count_packets(words, array('I', bytes(64)))),
+        ('packet offsets', lambda: packet_offsets(words)),
+        ('translate to MIDI 1.0', lambda: to_midi1(words)),
+        ('translate from MIDI 1.0', lambda: from_midi1(midi1*(count//5+1), midi2=True)),
+    ]
+    print(str(nb_packets)+' packets ('+str(len(words))+' words)')
+    for name, func in tests:
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter()-start
+        print(('%-24s' % name)+('%6.2f' % (nb_packets/duration/1000000))+' M packets/s')
+
+
+if __name__=='__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv)>1 else 1000000)
@@ -0,0 +1,107 @@
+import os, socket, sys, threading, time, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bridge import UdpBridge
+
+LOCALHOST = ('127.0.0.1', 0)
+
+
+class LossyRelay:
+    """ Forward the datagrams of a bridge to another one, as told by plan(index) :
+        'send', 'drop', or 'hold' (sent after the next datagram that is sent)
+    """
+    def __init__(self, destination:tuple, plan):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(LOCALHOST)
+        self.sock.settimeout(0.2)
+        self.address = self.sock.getsockname()
+        self.received = 0
+        self.forwarded = 0
+        self.__destination = destination
+        self.__plan = plan
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def close(self):
+        self.__running = False
+        self.__thread.join()
+        self.sock.close()
+
+    def __run(self):
+        index = 0
+        held = []
+        while self.__running:
+            try:
+                datagram = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            action = self.__plan(index)
+            index += 1
+            self.received = index
+            if action=='hold':
+                held.append(datagram)
+            elif action=='send':
+                for datagram in [datagram]+held:
+                    self.sock.sendto(datagram, self.__destination)
+                    self.forwarded += 1
+                held = []
+
+
+class BridgeLoopbackTest(unittest.TestCase):
+    """ Two bridges on localhost, through a relay losing and reordering datagrams """
+    def transfer(self, msgs:list, plan)->tuple[list, 'BridgeReceiver']:
+        received = []
+        receiver = UdpBridge(LOCALHOST, None, lambda msg, timestamp: received.append(msg))
+        relay = LossyRelay(receiver.sock.getsockname(), plan)
+        # batch_ms=0 : one datagram per message
+        sender = UdpBridge(LOCALHOST, relay.address, None, batch_ms=0, redundancy=2)
+        try:
+            for msg in msgs:
+                sender.send(msg)
+                time.sleep(0.002)
+            deadline = time.monotonic()+5
+            while (relay.received<len(msgs) or receiver.receiver.received_datagrams+receiver.receiver.late<relay.forwarded) \
+                    and time.monotonic()<deadline:
+                time.sleep(0.01)
+        finally:
+            sender.close()
+            relay.close()
+            receiver.close()
+        return received, receiver.receiver
+
+    def held_notes(self, received:list)->set:
+        held = set()
+        for msg in received:
+            if msg[0]>>4==0x9 and msg[2]>0:
+                held.add((msg[0]&0xF, msg[1]))
+            elif msg[0]>>4==0x8 or msg[0]>>4==0x9:
+                held.discard((msg[0]&0xF, msg[1]))
+        return held
+
+    def test_late_datagram_after_recovery(self):
+        # The NoteOn and NoteOff of note 60 are late : the NoteOff is recovered from the next
+        # datagram, then the late datagrams must not play the note again
+        msgs = [[0xB0, 7, 100], [0x90, 60, 100], [0x80, 60, 0], [0x90, 62, 100], [0x80, 62, 0], [0xB0, 7, 90]]
+        received, stats = self.transfer(msgs, lambda index: 'hold' if index in (1, 2) else 'send')
+        self.assertEqual(received, [[0xB0, 7, 100], [0x80, 60, 0], [0x90, 62, 100], [0x80, 62, 0], [0xB0, 7, 90]])
+        self.assertEqual(stats.recovered, 1)
+        self.assertEqual(stats.late, 2)
+        self.assertEqual(self.held_notes(received), set())
+
+    def test_loss_and_reordering(self):
+        # At most 2 consecutive datagrams lost or late (the redundancy)
+        msgs = []
+        for note in range(40, 80):
+            msgs.append([0x90, note, 100])
+            msgs.append([0x80, note, 0])
+        msgs += [[0xB0, 7, 100]]*3
+        plan = lambda index: 'drop' if index%5==2 else 'hold' if index%7==3 else 'send'
+        received, stats = self.transfer(msgs, plan)
+        self.assertGreater(stats.lost, 0)
+        self.assertGreater(stats.recovered, 0)
+        self.assertEqual(self.held_notes(received), set())
+
+
+if __name__=='__main__':
+    unittest.main()
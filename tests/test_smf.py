@@ -0,0 +1,25 @@
+import os, sys, tempfile, time, unittest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from smf import SmfWriter
+
+
+class SmfWriterTest(unittest.TestCase):
+    def test_write_after_close(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.mid')
+            for smf_type in (0, 1):
+                writer = SmfWriter(path, ['in 1', 'in 2'], smf_type)
+                writer.write(1, [0x90, 60, 100], time.monotonic_ns())
+                writer.close()
+                with open(path, 'rb') as file:
+                    data = file.read()
+                # A late callback of an input port : ignored, the file is not changed
+                writer.write(1, [0x80, 60, 0], time.monotonic_ns())
+                writer.close()
+                with open(path, 'rb') as file:
+                    self.assertEqual(file.read(), data)
+
+
+if __name__=='__main__':
+    unittest.main()